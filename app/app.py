@@ -1,7 +1,23 @@
 import asyncio
+import multiprocessing
+import os
+import sys
+import time
+from functools import partial
+from multiprocessing.queues import Queue
+from multiprocessing.synchronize import Event
+from typing import List, Optional
 from aiogram import Bot, Dispatcher
-from config import TG_Settings
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+from config import TG_Settings, settings
 from utils.commands import set_commands
+from utils.storage import create_storage
+from utils.webhook import consume_updates, create_router_app, worker_concurrency
+from services.scheduler import FairScheduler
+from services.metrics import metrics, start_metrics_server
 
 from routes import ml, commands
 import logging
@@ -9,20 +25,264 @@ import logging
 logging.basicConfig(level=logging.INFO)
 token = TG_Settings.TG_BOT_TOKEN
 
-bot = Bot(token=token)
-dp = Dispatcher()
+
+def create_bot() -> Bot:
+    """Бот; TELEGRAM_API_URL переключает его на другой сервер Bot API"""
+    session = None
+    if settings.TELEGRAM_API_URL:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(settings.TELEGRAM_API_URL))
+    return Bot(token=token, session=session)
+
+
+bot = create_bot()
+# Состояния чатов во внешнем хранилище, чтобы любой процесс мог обслужить любой чат
+dp = Dispatcher(storage=create_storage())
 
 dp.include_router(commands.router)
 dp.include_router(ml.router)
 
 
+async def import_corpus_index():
+    """Заполняет пустую коллекцию из предпосчитанного индекса без вызовов API"""
+    from services.corpus_index import import_index_if_needed
+
+    try:
+        rag_service = await ml.aget_rag_service()
+        await asyncio.to_thread(
+            import_index_if_needed, rag_service.chroma_service, ml.collection_name
+        )
+    except Exception as e:
+        logging.error(f"Не удалось импортировать индекс корпуса: {str(e)}")
+
+
+async def warm_up(import_corpus: bool = True):
+    """
+    Создает RAGService и запускает обновление токена GigaChat до приема обновлений.
+
+    Тяжелые импорты (chromadb, langchain) и открытие клиентов идут в потоке,
+    поэтому прогрев выполняется параллельно с set_commands.
+    """
+    start = time.perf_counter()
+    if import_corpus:
+        await import_corpus_index()
+    else:
+        await ml.aget_rag_service()
+
+    from services.gigachat_client import get_gigachat_client
+
+    # Токен GigaChat получаем заранее и обновляем в фоне до истечения
+    get_gigachat_client().start_token_refresher()
+    logging.info(f"Прогрев завершен за {time.perf_counter() - start:.2f} с")
+
+
+def register_gauges():
+    """Счетчики кэша ответов и планировщика, читаются при каждом запросе /metrics"""
+    scheduler = ml.scheduler
+    metrics.add_gauge("llm_requests_running", "Запросы к LLM в работе", lambda: scheduler.running)
+    metrics.add_gauge("llm_requests_queued", "Запросы в очереди", lambda: scheduler.queued)
+    metrics.add_gauge(
+        "llm_requests_superseded", "Вопросы, вытесненные новыми", lambda: scheduler.dropped
+    )
+
+    rag_service = ml.get_rag_service()
+    metrics.add_gauge(
+        "rag_requests_coalesced",
+        "Вопросы, склеенные с одинаковым выполняющимся запросом",
+        lambda: rag_service.ainflight.coalesced + rag_service.inflight.coalesced,
+    )
+    metrics.add_gauge(
+        "rag_requests_in_flight",
+        "Различные вопросы в обработке",
+        lambda: (
+            rag_service.ainflight.stats()["in_flight"] + rag_service.inflight.stats()["in_flight"]
+        ),
+    )
+
+    answer_cache = rag_service.answer_cache
+    if answer_cache is None:
+        return
+    metrics.add_gauge("rag_answer_cache_hits", "Ответы из кэша", lambda: answer_cache.hits)
+    metrics.add_gauge(
+        "rag_answer_cache_misses", "Промахи кэша ответов", lambda: answer_cache.misses
+    )
+    metrics.add_gauge(
+        "rag_answer_cache_hit_rate",
+        "Доля вопросов, отвеченных из кэша",
+        lambda: answer_cache.stats()["hit_rate"],
+    )
+    metrics.add_gauge(
+        "rag_answer_cache_saved_latency_seconds",
+        "Время генерации, сэкономленное ответами из кэша",
+        lambda: answer_cache.stats()["saved_latency_seconds"],
+    )
+
+
+async def start_metrics(metrics_port: int) -> Optional[web.AppRunner]:
+    """Эндпоинт метрик; счетчики регистрируются после прогрева"""
+    if not settings.METRICS_ENABLED:
+        return None
+    register_gauges()
+    return await start_metrics_server(settings.METRICS_HOST, metrics_port)
+
+
+async def stop_background(metrics_runner: Optional[web.AppRunner]):
+    if metrics_runner is not None:
+        await metrics_runner.cleanup()
+    if "services.gigachat_client" in sys.modules:
+        from services.gigachat_client import close_gigachat_client
+
+        await close_gigachat_client()
+
+
 async def start():
+    metrics_runner = None
     try:
-        await set_commands(bot)
+        await asyncio.gather(warm_up(), set_commands(bot))
+        metrics_runner = await start_metrics(settings.METRICS_PORT)
         await dp.start_polling(bot, skip_updates=True)
     finally:
+        await stop_background(metrics_runner)
         await bot.session.close()
 
 
+def create_webhook_app() -> web.Application:
+    """aiohttp-приложение, принимающее обновления Telegram на WEBHOOK_PATH"""
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp, bot=bot, secret_token=settings.WEBHOOK_SECRET or None
+    ).register(app, path=settings.WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def serve_webhook():
+    """Webhook в одном процессе: прием и обработка обновлений"""
+    metrics_runner = None
+    runner = web.AppRunner(create_webhook_app(), access_log=None)
+    try:
+        await warm_up(import_corpus=False)
+        metrics_runner = await start_metrics(settings.METRICS_PORT)
+        await runner.setup()
+        await web.TCPSite(runner, settings.WEBAPP_HOST, settings.WEBAPP_PORT).start()
+        logging.info(
+            f"Webhook слушает {settings.WEBAPP_HOST}:{settings.WEBAPP_PORT}{settings.WEBHOOK_PATH}"
+        )
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        await stop_background(metrics_runner)
+
+
+async def work_on_updates(worker: int, updates: Queue, ready: Event):
+    """
+    Webhook-воркер: обрабатывает обновления своих чатов из очереди главного процесса.
+
+    Все вопросы чата попадают в один воркер, поэтому лимиты пользователя,
+    вытеснение устаревших вопросов и склейка работают как в одном процессе.
+    Общий лимит запросов к LLM делится между воркерами.
+    """
+    ml.scheduler = FairScheduler(
+        max_concurrency=worker_concurrency(settings.LLM_MAX_CONCURRENCY, settings.WEBHOOK_WORKERS)
+    )
+    metrics_runner = None
+    try:
+        await warm_up(import_corpus=False)
+        metrics_runner = await start_metrics(settings.METRICS_PORT + worker)
+        ready.set()
+        logging.info(f"Webhook-воркер {worker} готов")
+        await consume_updates(updates, partial(dp.feed_raw_update, bot))
+    finally:
+        await stop_background(metrics_runner)
+        await dp.storage.close()
+        await bot.session.close()
+
+
+def run_webhook_worker(worker: int, updates: Queue, ready: Event):
+    try:
+        asyncio.run(work_on_updates(worker, updates, ready))
+    except KeyboardInterrupt:
+        pass
+
+
+async def serve_router(queues: List[Queue], ready: List[Event]):
+    """
+    Прием webhook в главном процессе и раздача обновлений воркерам по чатам.
+    Порт открывается после прогрева всех воркеров.
+    """
+    app = create_router_app(queues, settings.WEBHOOK_PATH, settings.WEBHOOK_SECRET or None)
+    runner = web.AppRunner(app, access_log=None)
+    try:
+        for event in ready:
+            await asyncio.to_thread(event.wait)
+        await runner.setup()
+        await web.TCPSite(runner, settings.WEBAPP_HOST, settings.WEBAPP_PORT).start()
+        logging.info(
+            f"Webhook слушает {settings.WEBAPP_HOST}:{settings.WEBAPP_PORT}{settings.WEBHOOK_PATH}"
+            f", воркеров: {len(queues)}"
+        )
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+async def prepare_collection():
+    """Импорт корпуса и создание коллекции до запуска воркеров, которые ее только читают"""
+    await import_corpus_index()
+    rag_service = await ml.aget_rag_service()
+    await asyncio.to_thread(
+        rag_service.chroma_service.create_or_get_collection, ml.collection_name
+    )
+
+
+async def register_webhook():
+    """Подготовка корпуса, команды и регистрация webhook - один раз до запуска воркеров"""
+    try:
+        await asyncio.gather(prepare_collection(), set_commands(bot))
+        await bot.set_webhook(
+            url=f"{settings.WEBHOOK_BASE_URL.rstrip('/')}{settings.WEBHOOK_PATH}",
+            secret_token=settings.WEBHOOK_SECRET or None,
+            drop_pending_updates=True,
+        )
+    finally:
+        await bot.session.close()
+
+
+def run_webhook():
+    if not settings.WEBHOOK_BASE_URL:
+        raise ValueError("Для режима webhook нужен WEBHOOK_BASE_URL")
+    asyncio.run(register_webhook())
+
+    if settings.WEBHOOK_WORKERS <= 1:
+        asyncio.run(serve_webhook())
+        return
+
+    # Корпус уже импортирован выше: воркеры только читают ChromaDB и индексы BM25
+    os.environ["CHROMA_READ_ONLY"] = "true"
+    # spawn: каждый воркер заново создает клиентов ChromaDB и GigaChat
+    context = multiprocessing.get_context("spawn")
+    queues = [context.Queue() for _ in range(settings.WEBHOOK_WORKERS)]
+    ready = [context.Event() for _ in range(settings.WEBHOOK_WORKERS)]
+    workers = [
+        context.Process(
+            target=run_webhook_worker, args=(i, queues[i], ready[i]), name=f"webhook-{i}"
+        )
+        for i in range(settings.WEBHOOK_WORKERS)
+    ]
+    for worker in workers:
+        worker.start()
+    try:
+        asyncio.run(serve_router(queues, ready))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for queue in queues:
+            queue.put(None)
+        for worker in workers:
+            worker.join()
+
+
 if __name__ == "__main__":
-    asyncio.run(start())
+    if settings.BOT_RUN_MODE == "webhook":
+        run_webhook()
+    else:
+        asyncio.run(start())
@@ -21,13 +21,108 @@ class Settings(BaseSettings):
     TG_BOT_TOKEN: str = os.getenv("TG_BOT_TOKEN")
 
     GIGACHAT_API_KEY: str = os.getenv("GIGACHAT_API_KEY")
+    # Бэкенд эмбеддингов: gigachat, hashing (локальный, без сети) или sentence-transformers
     EMBEDDING_SERVICE: str = "gigachat"
+    EMBEDDING_LOCAL_MODEL: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+    EMBEDDING_LOCAL_DIM: int = 512
+    EMBEDDING_THREADS: int = 2
+    # Батчинг запросов к эмбеддеру (GigaChat принимает не более 90 текстов за запрос)
+    EMBEDDING_BATCH_SIZE: int = 50
+    EMBEDDING_MAX_CONCURRENCY: int = 4
+    EMBEDDING_MAX_RETRIES: int = 3
+    EMBEDDING_RETRY_BACKOFF: float = 1.0
+    # Дисковый кэш эмбеддингов (SQLite, float32)
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_PATH: str = "./chroma_db/embedding_cache.sqlite3"
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 100_000
     LLM_GIGACHAT_MODEL: str = "GigaChat-Pro"
 
+    # Общий клиент GigaChat: пул соединений и обновление токена заранее, секунды
+    GIGACHAT_MAX_CONNECTIONS: int = 20
+    GIGACHAT_TOKEN_REFRESH_MARGIN: float = 300.0
+    GIGACHAT_TOKEN_EXPIRY_SKEW: float = 30.0
+
+    # Семантический кэш ответов
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_THRESHOLD: float = 0.95
+    ANSWER_CACHE_TTL: float = 3600
+    ANSWER_CACHE_MAX_ENTRIES: int = 1000
+
     CHROMA_PERSIST_DIRECTORY: str = "./chroma_db"
+    # Только чтение ChromaDB и лексических индексов: так запускаются webhook-воркеры,
+    # а пишет в хранилище один главный процесс
+    CHROMA_READ_ONLY: bool = False
+    # Режим поиска: dense (векторный), lexical (BM25, без эмбеддингов) или hybrid (оба + RRF).
+    # Индекс BM25 ведется при загрузке только в режимах lexical и hybrid
+    RETRIEVAL_MODE: str = "dense"
+    RETRIEVAL_N_RESULTS: int = 5
+    # Кандидатов от каждого поиска перед объединением в гибридном режиме
+    RETRIEVAL_CANDIDATES: int = 20
+    # Документы с косинусным расстоянием больше порога не попадают в контекст
+    RETRIEVAL_MAX_DISTANCE: float = 0.9
+    RRF_K: int = 60
+    BM25_K1: float = 1.5
+    BM25_B: float = 0.75
+    # Реранкинг кандидатов: lexical, cross-encoder или none
+    RERANKER: str = "none"
+    RERANK_MODEL: str = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+    RERANK_CANDIDATES: int = 20
+    # Батчи, не начатые до исчерпания бюджета, не оцениваются и сохраняют исходный порядок
+    RERANK_BUDGET_MS: float = 50.0
+    # Бюджет контекста в промпте; токены оцениваются по числу символов
+    CONTEXT_MAX_TOKENS: int = 2000
+    CONTEXT_CHARS_PER_TOKEN: float = 3.0
+    # Предпосчитанный индекс корпуса, импортируется в ChromaDB при старте бота
+    CORPUS_INDEX_PATH: str = "./corpus_index"
     # Настройки для обработки текста
     CHUNK_SIZE: int = 1000
     CHUNK_OVERLAP: int = 50
+    # characters - по словам, как RecursiveCharacterTextSplitter; sentences - по предложениям
+    CHUNK_STRATEGY: str = "characters"
+
+    # Конвейер загрузки документов
+    INGEST_PROCESS_WORKERS: int = min(4, os.cpu_count() or 1)
+    INGEST_EMBED_WORKERS: int = 4
+    INGEST_UPSERT_BATCH_SIZE: int = 256
+    INGEST_QUEUE_SIZE: int = 8
+
+    # Размер пула потоков для блокирующих вызовов (эмбеддинги, ChromaDB) из асинхронного кода
+    RAG_EXECUTOR_WORKERS: int = 8
+    # Параллельных генераций LLM при пакетной обработке вопросов
+    RAG_BATCH_CONCURRENCY: int = 4
+
+    # Потоковая выдача ответа: не чаще одного редактирования сообщения за интервал
+    STREAM_EDIT_INTERVAL: float = 1.0
+    TELEGRAM_MAX_MESSAGE_LENGTH: int = 4096
+
+    # Планировщик запросов к LLM: общий лимит параллелизма и лимит на пользователя
+    LLM_MAX_CONCURRENCY: int = 4
+    USER_REQUESTS_PER_MINUTE: float = 6.0
+    USER_REQUEST_BURST: float = 3.0
+    SCHEDULER_MAX_QUEUED: int = 200
+    SCHEDULER_MAX_BUCKETS: int = 10_000
+
+    # Склейка одновременных одинаковых вопросов в один запрос
+    REQUEST_COALESCING_ENABLED: bool = True
+
+    # Режим запуска бота: polling или webhook (aiohttp, несколько процессов)
+    BOT_RUN_MODE: str = "polling"
+    WEBHOOK_BASE_URL: str = ""
+    WEBHOOK_PATH: str = "/webhook"
+    WEBHOOK_SECRET: str = ""
+    WEBAPP_HOST: str = "0.0.0.0"
+    WEBAPP_PORT: int = 8080
+    WEBHOOK_WORKERS: int = 1
+    # Адрес Bot API, например локальный мок для нагрузочного теста
+    TELEGRAM_API_URL: str = ""
+    # Хранилище состояний FSM, общее для всех процессов: sqlite или memory
+    FSM_STORAGE: str = "sqlite"
+    FSM_STORAGE_PATH: str = "./chroma_db/fsm_storage.sqlite3"
+
+    # Метрики длительности стадий и эндпоинт /metrics в формате Prometheus
+    METRICS_ENABLED: bool = False
+    METRICS_HOST: str = "0.0.0.0"
+    METRICS_PORT: int = 9100
 
     COLLECTION_NAME: str = os.getenv("CHROMA_COLLECTION_NAME")
 
@@ -1,23 +1,102 @@
+from typing import TYPE_CHECKING, AsyncIterator, Optional
+import asyncio
+import threading
+
 from aiogram import Router
 from aiogram.types import Message
 from aiogram.fsm.context import FSMContext
 
+from config import settings
 from utils.states import ProcessLLMStates
-from services.rag_service import RAGService
-import os
-from dotenv import load_dotenv
+from services.scheduler import FairScheduler, RequestSuperseded, SchedulerFull
+from utils.streaming import PLACEHOLDER_TEXT, TelegramStreamWriter
+
+if TYPE_CHECKING:
+    from services.rag_service import RAGService
+
+scheduler = FairScheduler()
+collection_name = settings.COLLECTION_NAME
+
+_rag_service: Optional["RAGService"] = None
+_rag_service_lock = threading.Lock()
+
+
+def get_rag_service() -> "RAGService":
+    """
+    RAGService создается при первом обращении.
+
+    Импорт модуля не тянет chromadb и langchain и не открывает клиентов,
+    поэтому бот быстро поднимается после перезапуска; прогрев вызывает эту
+    функцию заранее (см. app.warm_up).
+    """
+    global _rag_service
+    if _rag_service is None:
+        with _rag_service_lock:
+            if _rag_service is None:
+                from services.rag_service import RAGService
+
+                _rag_service = RAGService()
+    return _rag_service
+
+
+async def aget_rag_service() -> "RAGService":
+    """get_rag_service без блокировки event loop, пока сервис еще создается"""
+    if _rag_service is not None:
+        return _rag_service
+    return await asyncio.to_thread(get_rag_service)
+
+
+def join_in_flight(query: str) -> Optional[AsyncIterator[str]]:
+    """Поток уже генерируемого ответа на такой же вопрос; до создания сервиса потоков нет"""
+    if _rag_service is None:
+        return None
+    return _rag_service.ajoin_answer(query, collection_name)
 
-rag_service = RAGService()
-load_dotenv()
-collection_name = os.getenv("CHROMA_COLLECTION_NAME")
 
 router = Router()
 
+QUEUE_POSITION_TEXT = "Сейчас много вопросов, ваш - {position}-й в очереди. Ответ появится здесь."
+SUPERSEDED_TEXT = "Этот вопрос пропущен: вы задали новый."
+BUSY_TEXT = "Бот перегружен, попробуйте задать вопрос чуть позже."
+
 
 @router.message(ProcessLLMStates.waitForText)
 async def request_generate(message: Message, state: FSMContext):
     query = message.text
 
-    answer = rag_service.generate_answer(query, collection_name)
+    # Такой же вопрос уже генерируется: читаем его поток, не занимая место в очереди
+    joined = join_in_flight(query)
+    if joined is not None:
+        writer = TelegramStreamWriter(message)
+        await writer.start()
+        try:
+            async for chunk in joined:
+                await writer.write(chunk)
+        finally:
+            await writer.finish()
+        return
+
+    try:
+        ticket = scheduler.submit(message.chat.id)
+    except SchedulerFull:
+        await message.answer(BUSY_TEXT)
+        return
+
+    position = ticket.position
+    placeholder = QUEUE_POSITION_TEXT.format(position=position) if position else PLACEHOLDER_TEXT
 
-    await message.answer(answer)
+    # Заглушка редактируется по мере генерации ответа
+    writer = TelegramStreamWriter(message, placeholder=placeholder)
+    try:
+        await writer.start()
+        try:
+            async with ticket:
+                rag_service = await aget_rag_service()
+                async for chunk in rag_service.astream_answer(query, collection_name):
+                    await writer.write(chunk)
+        except RequestSuperseded:
+            await writer.write(SUPERSEDED_TEXT)
+        finally:
+            await writer.finish()
+    finally:
+        ticket.cancel()
@@ -0,0 +1,109 @@
+"""
+Бенчмарк пакетной генерации ответов без обращения к внешним API.
+
+Сравнивает последовательный generate_answer по одному вопросу с
+RAGService.generate_answers. Эмбеддер и LLM - локальные заглушки с
+имитацией сетевой задержки, корпус загружается во временную ChromaDB.
+
+Запуск: python -m scripts.bench_batch_answers --docs-dir /app/data/scratches/cleaned_docs
+"""
+import argparse
+import json
+import logging
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from services.chroma_service import ChromaService
+from services.gigachat_service import GigaChatService
+from services.ingestion import IngestManifest, IngestPipeline
+from services.rag_service import RAGService
+from services.text_processor import TextProcessor
+from scripts.bench_embeddings import FakeEmbeddingsService
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "bench"
+
+
+class FakeGigaChatService(GigaChatService):
+    """LLM-заглушка: фиксированная задержка на ответ"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def generate_response(
+        self, query: str, context: List[str], metadatas: Optional[List[Dict]] = None
+    ) -> str:
+        self.generate_context(context, metadatas)
+        time.sleep(self.latency)
+        return f"Ответ на: {query}"
+
+
+def make_rag_service(
+    persist_directory: str, docs_dir: Path, embed_latency: float, llm_latency: float
+) -> RAGService:
+    chroma_service = ChromaService(persist_directory=persist_directory)
+    chroma_service.embeddings = FakeEmbeddingsService(request_latency=embed_latency)
+
+    pipeline = IngestPipeline(
+        chroma_service,
+        TextProcessor(),
+        IngestManifest(str(Path(persist_directory) / "manifest.json")),
+    )
+    pipeline.run(COLLECTION, [(path, {}) for path in sorted(docs_dir.glob("*.txt"))])
+
+    rag_service = RAGService(
+        chroma_service=chroma_service, giga_chat_service=FakeGigaChatService(llm_latency)
+    )
+    # Сравниваем полный путь запроса, без ответов из кэша
+    rag_service.answer_cache = None
+    return rag_service
+
+
+def run_benchmark(rag_service: RAGService, questions: List[str], concurrency: int) -> Dict:
+    start = time.perf_counter()
+    for question in questions:
+        rag_service.generate_answer(question, COLLECTION)
+    sequential = time.perf_counter() - start
+
+    start = time.perf_counter()
+    answers = rag_service.generate_answers(questions, COLLECTION, max_concurrency=concurrency)
+    batched = time.perf_counter() - start
+
+    assert len(answers) == len(questions)
+    return {
+        "questions": len(questions),
+        "concurrency": concurrency,
+        "sequential_seconds": round(sequential, 3),
+        "batched_seconds": round(batched, 3),
+        "speedup": round(sequential / batched, 1),
+    }
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs-dir", default="/app/data/scratches/cleaned_docs")
+    parser.add_argument("--questions-file", default="data/test_data.json")
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    with open(args.questions_file, "r", encoding="utf-8") as f:
+        base_questions = [item["question"] for item in json.load(f)]
+    # Нумеруем вопросы, чтобы они не совпадали между собой
+    questions = [
+        f"{base_questions[i % len(base_questions)]} ({i})" for i in range(args.questions)
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rag_service = make_rag_service(
+            tmp, Path(args.docs_dir), args.embed_latency, args.llm_latency
+        )
+        results = run_benchmark(rag_service, questions, args.concurrency)
+
+    print(json.dumps(results, ensure_ascii=False, indent=2))
@@ -0,0 +1,74 @@
+"""
+Микробенчмарк накладных расходов на получение коллекции в ChromaService.
+
+"before" повторяет прежнее поведение: get_or_create_collection и count()
+на каждый запрос. "after" - запрос через реестр открытых коллекций.
+Эмбеддинг запроса посчитан заранее, поэтому измеряется только работа с ChromaDB.
+
+Запуск: python -m scripts.bench_collection_handles --docs 1000 --queries 200
+"""
+import argparse
+import logging
+import statistics
+import tempfile
+import time
+
+from services.chroma_service import ChromaService
+from scripts.bench_embeddings import FakeEmbeddingsService
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "bench_handles"
+
+
+def query_before(service: ChromaService, embedding) -> dict:
+    collection = service.client.get_or_create_collection(
+        name=COLLECTION,
+        embedding_function=service.embeddings,
+        metadata={"hnsw:space": "cosine"},
+    )
+    collection.count()
+    return collection.query(query_embeddings=[embedding], n_results=5)
+
+
+def query_after(service: ChromaService, embedding) -> dict:
+    return service.query_documents(
+        COLLECTION, query_text="", n_results=5, query_embedding=embedding
+    )
+
+
+def measure(func, service, embeddings) -> dict:
+    timings = []
+    for embedding in embeddings:
+        start = time.perf_counter()
+        func(service, embedding)
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "mean_ms": round(statistics.mean(timings), 3),
+        "p50_ms": round(statistics.median(timings), 3),
+    }
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        service = ChromaService(persist_directory=tmp)
+        service.embeddings = FakeEmbeddingsService(dim=256, request_latency=0)
+
+        texts = [f"Документ номер {i} о Русско-японской войне" for i in range(args.docs)]
+        service.add_documents(COLLECTION, texts, ids=[str(i) for i in range(args.docs)])
+        query_embeddings = service.embeddings(
+            [f"Вопрос {i}" for i in range(args.queries)]
+        )
+
+        before = measure(query_before, service, query_embeddings)
+        after = measure(query_after, service, query_embeddings)
+
+    print(f"before: {before}")
+    print(f"after:  {after}")
+    print(f"overhead saved per query: {before['mean_ms'] - after['mean_ms']:.3f} ms")
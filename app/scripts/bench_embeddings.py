@@ -0,0 +1,99 @@
+"""
+Бенчмарк батчинга эмбеддингов на локальном фейковом эмбеддере.
+
+Фейковый эмбеддер имитирует сетевую задержку на запрос и время обработки
+на текст, поэтому показывает выигрыш от батчинга без обращения к API.
+
+Запуск: python -m scripts.bench_embeddings --texts 500 --batch-sizes 1 10 50 90
+"""
+import argparse
+import hashlib
+import logging
+import time
+from typing import List
+
+from services.embeddings import BaseEmbeddingsService
+
+logger = logging.getLogger(__name__)
+
+
+class FakeEmbeddingsService(BaseEmbeddingsService):
+    """Детерминированный эмбеддер с имитацией задержки HTTP-запроса"""
+
+    def __init__(
+        self,
+        dim: int = 1024,
+        request_latency: float = 0.05,
+        per_text_latency: float = 0.001,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.dim = dim
+        self.request_latency = request_latency
+        self.per_text_latency = per_text_latency
+        self.requests = 0
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        self.requests += 1
+        time.sleep(self.request_latency + self.per_text_latency * len(texts))
+        return [self._embed(text) for text in texts]
+
+    def _embed(self, text: str) -> List[float]:
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return [digest[i % len(digest)] / 255.0 for i in range(self.dim)]
+
+
+def run_benchmark(
+    n_texts: int,
+    batch_sizes: List[int],
+    max_concurrency: int,
+    request_latency: float,
+) -> List[dict]:
+    texts = [f"Тестовый чанк лекции номер {i}" for i in range(n_texts)]
+    results = []
+
+    for batch_size in batch_sizes:
+        embedder = FakeEmbeddingsService(
+            request_latency=request_latency,
+            batch_size=batch_size,
+            max_concurrency=max_concurrency,
+        )
+        start = time.perf_counter()
+        embeddings = embedder(texts)
+        elapsed = time.perf_counter() - start
+
+        assert len(embeddings) == n_texts
+        results.append(
+            {
+                "batch_size": batch_size,
+                "requests": embedder.requests,
+                "seconds": round(elapsed, 3),
+                "texts_per_sec": round(n_texts / elapsed, 1),
+            }
+        )
+        logger.info(f"Результат: {results[-1]}")
+
+    return results
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--texts", type=int, default=500)
+    parser.add_argument(
+        "--batch-sizes", type=int, nargs="+", default=[1, 10, 25, 50, 90]
+    )
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    results = run_benchmark(
+        args.texts, args.batch_sizes, args.concurrency, args.latency
+    )
+
+    print(f"{'batch_size':>10} {'requests':>9} {'seconds':>9} {'texts/sec':>10}")
+    for row in results:
+        print(
+            f"{row['batch_size']:>10} {row['requests']:>9} "
+            f"{row['seconds']:>9} {row['texts_per_sec']:>10}"
+        )
@@ -0,0 +1,67 @@
+"""
+Бенчмарк конвейера загрузки на корпусе scratches/cleaned_docs.
+
+Сравнивает последовательную загрузку (IngestPipeline без пула процессов,
+с одним потоком эмбеддинга) с конвейером в настройках по умолчанию. Эмбеддинги считает локальный фейковый эмбеддер
+с имитацией сетевой задержки, ChromaDB создается во временной директории.
+
+Запуск: python -m scripts.bench_ingest --docs-dir /app/data/scratches/cleaned_docs
+"""
+import argparse
+import json
+import logging
+import tempfile
+from pathlib import Path
+
+from services.chroma_service import ChromaService
+from services.ingestion import IngestManifest, IngestPipeline
+from services.text_processor import TextProcessor
+from scripts.bench_embeddings import FakeEmbeddingsService
+
+logger = logging.getLogger(__name__)
+
+
+def make_chroma_service(persist_directory: str, latency: float) -> ChromaService:
+    service = ChromaService(persist_directory=persist_directory)
+    service.embeddings = FakeEmbeddingsService(request_latency=latency, max_concurrency=1)
+    return service
+
+
+def run_sequential(docs_dir: Path, workdir: Path, latency: float) -> dict:
+    chroma_service = make_chroma_service(str(workdir / "sequential"), latency)
+    pipeline = IngestPipeline(
+        chroma_service,
+        TextProcessor(),
+        IngestManifest(str(workdir / "sequential.json")),
+        process_workers=0,
+        embed_workers=1,
+    )
+    files = [(file_path, {}) for file_path in sorted(docs_dir.glob("*.txt"))]
+    result = pipeline.run("bench", files)
+    return {"added": result["added"], "wall_seconds": result["wall_seconds"]}
+
+
+def run_pipeline(docs_dir: Path, workdir: Path, latency: float) -> dict:
+    chroma_service = make_chroma_service(str(workdir / "pipeline"), latency)
+    pipeline = IngestPipeline(
+        chroma_service, TextProcessor(), IngestManifest(str(workdir / "pipeline.json"))
+    )
+    files = [(file_path, {}) for file_path in sorted(docs_dir.glob("*.txt"))]
+    return pipeline.run("bench", files)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs-dir", default="/app/data/scratches/cleaned_docs")
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        docs_dir, workdir = Path(args.docs_dir), Path(tmp)
+        results = {
+            "sequential": run_sequential(docs_dir, workdir, args.latency),
+            "pipeline": run_pipeline(docs_dir, workdir, args.latency),
+        }
+
+    print(json.dumps(results, ensure_ascii=False, indent=2))
@@ -0,0 +1,289 @@
+"""
+Офлайн-бенчмарк поиска: качество и задержка без обращения к внешним API.
+
+Корпус scratches/cleaned_docs загружается во временную ChromaDB с
+детерминированным локальным эмбеддером (hashing) для каждой комбинации
+стратегии разбиения, размера чанка и перекрытия. Для каждого режима поиска, реранкера и k
+считаются recall@k, MRR@k и перцентили задержки поиска на фиксированном
+наборе вопросов data/retrieval_benchmark.json.
+
+Чанк считается релевантным, если он взят из одного из файлов sources
+вопроса и содержит одно из ключевых слов keywords.
+
+Результаты пишутся в JSON; с --baseline результаты сравниваются
+с предыдущим запуском, и при падении качества скрипт завершается с ошибкой.
+
+Запуск: python -m scripts.bench_retrieval --docs-dir /app/data/scratches/cleaned_docs \
+    --chunk-sizes 500 1000 --chunk-strategies characters sentences --k 5 10 \
+    --output retrieval.json
+"""
+import argparse
+import itertools
+import json
+import logging
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from services.chroma_service import ChromaService
+from services.ingestion import IngestManifest, IngestPipeline
+from services.rag_service import RAGService
+from services.reranker import get_reranker
+from services.retrieval import RetrievalResult
+from services.text_processor import TextProcessor
+from scripts.bench_batch_answers import FakeGigaChatService
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "bench_retrieval"
+
+
+def load_questions(path: str) -> List[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def is_relevant(question: Dict, document: str, metadata: Dict) -> bool:
+    """Чанк из файла-источника вопроса, содержащий одно из ключевых слов"""
+    if Path(metadata.get("path", "")).stem not in question["sources"]:
+        return False
+    document = document.lower()
+    return any(keyword.lower() in document for keyword in question["keywords"])
+
+
+def first_relevant_rank(question: Dict, result: RetrievalResult) -> Optional[int]:
+    for rank, (document, metadata) in enumerate(zip(result.documents, result.metadatas), 1):
+        if is_relevant(question, document, metadata):
+            return rank
+    return None
+
+
+def percentiles(latencies: List[float]) -> Dict:
+    p50, p95, p99 = np.percentile(np.asarray(latencies) * 1000, [50, 95, 99])
+    return {"p50": round(p50, 3), "p95": round(p95, 3), "p99": round(p99, 3)}
+
+
+def ingest(
+    chroma_service: ChromaService,
+    files: List[Path],
+    chunk_size: int,
+    chunk_overlap: int,
+    workdir: Path,
+    process_workers: Optional[int] = None,
+    chunk_strategy: str = "characters",
+) -> Dict:
+    """Загрузка корпуса и пропускная способность загрузки"""
+    kwargs = {} if process_workers is None else {"process_workers": process_workers}
+    pipeline = IngestPipeline(
+        chroma_service,
+        TextProcessor(
+            chunk_size=chunk_size, chunk_overlap=chunk_overlap, chunk_strategy=chunk_strategy
+        ),
+        IngestManifest(str(workdir / "manifest.json")),
+        **kwargs,
+    )
+    start = time.perf_counter()
+    stats = pipeline.run(COLLECTION, [(path, {}) for path in files])
+    chroma_service.save_lexical_indexes()
+    elapsed = time.perf_counter() - start
+    collection = chroma_service.create_or_get_collection(COLLECTION)
+    chunk_lengths = [
+        int(metadata["chunk_text_length"])
+        for metadata in collection.get(include=["metadatas"])["metadatas"]
+    ]
+    return {
+        "files": len(files),
+        "chunks": stats["added"],
+        "avg_chunk_size": round(float(np.mean(chunk_lengths)), 1) if chunk_lengths else 0.0,
+        "seconds": round(elapsed, 3),
+        "chunks_per_sec": round(stats["added"] / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def evaluate_retrieval(
+    rag_service: RAGService, questions: List[Dict], k: int, repeat: int
+) -> Dict:
+    """recall@k, MRR@k и перцентили задержки поиска"""
+    # Прогрев: ленивые индексы и handles коллекций не должны попадать в замеры
+    rag_service.retrieve(questions[0]["question"], COLLECTION, n_results=k)
+
+    latencies, ranks = [], []
+    for attempt in range(repeat):
+        for question in questions:
+            start = time.perf_counter()
+            result = rag_service.retrieve(question["question"], COLLECTION, n_results=k)
+            latencies.append(time.perf_counter() - start)
+            if attempt == 0:
+                ranks.append(first_relevant_rank(question, result))
+
+    hits = [rank for rank in ranks if rank is not None]
+    return {
+        f"recall@{k}": round(len(hits) / len(questions), 4),
+        f"mrr@{k}": round(sum(1 / rank for rank in hits) / len(questions), 4),
+        "latency_ms": percentiles(latencies),
+        "misses": [q["question"] for q, rank in zip(questions, ranks) if rank is None],
+    }
+
+
+def run_benchmark(
+    docs_dir: str,
+    questions: List[Dict],
+    chunk_sizes: List[int],
+    chunk_overlaps: List[int],
+    modes: List[str],
+    rerankers: List[str],
+    ks: List[int],
+    repeat: int = 3,
+    process_workers: Optional[int] = None,
+    chunk_strategies: Optional[List[str]] = None,
+) -> Dict:
+    files = sorted(Path(docs_dir).glob("*.txt"))
+    runs = []
+
+    for chunk_strategy, chunk_size, chunk_overlap in itertools.product(
+        chunk_strategies or ["characters"], chunk_sizes, chunk_overlaps
+    ):
+        if chunk_overlap >= chunk_size:
+            continue
+        with tempfile.TemporaryDirectory() as tmp:
+            workdir = Path(tmp)
+            chroma_service = ChromaService(
+                embedding_service="hashing",
+                persist_directory=str(workdir / "chroma"),
+                lexical_index=True,
+            )
+            ingest_stats = ingest(
+                chroma_service,
+                files,
+                chunk_size,
+                chunk_overlap,
+                workdir,
+                process_workers,
+                chunk_strategy,
+            )
+            logger.info(
+                f"{chunk_strategy}, chunk_size={chunk_size}, overlap={chunk_overlap}: "
+                f"{ingest_stats}"
+            )
+
+            for mode, reranker, k in itertools.product(modes, rerankers, ks):
+                rag_service = RAGService(
+                    chroma_service=chroma_service,
+                    giga_chat_service=FakeGigaChatService(latency=0),
+                    retrieval_mode=mode,
+                )
+                rag_service.reranker = get_reranker(reranker)
+                metrics = evaluate_retrieval(rag_service, questions, k, repeat)
+                run = {
+                    "chunk_strategy": chunk_strategy,
+                    "chunk_size": chunk_size,
+                    "chunk_overlap": chunk_overlap,
+                    "mode": mode,
+                    "reranker": reranker,
+                    "k": k,
+                    "ingest": ingest_stats,
+                    **metrics,
+                }
+                logger.info(
+                    f"{mode}/{reranker} k={k}: recall={metrics[f'recall@{k}']}, "
+                    f"mrr={metrics[f'mrr@{k}']}, latency={metrics['latency_ms']}"
+                )
+                runs.append(run)
+
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "embedding_service": "hashing",
+        "questions": len(questions),
+        "runs": runs,
+    }
+
+
+def run_key(run: Dict) -> tuple:
+    return (
+        run.get("chunk_strategy", "characters"),
+        run["chunk_size"],
+        run["chunk_overlap"],
+        run["mode"],
+        run["reranker"],
+        run["k"],
+    )
+
+
+def compare_results(baseline: Dict, current: Dict, tolerance: float = 0.01) -> List[str]:
+    """Список регрессий качества относительно предыдущего запуска"""
+    previous = {run_key(run): run for run in baseline["runs"]}
+    regressions = []
+    for run in current["runs"]:
+        old = previous.get(run_key(run))
+        if old is None:
+            continue
+        for metric in (f"recall@{run['k']}", f"mrr@{run['k']}"):
+            if run[metric] < old[metric] - tolerance:
+                regressions.append(f"{run_key(run)} {metric}: {old[metric]} -> {run[metric]}")
+    return regressions
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    # Логи загрузки и поиска заглушают итоговую таблицу
+    for name in ("services", "chromadb"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--docs-dir", default="/app/data/scratches/cleaned_docs")
+    parser.add_argument("--questions-file", default="data/retrieval_benchmark.json")
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[1000])
+    parser.add_argument("--chunk-overlaps", type=int, nargs="+", default=[50])
+    parser.add_argument("--chunk-strategies", nargs="+", default=["characters"])
+    parser.add_argument("--modes", nargs="+", default=["dense", "lexical", "hybrid"])
+    parser.add_argument("--rerankers", nargs="+", default=["none", "lexical"])
+    parser.add_argument("--k", type=int, nargs="+", default=[5])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default="retrieval_benchmark_results.json")
+    parser.add_argument("--baseline", help="JSON предыдущего запуска для сравнения")
+    parser.add_argument("--tolerance", type=float, default=0.01)
+    args = parser.parse_args()
+
+    results = run_benchmark(
+        args.docs_dir,
+        load_questions(args.questions_file),
+        args.chunk_sizes,
+        args.chunk_overlaps,
+        args.modes,
+        args.rerankers,
+        args.k,
+        args.repeat,
+        chunk_strategies=args.chunk_strategies,
+    )
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+    print(
+        f"{'strategy':>10} {'chunk':>6} {'overlap':>7} {'mode':>8} {'reranker':>9} {'k':>3} "
+        f"{'recall':>7} {'mrr':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+    )
+    for run in results["runs"]:
+        k = run["k"]
+        print(
+            f"{run['chunk_strategy']:>10} {run['chunk_size']:>6} {run['chunk_overlap']:>7} "
+            f"{run['mode']:>8} "
+            f"{run['reranker']:>9} {k:>3} {run[f'recall@{k}']:>7} {run[f'mrr@{k}']:>6} "
+            f"{run['latency_ms']['p50']:>8} {run['latency_ms']['p95']:>8} "
+            f"{run['latency_ms']['p99']:>8}"
+        )
+    print(f"Результаты сохранены в {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare_results(json.load(f), results, args.tolerance)
+        for regression in regressions:
+            print(f"Регрессия: {regression}")
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,105 @@
+"""
+Бенчмарк времени старта бота: разбор python -X importtime по пакетам.
+
+Каждый модуль импортируется в свежем интерпретаторе. Печатается суммарное
+время импорта, вклад пакетов верхнего уровня (chromadb, langchain_core,
+aiogram...) и самые медленные модули. С --construct дополнительно
+замеряется создание RAGService, которое бот выполняет при прогреве.
+
+Запуск: python -m scripts.bench_startup --modules routes.ml app --repeat 3
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, NamedTuple
+
+CONSTRUCT_CODE = (
+    "import time; from routes import ml; start = time.perf_counter(); "
+    "ml.get_rag_service(); print(time.perf_counter() - start)"
+)
+
+
+class ImportRecord(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse_importtime(stderr: str) -> List[ImportRecord]:
+    """Строки вида 'import time:  self | cumulative | <отступ>module'"""
+    records = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # заголовок таблицы
+        name = parts[2].rstrip()
+        stripped = name.lstrip()
+        depth = (len(name) - len(stripped) - 1) // 2
+        records.append(ImportRecord(stripped, int(parts[0]), int(parts[1]), depth))
+    return records
+
+
+def summarize(records: List[ImportRecord], top: int) -> Dict:
+    by_package: Dict[str, int] = defaultdict(int)
+    for record in records:
+        by_package[record.module.split(".")[0]] += record.self_us
+    packages = sorted(by_package.items(), key=lambda item: item[1], reverse=True)
+    modules = sorted(records, key=lambda record: record.self_us, reverse=True)
+    return {
+        "total_ms": round(sum(record.self_us for record in records) / 1000, 1),
+        "modules": len(records),
+        "packages_ms": {name: round(us / 1000, 1) for name, us in packages[:top]},
+        "slowest_modules_ms": {r.module: round(r.self_us / 1000, 1) for r in modules[:top]},
+    }
+
+
+def measure_import(module: str, repeat: int, top: int) -> Dict:
+    """Медианный по повторам прогон; кэш .pyc прогревается первым запуском"""
+    subprocess.run([sys.executable, "-c", f"import {module}"], check=True)
+    runs = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        runs.append(summarize(parse_importtime(result.stderr), top))
+    runs.sort(key=lambda run: run["total_ms"])
+    report = runs[len(runs) // 2]
+    report["runs_total_ms"] = [run["total_ms"] for run in runs]
+    return report
+
+
+def measure_construct(repeat: int) -> Dict:
+    timings = [
+        float(
+            subprocess.run(
+                [sys.executable, "-c", CONSTRUCT_CODE], capture_output=True, text=True, check=True
+            ).stdout.split()[-1]
+        )
+        for _ in range(repeat)
+    ]
+    return {"rag_service_ms": round(statistics.median(timings) * 1000, 1)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--modules", nargs="+", default=["routes.ml", "services.rag_service"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--construct", action="store_true", help="замерить создание RAGService")
+    args = parser.parse_args()
+
+    report = {module: measure_import(module, args.repeat, args.top) for module in args.modules}
+    if args.construct:
+        report["warm_up"] = measure_construct(args.repeat)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
@@ -0,0 +1,109 @@
+"""
+Микробенчмарк очистки текста и чтения файлов на корпусе scratches/cleaned_docs.
+
+Сравнивает прежнюю очистку (два вызова re.sub с компиляцией по кэшу
+модуля re) с normalize_text и прежнее чтение файла (полное прочтение в
+каждой кодировке по очереди) с определением кодировки по выборке байтов.
+Результаты очистки сверяются, время - лучшее из --repeat прогонов.
+Чтение дополнительно меряется на большом файле в cp1251, размноженном из
+корпуса: прежний код читал его целиком сначала как utf-8.
+
+Запуск: python -m scripts.bench_text_normalizer --docs-dir /app/data/scratches/cleaned_docs
+"""
+import argparse
+import json
+import re
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from services.text_processor import ENCODINGS, TextProcessor, normalize_text
+
+
+def legacy_clean_text(text: str) -> str:
+    """Очистка до оптимизации"""
+    text = re.sub(r"\s+", " ", text)
+    text = re.sub(r"[^\w\s\.,!?;:()-]", "", text)
+    return text.strip()
+
+
+def legacy_read_file(file_path: Path) -> str:
+    """Чтение до оптимизации: файл целиком в каждой кодировке, пока не подойдет"""
+    for encoding in ENCODINGS:
+        try:
+            with open(file_path, "r", encoding=encoding) as file:
+                return file.read()
+        except UnicodeDecodeError:
+            continue
+    raise ValueError(f"Не удалось прочитать файл {file_path}")
+
+
+def best_time(func: Callable, items: List, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            func(item)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def compare(before: Callable, after: Callable, items: List, repeat: int, size: int):
+    before_s = best_time(before, items, repeat)
+    after_s = best_time(after, items, repeat)
+    return {
+        "before_ms": round(before_s * 1000, 2),
+        "after_ms": round(after_s * 1000, 2),
+        "before_mb_per_sec": round(size / before_s / 1e6, 1),
+        "after_mb_per_sec": round(size / after_s / 1e6, 1),
+        "speedup": round(before_s / after_s, 2),
+    }
+
+
+def compare_large_read(texts: List[str], size_mb: int, repeat: int) -> Dict:
+    text = "\n".join(texts).encode("cp1251", errors="ignore")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "large_cp1251.txt"
+        path.write_bytes(text * max(1, size_mb * 1_000_000 // len(text)))
+        processor = TextProcessor()
+        size = path.stat().st_size
+        return compare(legacy_read_file, processor.read_file, [path], repeat, size)
+
+
+def run(docs_dir: str, repeat: int, large_mb: int) -> Dict:
+    files = sorted(Path(docs_dir).glob("*.txt"))
+    processor = TextProcessor()
+    texts = [legacy_read_file(path) for path in files]
+
+    mismatched = [
+        str(path)
+        for path, text in zip(files, texts)
+        if normalize_text(text) != legacy_clean_text(text)
+    ]
+    if mismatched:
+        raise AssertionError(f"Очистка расходится с прежней: {mismatched}")
+
+    chars = sum(len(text) for text in texts)
+    file_bytes = sum(path.stat().st_size for path in files)
+    return {
+        "files": len(files),
+        "bytes": file_bytes,
+        "chars": chars,
+        "clean": compare(legacy_clean_text, normalize_text, texts, repeat, chars),
+        "read": compare(legacy_read_file, processor.read_file, files, repeat, file_bytes),
+        "read_large_cp1251": compare_large_read(texts, large_mb, max(1, repeat // 4)),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--docs-dir", default="/app/data/scratches/cleaned_docs")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--large-mb", type=int, default=50, help="размер большого файла, МБ")
+    args = parser.parse_args()
+
+    report = run(args.docs_dir, args.repeat, args.large_mb)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
@@ -0,0 +1,37 @@
+"""
+Офлайн-сборка индекса корпуса: чанки, метаданные и эмбеддинги float32.
+
+Готовый артефакт кладется в CORPUS_INDEX_PATH, и бот при старте импортирует
+его в пустую коллекцию за секунды, без обращений к API эмбеддингов.
+
+Запуск: python -m scripts.build_index --docs-dir /app/data/scratches/cleaned_docs
+"""
+import argparse
+import json
+import logging
+
+from config import settings
+from services.corpus_index import build_index
+from services.embeddings import get_embeddings_service
+from services.ingestion import load_sources
+from services.text_processor import TextProcessor
+
+logger = logging.getLogger(__name__)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs-dir", default="/app/data/scratches/cleaned_docs")
+    parser.add_argument("--json-file", default="urls.json")
+    parser.add_argument("--output", default=settings.CORPUS_INDEX_PATH)
+    parser.add_argument("--embedding-service", default=settings.EMBEDDING_SERVICE)
+    args = parser.parse_args()
+
+    manifest = build_index(
+        load_sources(args.docs_dir, args.json_file),
+        args.output,
+        get_embeddings_service(args.embedding_service),
+        TextProcessor(),
+    )
+    print(json.dumps(manifest, ensure_ascii=False, indent=2))
@@ -2,35 +2,32 @@ import logging
 from pathlib import Path
 from services.text_processor import TextProcessor
 from services.chroma_service import ChromaService
-
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-collection_name = os.getenv("CHROMA_COLLECTION_NAME")
+from services.ingestion import IngestManifest, IngestPipeline, remove_missing_files
+from config import settings
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def load_documents(docs_dir: str, collection_name: str = collection_name):
+def load_documents(docs_dir: str, collection_name: str = settings.COLLECTION_NAME):
     processor = TextProcessor()
     chroma_service = ChromaService()
+    manifest = IngestManifest()
 
     docs_path = Path(docs_dir)
-    for file_path in docs_path.glob("*.txt"):
-        logger.info(f"Обработка файла: {file_path}")
-        try:
-            # Обрабатываем и загружаем документ
-            chunks, metadata_list = processor.process_file(file_path)
-            logger.info(f"Загружаем {len(chunks)} чанков в коллекцию {collection_name}")
-            chroma_service.add_documents(
-                collection_name=collection_name, texts=chunks, metadatas=metadata_list
-            )
-            logger.info(f"Документ {file_path} успешно загружен")
-
-        except Exception as e:
-            logger.error(f"Ошибка при загрузке {file_path}: {str(e)}")
+    file_paths = sorted(docs_path.glob("*.txt"))
+
+    # Загружаем только новые и измененные чанки
+    pipeline = IngestPipeline(chroma_service, processor, manifest)
+    stats = pipeline.run(collection_name, [(file_path, {}) for file_path in file_paths])
+    logger.info(f"Документы загружены в коллекцию {collection_name}: {stats}")
+
+    remove_missing_files(
+        chroma_service, manifest, collection_name, [str(p) for p in file_paths]
+    )
+    manifest.save()
+    chroma_service.save_lexical_indexes()
+    return stats
 
 
 if __name__ == "__main__":
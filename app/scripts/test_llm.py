@@ -40,6 +40,9 @@ answer_grader = grade_prompt_answer_accuracy | llm
 
 dataset_name = "History RAG Queries Example"
 
+# Ответы, посчитанные пакетно до запуска оценки: вопрос -> ответ
+precomputed_answers = {}
+
 
 def create_dataset(data_path: str, client: Client) -> None:
     """
@@ -128,7 +131,11 @@ def predict_rag_answer(example: dict) -> dict:
     Возвращаемое значение:
     - dict: Словарь с ответом RAG-сервиса.
     """
-    response = rag_service.generate_answer(example["question"], collection_name)
+    question = example["question"]
+    if question in precomputed_answers:
+        return {"answer": precomputed_answers[question]}
+
+    response = rag_service.generate_answer(question, collection_name)
     return {"answer": response}
 
 
@@ -143,6 +150,18 @@ def evaluate_rag_answers() -> None:
     Функция не возвращает значения.
     """
 
+    # Отвечаем на все вопросы датасета одним пакетом: общий батч эмбеддингов,
+    # один поиск в ChromaDB и параллельные запросы к LLM
+    questions = list(
+        dict.fromkeys(
+            example.inputs["question"]
+            for example in langsmith_client.list_examples(dataset_name=dataset_name)
+        )
+    )
+    answers = rag_service.generate_answers(questions, collection_name)
+    precomputed_answers.update(zip(questions, answers))
+    logger.info(f"Пакетно сгенерировано {len(answers)} ответов")
+
     experiment_results = evaluate(
         predict_rag_answer,
         data=dataset_name,
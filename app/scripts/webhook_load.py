@@ -0,0 +1,205 @@
+"""
+Нагрузочный тест webhook-режима синтетическими обновлениями Telegram.
+
+Скрипт поднимает локальный мок Bot API, ждет, пока webhook бота начнет
+отвечать, и отправляет на него обновления от множества чатов: сначала
+/start, затем вопросы. После запуска скрипта бота нужно запустить в режиме
+webhook с TELEGRAM_API_URL, указывающим на мок:
+
+    TELEGRAM_API_URL=http://127.0.0.1:8081 BOT_RUN_MODE=webhook \\
+    WEBHOOK_BASE_URL=http://127.0.0.1:8080 WEBHOOK_WORKERS=4 python app.py
+
+Считаются задержка ответа webhook (подтверждение приема), пропускная
+способность и задержка до первого сообщения бота в чате. Вопрос получает
+ответ, только если состояние чата после /start видно обработавшему его
+воркеру, поэтому число ответов проверяет маршрутизацию чатов по воркерам
+и FSM-хранилище.
+
+Запуск: python -m scripts.webhook_load --chats 200 --questions-per-chat 2
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter, defaultdict, deque
+from typing import Deque, Dict, List
+
+import aiohttp
+import numpy as np
+from aiohttp import web
+
+_message_ids = itertools.count(1)
+
+
+def make_update(update_id: int, chat_id: int, text: str) -> Dict:
+    """Минимальное обновление Telegram с текстовым сообщением"""
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": f"Load{chat_id}"},
+            "text": text,
+        },
+    }
+
+
+class MockBotAPI:
+    """Мок Bot API: отвечает на вызовы бота и засекает первый ответ в чат"""
+
+    def __init__(self):
+        self.calls = Counter()
+        self.reply_latencies: List[float] = []
+        self.pending: Dict[int, Deque[float]] = defaultdict(deque)
+
+    def expect_reply(self, chat_id: int):
+        self.pending[chat_id].append(time.perf_counter())
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        data = await request.post()
+
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "bot", "username": "load_bot"}
+        elif method in ("sendMessage", "editMessageText"):
+            chat_id = int(data.get("chat_id", 0))
+            pending = self.pending[chat_id]
+            if method == "sendMessage" and pending:
+                self.reply_latencies.append(time.perf_counter() - pending.popleft())
+            result = {
+                "message_id": int(data.get("message_id") or next(_message_ids)),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": data.get("text", ""),
+            }
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def start(self, host: str, port: int) -> web.AppRunner:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+
+def percentiles(latencies: List[float]) -> Dict:
+    if not latencies:
+        return {}
+    p50, p95, p99 = np.percentile(np.asarray(latencies) * 1000, [50, 95, 99])
+    return {"p50": round(p50, 1), "p95": round(p95, 1), "p99": round(p99, 1)}
+
+
+async def send_updates(
+    session: aiohttp.ClientSession,
+    url: str,
+    updates: List[Dict],
+    api: MockBotAPI,
+    concurrency: int,
+    secret: str,
+) -> Dict:
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def send(update: Dict):
+        nonlocal errors
+        async with semaphore:
+            api.expect_reply(update["message"]["chat"]["id"])
+            start = time.perf_counter()
+            async with session.post(url, json=update, headers=headers) as response:
+                await response.read()
+                if response.status != 200:
+                    errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(send(update) for update in updates))
+    elapsed = time.perf_counter() - start
+    return {
+        "updates": len(updates),
+        "errors": errors,
+        "updates_per_sec": round(len(updates) / elapsed, 1),
+        "ack_latency_ms": percentiles(latencies),
+    }
+
+
+async def wait_for_webhook(session: aiohttp.ClientSession, url: str, timeout: float):
+    """Ждет, пока сервер бота начнет принимать соединения"""
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            async with session.get(url) as response:
+                await response.read()
+                return
+        except aiohttp.ClientConnectionError:
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.5)
+
+
+async def run_load(args) -> Dict:
+    with open(args.questions_file, "r", encoding="utf-8") as f:
+        questions = [item["question"] for item in json.load(f)]
+
+    api = MockBotAPI()
+    api_runner = await api.start(args.api_host, args.api_port)
+    update_ids = itertools.count(1)
+    chats = [args.first_chat_id + i for i in range(args.chats)]
+
+    try:
+        async with aiohttp.ClientSession() as session:
+            await wait_for_webhook(session, args.webhook_url, args.startup_timeout)
+            start_updates = [make_update(next(update_ids), chat, "/start") for chat in chats]
+            start_stats = await send_updates(
+                session, args.webhook_url, start_updates, api, args.concurrency, args.secret
+            )
+            await asyncio.sleep(args.settle)
+
+            question_updates = [
+                make_update(next(update_ids), chat, questions[(chat + i) % len(questions)])
+                for i in range(args.questions_per_chat)
+                for chat in chats
+            ]
+            question_stats = await send_updates(
+                session, args.webhook_url, question_updates, api, args.concurrency, args.secret
+            )
+            await asyncio.sleep(args.drain)
+    finally:
+        await api_runner.cleanup()
+
+    expected = len(start_updates) + len(question_updates)
+    return {
+        "start": start_stats,
+        "questions": question_stats,
+        "replies": len(api.reply_latencies),
+        "expected_replies": expected,
+        "reply_latency_ms": percentiles(api.reply_latencies),
+        "bot_api_calls": dict(api.calls),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--webhook-url", default="http://127.0.0.1:8080/webhook")
+    parser.add_argument("--secret", default="")
+    parser.add_argument("--api-host", default="127.0.0.1")
+    parser.add_argument("--api-port", type=int, default=8081)
+    parser.add_argument("--questions-file", default="data/test_data.json")
+    parser.add_argument("--chats", type=int, default=100)
+    parser.add_argument("--first-chat-id", type=int, default=100_000)
+    parser.add_argument("--questions-per-chat", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    parser.add_argument("--settle", type=float, default=2.0, help="пауза после /start, с")
+    parser.add_argument("--drain", type=float, default=10.0, help="ожидание ответов, с")
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run_load(args)), ensure_ascii=False, indent=2))
@@ -0,0 +1,133 @@
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence
+import logging
+import threading
+import time
+
+import numpy as np
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _CacheEntry:
+    embedding: np.ndarray
+    answer: str
+    created_at: float
+    version: int
+    latency: float
+
+
+class SemanticAnswerCache:
+    """
+    Кэш ответов по эмбеддингу вопроса.
+
+    Вопрос считается повтором, если косинусная близость его эмбеддинга
+    к сохраненному не ниже threshold. Записи живут ttl секунд и
+    сбрасываются при изменении версии коллекции.
+    """
+
+    def __init__(
+        self,
+        threshold: float = settings.ANSWER_CACHE_THRESHOLD,
+        ttl: float = settings.ANSWER_CACHE_TTL,
+        max_entries: int = settings.ANSWER_CACHE_MAX_ENTRIES,
+        time_func: Callable[[], float] = time.monotonic,
+    ):
+        if not -1.0 <= threshold <= 1.0:
+            raise ValueError("Порог близости должен быть в диапазоне [-1, 1]")
+
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._time = time_func
+        self._entries: Dict[str, List[_CacheEntry]] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.saved_latency = 0.0
+
+    @staticmethod
+    def _normalize(embedding: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _live_entries(self, collection_name: str, version: int) -> List[_CacheEntry]:
+        """Удаляет устаревшие записи коллекции и возвращает оставшиеся"""
+        now = self._time()
+        entries = [
+            entry
+            for entry in self._entries.get(collection_name, [])
+            if entry.version == version and now - entry.created_at < self.ttl
+        ]
+        self._entries[collection_name] = entries
+        return entries
+
+    def lookup(
+        self, collection_name: str, embedding: Sequence[float], version: int = 0
+    ) -> Optional[str]:
+        """Возвращает сохраненный ответ на близкий вопрос или None"""
+        query = self._normalize(embedding)
+
+        with self._lock:
+            entries = self._live_entries(collection_name, version)
+            if entries:
+                similarities = np.stack([entry.embedding for entry in entries]) @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    entry = entries[best]
+                    self.hits += 1
+                    self.saved_latency += entry.latency
+                    logger.info(
+                        f"Ответ найден в кэше (близость {similarities[best]:.3f})"
+                    )
+                    return entry.answer
+
+            self.misses += 1
+            return None
+
+    def store(
+        self,
+        collection_name: str,
+        embedding: Sequence[float],
+        answer: str,
+        version: int = 0,
+        latency: float = 0.0,
+    ):
+        """Сохраняет ответ; latency - время генерации, которое сэкономит попадание"""
+        with self._lock:
+            entries = self._live_entries(collection_name, version)
+            entries.append(
+                _CacheEntry(
+                    embedding=self._normalize(embedding),
+                    answer=answer,
+                    created_at=self._time(),
+                    version=version,
+                    latency=latency,
+                )
+            )
+            # Вытесняем самые старые записи
+            if len(entries) > self.max_entries:
+                del entries[: len(entries) - self.max_entries]
+
+    def invalidate(self, collection_name: Optional[str] = None):
+        """Сбрасывает кэш коллекции или весь кэш"""
+        with self._lock:
+            if collection_name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(collection_name, None)
+
+    def stats(self) -> Dict:
+        """Статистика кэша: попадания, промахи и сэкономленное время"""
+        total = self.hits + self.misses
+        return {
+            "size": sum(len(entries) for entries in self._entries.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "saved_latency_seconds": round(self.saved_latency, 3),
+        }
@@ -0,0 +1,195 @@
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from pathlib import Path
+import json
+import logging
+import math
+import os
+import re
+import threading
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"\w+")
+# Грубый стемминг для русского языка: слова сравниваются по префиксу,
+# чтобы "Цусима", "Цусимы" и "Цусимское" давали один терм
+STEM_LENGTH = 5
+
+
+def tokenize(text: str) -> List[str]:
+    """Разбивает текст на термы: слова в нижнем регистре, обрезанные до STEM_LENGTH"""
+    return [token[:STEM_LENGTH] for token in TOKEN_PATTERN.findall(text.lower())]
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[str]], k: int = settings.RRF_K
+) -> List[Tuple[str, float]]:
+    """
+    Объединяет ранжированные списки id методом reciprocal rank fusion:
+    score(d) = sum(1 / (k + rank(d))).
+
+    Returns:
+        List[Tuple[str, float]]: id и итоговый score по убыванию.
+    """
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class BM25Index:
+    """
+    Инвертированный индекс BM25 по чанкам коллекции.
+
+    Хранит тексты и метаданные чанков, поэтому поиск не обращается к ChromaDB
+    и не требует эмбеддинга запроса. Индекс сохраняется в JSON, постинги
+    перестраиваются при загрузке.
+    """
+
+    def __init__(self, k1: float = settings.BM25_K1, b: float = settings.BM25_B):
+        self.k1 = k1
+        self.b = b
+        self._documents: Dict[str, str] = {}
+        self._metadatas: Dict[str, Dict] = {}
+        self._lengths: Dict[str, int] = {}
+        self._postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._total_length = 0
+        self._lock = threading.RLock()
+        self.dirty = False
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def add(
+        self,
+        ids: List[str],
+        texts: List[str],
+        metadatas: Optional[List[Dict]] = None,
+    ):
+        """Добавляет или заменяет документы"""
+        metadatas = metadatas or [{} for _ in ids]
+        with self._lock:
+            self._remove(ids)
+            for doc_id, text, metadata in zip(ids, texts, metadatas):
+                terms = Counter(tokenize(text))
+                for term, tf in terms.items():
+                    self._postings[term][doc_id] = tf
+                length = sum(terms.values())
+                self._documents[doc_id] = text
+                self._metadatas[doc_id] = metadata or {}
+                self._lengths[doc_id] = length
+                self._total_length += length
+            self.dirty = True
+
+    def remove(self, ids: Iterable[str]):
+        with self._lock:
+            self._remove(ids)
+            self.dirty = True
+
+    def _remove(self, ids: Iterable[str]):
+        for doc_id in ids:
+            text = self._documents.pop(doc_id, None)
+            if text is None:
+                continue
+            for term in set(tokenize(text)):
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(doc_id, None)
+                    if not postings:
+                        del self._postings[term]
+            self._metadatas.pop(doc_id, None)
+            self._total_length -= self._lengths.pop(doc_id)
+
+    def search(
+        self,
+        query_text: str,
+        n_results: int = 5,
+        metadata_filter: Optional[Dict] = None,
+    ) -> List[Tuple[str, float]]:
+        """
+        Поиск по BM25.
+
+        Args:
+            query_text: Текст запроса.
+            n_results: Количество результатов.
+            metadata_filter: Точное совпадение значений метаданных.
+
+        Returns:
+            List[Tuple[str, float]]: id документов и их score по убыванию.
+        """
+        with self._lock:
+            n_docs = len(self._documents)
+            if not n_docs:
+                return []
+            avg_length = self._total_length / n_docs
+
+            scores: Dict[str, float] = defaultdict(float)
+            for term in set(tokenize(query_text)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / avg_length)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+            if metadata_filter:
+                scores = {
+                    doc_id: score
+                    for doc_id, score in scores.items()
+                    if all(
+                        self._metadatas[doc_id].get(key) == value
+                        for key, value in metadata_filter.items()
+                    )
+                }
+
+            return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:n_results]
+
+    def get(self, ids: List[str]) -> Tuple[List[str], List[Dict]]:
+        """Тексты и метаданные документов по id"""
+        with self._lock:
+            return (
+                [self._documents[doc_id] for doc_id in ids],
+                [self._metadatas[doc_id] for doc_id in ids],
+            )
+
+    def save(self, path: str):
+        """Атомарная запись индекса"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with self._lock:
+            data = {
+                "k1": self.k1,
+                "b": self.b,
+                "stem_length": STEM_LENGTH,
+                "documents": [
+                    {"id": doc_id, "document": text, "metadata": self._metadatas[doc_id]}
+                    for doc_id, text in self._documents.items()
+                ],
+            }
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            self.dirty = False
+        logger.info(f"Лексический индекс сохранен в {path}: {len(self)} документов")
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("stem_length") != STEM_LENGTH:
+            raise ValueError(f"Лексический индекс {path} построен с другой токенизацией")
+
+        index = cls(k1=data["k1"], b=data["b"])
+        documents = data["documents"]
+        index.add(
+            [doc["id"] for doc in documents],
+            [doc["document"] for doc in documents],
+            [doc["metadata"] for doc in documents],
+        )
+        index.dirty = False
+        return index
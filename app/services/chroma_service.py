@@ -1,8 +1,17 @@
 from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+import asyncio
+import os
+import threading
 import chromadb
 from chromadb.config import Settings
 from config import settings
 from .embeddings import get_embeddings_service
+from .bm25_index import BM25Index
+from .retrieval import RetrievalResult
+from .metrics import metrics
 import logging
 from uuid import uuid4
 
@@ -10,43 +19,224 @@ logger = logging.getLogger(__name__)
 
 
 class ChromaService:
-    def __init__(self, embedding_service: str = "gigachat"):
+    def __init__(
+        self,
+        embedding_service: str = settings.EMBEDDING_SERVICE,
+        persist_directory: Optional[str] = None,
+        read_only: bool = settings.CHROMA_READ_ONLY,
+        lexical_index: bool = settings.RETRIEVAL_MODE != "dense",
+    ):
+        self.persist_directory = persist_directory or settings.CHROMA_PERSIST_DIRECTORY
+        # В режиме только чтения методы записи падают, а коллекции не создаются
+        self.read_only = read_only
+        # Лексический индекс ведется при записи, только если нужен режиму поиска;
+        # иначе он строится по коллекции при первом явном запросе
+        self.lexical_index = lexical_index
+
         # Инициализация клиента ChromaDB
         self.client = chromadb.PersistentClient(
-            path=settings.CHROMA_PERSIST_DIRECTORY,
+            path=self.persist_directory,
             settings=Settings(allow_reset=True, anonymized_telemetry=False),
         )
 
         # Инициализация сервиса эмбеддингов
         self.embeddings = get_embeddings_service(embedding_service)
 
+        # Ограниченный пул потоков для асинхронных вызовов
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.RAG_EXECUTOR_WORKERS, thread_name_prefix="chroma"
+        )
+
+        # Реестр открытых коллекций, чтобы не вызывать get_or_create на каждый запрос
+        self._collections: Dict[str, chromadb.Collection] = {}
+        self._collections_lock = threading.Lock()
+
+        # Лексические индексы BM25, хранятся рядом с ChromaDB
+        self._lexical_indexes: Dict[str, BM25Index] = {}
+        # mtime файла, из которого загружен индекс: его перезаписывает загрузка из другого процесса
+        self._lexical_mtimes: Dict[str, Optional[int]] = {}
+        self._lexical_lock = threading.Lock()
+
     def _get_embeddings(self, texts: List[str]) -> List[List[float]]:
         """
         Внутренний метод для получения эмбеддингов текстов.
         """
         return self.embeddings(texts)  # Используем __call__ через прямой вызов объекта
 
+    def embed_query(self, query_text: str) -> List[float]:
+        """Эмбеддинг поискового запроса"""
+        return self._get_embeddings([query_text])[0]
+
+    def embed_queries(self, query_texts: List[str]) -> List[List[float]]:
+        """Эмбеддинги нескольких запросов одним вызовом эмбеддера"""
+        return self._get_embeddings(query_texts)
+
+    async def aembed_query(self, query_text: str) -> List[float]:
+        """Асинхронный вариант embed_query"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, partial(self.embed_query, query_text)
+        )
+
+    def _version_path(self, collection_name: str) -> Path:
+        return Path(self.persist_directory) / "versions" / collection_name
+
+    def collection_version(self, collection_name: str) -> int:
+        """
+        Версия коллекции: меняется после добавления, обновления или удаления данных.
+
+        Версия хранится в файле рядом с ChromaDB, и каждая запись заменяет ее
+        новой случайной меткой, поэтому изменения из других процессов бота
+        видны так же, как свои.
+        """
+        try:
+            return int(self._version_path(collection_name).read_text(), 16)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _bump_version(self, collection_name: str):
+        path = self._version_path(collection_name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Атомарная замена: читатель видит либо старую версию, либо новую
+        tmp_path = path.with_name(f"{path.name}.{uuid4().hex}.tmp")
+        tmp_path.write_text(uuid4().hex)
+        os.replace(tmp_path, path)
+
+    def _check_writable(self):
+        if self.read_only:
+            raise RuntimeError("ChromaService открыт только для чтения")
+
     def create_or_get_collection(self, collection_name: str):
         """Создает новую коллекцию или возвращает существующую"""
+        collection = self._collections.get(collection_name)
+        if collection is not None:
+            return collection
 
-        logger.info(f"Попытка получить коллекцию: {collection_name}")
-        collection = self.client.get_or_create_collection(
-            name=collection_name,
-            embedding_function=self.embeddings,
-            metadata={"hnsw:space": "cosine"},
-        )
+        with self._collections_lock:
+            collection = self._collections.get(collection_name)
+            if collection is not None:
+                return collection
 
-        logger.info(
-            f"Коллекция {collection_name} найдена или создана. Кол-во документов: {collection.count()}"
-        )
+            logger.info(f"Попытка получить коллекцию: {collection_name}")
+            if self.read_only:
+                collection = self.client.get_collection(
+                    name=collection_name, embedding_function=self.embeddings
+                )
+            else:
+                collection = self.client.get_or_create_collection(
+                    name=collection_name,
+                    embedding_function=self.embeddings,
+                    metadata={"hnsw:space": "cosine"},
+                )
+            self._collections[collection_name] = collection
+
+        # count() - отдельный запрос к хранилищу, считаем только для отладки
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                f"Коллекция {collection_name} найдена или создана. Кол-во документов: {collection.count()}"
+            )
+        else:
+            logger.info(f"Коллекция {collection_name} найдена или создана")
         return collection
 
+    def invalidate_collection(self, collection_name: Optional[str] = None):
+        """
+        Сбрасывает закэшированный handle коллекции (или всех коллекций).
+        Нужно, если коллекция была удалена или пересоздана другим процессом.
+        """
+        with self._collections_lock:
+            if collection_name is None:
+                self._collections.clear()
+            else:
+                self._collections.pop(collection_name, None)
+
+    def _lexical_index_path(self, collection_name: str) -> Path:
+        return Path(self.persist_directory) / "bm25" / f"{collection_name}.json"
+
+    def _lexical_mtime(self, collection_name: str) -> Optional[int]:
+        try:
+            return self._lexical_index_path(collection_name).stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _lexical_index_current(self, collection_name: str, index: Optional[BM25Index]) -> bool:
+        """
+        Индекс в памяти актуален, если файл на диске не менялся с момента
+        загрузки. Несохраненные изменения этого процесса важнее файла.
+        """
+        if index is None:
+            return False
+        if index.dirty:
+            return True
+        return self._lexical_mtimes.get(collection_name) == self._lexical_mtime(collection_name)
+
+    def get_lexical_index(self, collection_name: str) -> BM25Index:
+        """
+        Возвращает лексический индекс коллекции: загружает его с диска или,
+        если файла нет, строит по документам коллекции. Индекс перечитывается,
+        когда файл перезаписан другим процессом (например, после загрузки документов).
+        """
+        index = self._lexical_indexes.get(collection_name)
+        if self._lexical_index_current(collection_name, index):
+            return index
+
+        with self._lexical_lock:
+            index = self._lexical_indexes.get(collection_name)
+            if self._lexical_index_current(collection_name, index):
+                return index
+
+            index = None
+            path = self._lexical_index_path(collection_name)
+            mtime = self._lexical_mtime(collection_name)
+            if mtime is not None:
+                try:
+                    index = BM25Index.load(str(path))
+                    logger.info(f"Лексический индекс коллекции {collection_name} загружен")
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Лексический индекс будет перестроен: {str(e)}")
+
+            if index is None:
+                collection = self.create_or_get_collection(collection_name)
+                documents = collection.get(include=["documents", "metadatas"])
+                index = BM25Index()
+                index.add(documents["ids"], documents["documents"], documents["metadatas"])
+                # Индекс совпадает с коллекцией: сохранять нечего, а файл, записанный
+                # позже другим процессом, должен перечитываться
+                index.dirty = False
+                logger.info(
+                    f"Лексический индекс коллекции {collection_name} построен: {len(index)} документов"
+                )
+
+            self._lexical_indexes[collection_name] = index
+            self._lexical_mtimes[collection_name] = mtime
+        return index
+
+    def _keeps_lexical_index(self, collection_name: str) -> bool:
+        """
+        Обновлять ли лексический индекс при записи: да, если он включен или уже
+        построен по запросу. Иначе файл индекса удаляется как устаревший,
+        и при включении индекс будет построен заново по коллекции.
+        """
+        if self.lexical_index or collection_name in self._lexical_indexes:
+            return True
+        self._lexical_index_path(collection_name).unlink(missing_ok=True)
+        return False
+
+    def save_lexical_indexes(self):
+        """Сохраняет на диск измененные лексические индексы"""
+        self._check_writable()
+        for collection_name, index in list(self._lexical_indexes.items()):
+            if index.dirty:
+                index.save(str(self._lexical_index_path(collection_name)))
+                self._lexical_mtimes[collection_name] = self._lexical_mtime(collection_name)
+
     def add_documents(
         self,
         collection_name: str,
         texts: List[str],
         metadatas: List[Dict] = None,
-        # ids: List[str] = None
+        ids: List[str] = None,
+        embeddings: List[List[float]] = None,
     ):
         """
         Добавляет документы в коллекцию
@@ -56,25 +246,49 @@ class ChromaService:
             texts: Список текстов для добавления
             metadatas: Список метаданных для каждого документа
             ids: Список уникальных идентификаторов для документов
+            embeddings: Готовые эмбеддинги документов, если уже посчитаны
         """
+        self._check_writable()
         collection = self.create_or_get_collection(collection_name)
 
-        uuids = [str(uuid4()) for _ in range(len(texts))]
+        uuids = ids or [str(uuid4()) for _ in range(len(texts))]
         # Получаем эмбеддинги
-        embeddings = self._get_embeddings(texts)
+        if embeddings is None:
+            embeddings = self._get_embeddings(texts)
 
         # upsert - создает новые документы или обновляет существующие
         collection.upsert(
             documents=texts, embeddings=embeddings, metadatas=metadatas, ids=uuids
         )
+        if self._keeps_lexical_index(collection_name):
+            self.get_lexical_index(collection_name).add(uuids, texts, metadatas)
+        self._bump_version(collection_name)
 
         logger.info(f"Добавлено {len(texts)} документов в коллекцию {collection_name}")
         logger.debug(
             f"Добавленные документы: {texts}, метаданные: {metadatas}, идентификаторы: {uuids}"
         )
-        logger.info(
-            f"Статистика коллекции после добавления: {self.get_collection_stats(collection_name)}"
-        )
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                f"Статистика коллекции после добавления: {self.get_collection_stats(collection_name)}"
+            )
+
+    def get_document_ids(self, collection_name: str, where: Dict) -> List[str]:
+        """Получение id документов по метаданным без загрузки текстов и эмбеддингов"""
+        collection = self.create_or_get_collection(collection_name)
+        return collection.get(where=where, include=[])["ids"]
+
+    def delete_documents(self, collection_name: str, ids: List[str]):
+        """Удаление документов по id"""
+        if not ids:
+            return
+        self._check_writable()
+        collection = self.create_or_get_collection(collection_name)
+        collection.delete(ids=ids)
+        if self._keeps_lexical_index(collection_name):
+            self.get_lexical_index(collection_name).remove(ids)
+        self._bump_version(collection_name)
+        logger.info(f"Удалено {len(ids)} документов из коллекции {collection_name}")
 
     def query_documents(
         self,
@@ -83,6 +297,7 @@ class ChromaService:
         n_results: int = 3,
         metadata_filter: Optional[Dict] = None,
         search_embeding=True,
+        query_embedding: Optional[List[float]] = None,
     ) -> Dict:
         """
         Поиск похожих документов
@@ -93,6 +308,7 @@ class ChromaService:
             n_results: Количество результатов
             metadata_filter: Фильтр по метаданным
             search_embeding:
+            query_embedding: Готовый эмбеддинг запроса, если уже посчитан
 
         Returns:
             Dict с результатами поиска
@@ -105,17 +321,176 @@ class ChromaService:
 
         if search_embeding:
             # Получаем эмбеддинг запроса
-            query_embedding = self._get_embeddings([query_text])[0]
+            if query_embedding is None:
+                query_embedding = self.embed_query(query_text)
 
-            results = collection.query(
-                query_embeddings=[query_embedding], n_results=n_results, where=where
-            )
+            with metrics.span("chroma_query"):
+                results = collection.query(
+                    query_embeddings=[query_embedding], n_results=n_results, where=where
+                )
         else:
+            with metrics.span("chroma_query"):
+                results = collection.query(
+                    query_texts=[query_text], n_results=n_results, where=where
+                )
+
+        return results
+
+    async def aquery_documents(
+        self,
+        collection_name: str,
+        query_text: str,
+        n_results: int = 3,
+        metadata_filter: Optional[Dict] = None,
+        search_embeding=True,
+        query_embedding: Optional[List[float]] = None,
+    ) -> Dict:
+        """
+        Асинхронный вариант query_documents.
+
+        Блокирующие вызовы эмбеддера и ChromaDB выполняются в ограниченном пуле
+        потоков, поэтому event loop бота не блокируется на время поиска.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor,
+            partial(
+                self.query_documents,
+                collection_name=collection_name,
+                query_text=query_text,
+                n_results=n_results,
+                metadata_filter=metadata_filter,
+                search_embeding=search_embeding,
+                query_embedding=query_embedding,
+            ),
+        )
+
+    def search(
+        self,
+        collection_name: str,
+        query_text: str,
+        n_results: int = 3,
+        metadata_filter: Optional[Dict] = None,
+        query_embedding: Optional[List[float]] = None,
+        max_distance: Optional[float] = None,
+    ) -> RetrievalResult:
+        """
+        Векторный поиск с результатом в колоночном виде.
+
+        Args:
+            max_distance: Порог косинусного расстояния; None - без фильтрации
+
+        Returns:
+            RetrievalResult: найденные документы по убыванию релевантности
+        """
+        results = self.query_documents(
+            collection_name=collection_name,
+            query_text=query_text,
+            n_results=n_results,
+            metadata_filter=metadata_filter,
+            query_embedding=query_embedding,
+        )
+        return RetrievalResult.from_chroma(results).filter_by_distance(max_distance)
+
+    def search_many(
+        self,
+        collection_name: str,
+        query_texts: List[str],
+        n_results: int = 3,
+        metadata_filter: Optional[Dict] = None,
+        query_embeddings: Optional[List[List[float]]] = None,
+        max_distance: Optional[float] = None,
+    ) -> List[RetrievalResult]:
+        """
+        Векторный поиск по нескольким запросам: эмбеддинги считаются одним
+        батчем, поиск выполняется одним вызовом collection.query.
+
+        Returns:
+            List[RetrievalResult]: результаты в порядке запросов
+        """
+        if not query_texts:
+            return []
+        collection = self.create_or_get_collection(collection_name)
+
+        if query_embeddings is None:
+            query_embeddings = self.embed_queries(query_texts)
+
+        with metrics.span("chroma_query"):
             results = collection.query(
-                query_texts=[query_text], n_results=n_results, where=where
+                query_embeddings=list(query_embeddings),
+                n_results=n_results,
+                where=metadata_filter or None,
             )
+        return [
+            RetrievalResult.from_chroma(results, i).filter_by_distance(max_distance)
+            for i in range(len(query_texts))
+        ]
 
-        return results
+    async def asearch(
+        self,
+        collection_name: str,
+        query_text: str,
+        n_results: int = 3,
+        metadata_filter: Optional[Dict] = None,
+        query_embedding: Optional[List[float]] = None,
+        max_distance: Optional[float] = None,
+    ) -> RetrievalResult:
+        """Асинхронный вариант search"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor,
+            partial(
+                self.search,
+                collection_name=collection_name,
+                query_text=query_text,
+                n_results=n_results,
+                metadata_filter=metadata_filter,
+                query_embedding=query_embedding,
+                max_distance=max_distance,
+            ),
+        )
+
+    def lexical_search(
+        self,
+        collection_name: str,
+        query_text: str,
+        n_results: int = 3,
+        metadata_filter: Optional[Dict] = None,
+    ) -> RetrievalResult:
+        """
+        Поиск по лексическому индексу BM25 без эмбеддинга запроса.
+
+        Returns:
+            RetrievalResult: найденные документы со score BM25, без расстояний
+        """
+        index = self.get_lexical_index(collection_name)
+        with metrics.span("bm25_search"):
+            hits = index.search(query_text, n_results=n_results, metadata_filter=metadata_filter)
+        ids = [doc_id for doc_id, _ in hits]
+        documents, metadatas = index.get(ids)
+        return RetrievalResult.from_scores(
+            ids, documents, metadatas, [score for _, score in hits]
+        )
+
+    async def alexical_search(
+        self,
+        collection_name: str,
+        query_text: str,
+        n_results: int = 3,
+        metadata_filter: Optional[Dict] = None,
+    ) -> RetrievalResult:
+        """Асинхронный вариант lexical_search"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor,
+            partial(
+                self.lexical_search,
+                collection_name=collection_name,
+                query_text=query_text,
+                n_results=n_results,
+                metadata_filter=metadata_filter,
+            ),
+        )
 
     def get_collection_stats(self, collection_name: str) -> Dict:
         """Получение статистики коллекции"""
@@ -128,14 +503,22 @@ class ChromaService:
 
     def delete_collection(self, collection_name: str):
         """Удаление коллекции"""
+        self._check_writable()
+        self.invalidate_collection(collection_name)
         self.client.delete_collection(collection_name)
+        self._lexical_indexes.pop(collection_name, None)
+        self._lexical_mtimes.pop(collection_name, None)
+        self._lexical_index_path(collection_name).unlink(missing_ok=True)
+        self._bump_version(collection_name)
 
     def update_document_metadata(
         self, collection_name: str, document_id: str, metadata: Dict
     ):
         """Обновление метаданных документа"""
+        self._check_writable()
         collection = self.create_or_get_collection(collection_name)
         collection.update(ids=[document_id], metadatas=[metadata])
+        self._bump_version(collection_name)
 
     def get_unique_topics(self, collection_name: str) -> List[str]:
         """Получение списка уникальных топиков в коллекции"""
@@ -168,8 +551,6 @@ class ChromaService:
     def document_exists(self, collection_name: str, file_path: str) -> bool:
         """Проверка существования документа в коллекции"""
         collection = self.create_or_get_collection(collection_name)
-        result = collection.query(
-            query_texts=[""], where={"path": str(file_path)}, n_results=1
-        )
+        result = collection.get(where={"path": str(file_path)}, limit=1, include=[])
         logger.debug(f"Результаты запроса для {file_path}: {result}")
-        return len(result["documents"]) > 0 and len(result["documents"][0]) > 0
+        return len(result["ids"]) > 0
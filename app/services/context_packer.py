@@ -0,0 +1,164 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import logging
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Без метаданных соседние чанки распознаются по совпадению конца одного
+# и начала другого не короче этого числа символов
+MIN_TEXT_OVERLAP = 20
+
+
+def estimate_tokens(text: str) -> int:
+    """Оценка числа токенов без обращения к API токенизатора"""
+    return int(len(text) / settings.CONTEXT_CHARS_PER_TOKEN) + 1 if text else 0
+
+
+def text_overlap(left: str, right: str, max_overlap: int) -> int:
+    """Длина наибольшего суффикса left, совпадающего с префиксом right"""
+    for size in range(min(len(left), len(right), max_overlap), 0, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def timestamp_url(url: str, seconds: int) -> str:
+    """Ссылка на момент видео: параметр t=<секунды>s, прежний t заменяется"""
+    parts = urlsplit(url)
+    query = [(key, value) for key, value in parse_qsl(parts.query) if key != "t"]
+    query.append(("t", f"{seconds}s"))
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def source_link(metadata: Dict) -> Optional[str]:
+    """URL источника чанка; для расшифровок с таймкодами - на начало чанка в видео"""
+    url = metadata.get("source")
+    if not url:
+        return None
+    try:
+        return timestamp_url(url, int(metadata["start_time"]))
+    except (KeyError, TypeError, ValueError):
+        return url
+
+
+@dataclass
+class _Passage:
+    """Фрагмент контекста из одного или нескольких соседних чанков"""
+
+    text: str
+    rank: int
+    path: Optional[str] = None
+    first: Optional[int] = None
+    last: Optional[int] = None
+    source: Optional[str] = None
+
+    def render(self) -> str:
+        """Текст фрагмента со ссылкой на источник, если она известна"""
+        if self.source is None:
+            return self.text
+        return f"{self.text}\nИсточник: {self.source}"
+
+
+class ContextPacker:
+    """
+    Упаковывает найденные чанки в контекст с ограничением по токенам.
+
+    Чанки приходят в порядке релевантности. Дубликаты отбрасываются,
+    соседние чанки одного файла склеиваются в один фрагмент без
+    повторения перекрытия (CHUNK_OVERLAP), а менее релевантные фрагменты,
+    не влезающие в бюджет, отбрасываются. К фрагменту с известным
+    источником добавляется ссылка на него (для видео - с таймкодом).
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = settings.CONTEXT_MAX_TOKENS,
+        chunk_overlap: int = settings.CHUNK_OVERLAP,
+    ):
+        self.max_tokens = max_tokens
+        # Сплиттер режет по границам слов, поэтому перекрытие может немного отличаться
+        self.max_overlap = max(2 * chunk_overlap, MIN_TEXT_OVERLAP)
+
+    def pack(self, documents: List[str], metadatas: Optional[List[Dict]] = None) -> List[str]:
+        """
+        Args:
+            documents: Тексты чанков по убыванию релевантности.
+            metadatas: Метаданные чанков (path, chunk_id, source, start_time), если известны.
+
+        Returns:
+            List[str]: фрагменты контекста по убыванию релевантности.
+        """
+        metadatas = metadatas or [{} for _ in documents]
+        passages: List[_Passage] = []
+        seen = set()
+        used_tokens = 0
+
+        for rank, (text, metadata) in enumerate(zip(documents, metadatas)):
+            if not text or text in seen:
+                continue
+            seen.add(text)
+
+            chunk = _Passage(
+                text=text, rank=rank, source=source_link(metadata), **self._position(metadata)
+            )
+            merged = self._merge_neighbours(passages, chunk)
+            tokens = sum(estimate_tokens(passage.render()) for passage in merged)
+
+            if tokens <= self.max_tokens:
+                passages, used_tokens = merged, tokens
+            elif not passages:
+                # Даже самый релевантный чанк не влезает: обрезаем его
+                chunk.text = text[: int(self.max_tokens * settings.CONTEXT_CHARS_PER_TOKEN)]
+                passages, used_tokens = [chunk], estimate_tokens(chunk.render())
+
+        logger.debug(
+            f"Контекст упакован: {len(documents)} чанков -> {len(passages)} фрагментов, "
+            f"~{used_tokens} токенов"
+        )
+        return [passage.render() for passage in sorted(passages, key=lambda p: p.rank)]
+
+    @staticmethod
+    def _position(metadata: Dict) -> Dict:
+        try:
+            index = int(metadata["chunk_id"])
+            return {"path": metadata["path"], "first": index, "last": index}
+        except (KeyError, TypeError, ValueError):
+            return {}
+
+    def _merge_neighbours(self, passages: List[_Passage], chunk: _Passage) -> List[_Passage]:
+        """Новый список фрагментов, где chunk склеен с соседями, если они есть"""
+        result = []
+        for passage in passages:
+            joined = self._join(passage, chunk) or self._join(chunk, passage)
+            if joined is None:
+                result.append(passage)
+            else:
+                # Склеенный фрагмент может оказаться соседом следующего
+                chunk = joined
+        result.append(chunk)
+        return result
+
+    def _join(self, left: _Passage, right: _Passage) -> Optional[_Passage]:
+        """Склеивает left и right, если right идет в файле сразу после left"""
+        if left.path is not None and right.path is not None:
+            if left.path != right.path or left.last + 1 != right.first:
+                return None
+            overlap = text_overlap(left.text, right.text, self.max_overlap)
+        else:
+            overlap = text_overlap(left.text, right.text, self.max_overlap)
+            if overlap < MIN_TEXT_OVERLAP:
+                return None
+
+        separator = "" if overlap else " "
+        return _Passage(
+            text=left.text + separator + right.text[overlap:],
+            rank=min(left.rank, right.rank),
+            path=left.path,
+            first=left.first,
+            last=right.last,
+            # Ссылка ведет на начало склеенного фрагмента
+            source=left.source,
+        )
@@ -0,0 +1,242 @@
+from typing import Dict, Iterator, List, Optional, Tuple
+from datetime import datetime, timezone
+from pathlib import Path
+import json
+import logging
+import os
+import shutil
+
+import numpy as np
+from chromadb.api.types import EmbeddingFunction
+
+from config import settings
+from services.chroma_service import ChromaService
+from services.ingestion import file_hash, make_chunk_id
+from services.text_processor import TextProcessor
+
+logger = logging.getLogger(__name__)
+
+INDEX_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+CHUNKS_FILE = "chunks.jsonl"
+EMBEDDINGS_FILE = "embeddings.npy"
+
+
+def embedding_model_name(embeddings: EmbeddingFunction) -> str:
+    return getattr(embeddings, "model_name", type(embeddings).__name__)
+
+
+def build_index(
+    files: List[Tuple[Path, Dict]],
+    output_dir: str,
+    embeddings: EmbeddingFunction,
+    processor: Optional[TextProcessor] = None,
+    batch_size: int = settings.EMBEDDING_BATCH_SIZE,
+) -> Dict:
+    """
+    Строит переносимый артефакт индекса корпуса.
+
+    Артефакт - директория с тремя файлами:
+    - chunks.jsonl: id, текст и метаданные чанков;
+    - embeddings.npy: матрица эмбеддингов float32 (открывается через mmap);
+    - manifest.json: версия формата, модель эмбеддингов, параметры чанкирования
+      и хэши исходных файлов.
+
+    Args:
+        files: Пары (путь к файлу, дополнительные метаданные чанков).
+        output_dir: Директория артефакта, перезаписывается целиком.
+        embeddings: Сервис эмбеддингов.
+        processor: Процессор текстов, по умолчанию с настройками из config.
+        batch_size: Количество чанков на один вызов эмбеддера.
+
+    Returns:
+        Dict: манифест построенного индекса.
+    """
+    processor = processor or TextProcessor()
+
+    ids, documents, metadatas, file_hashes = [], [], [], {}
+    for file_path, extra_metadata in files:
+        chunks, metadata_list = processor.process_file(file_path)
+        for i, (chunk, metadata) in enumerate(zip(chunks, metadata_list)):
+            metadata.update(extra_metadata or {})
+            ids.append(make_chunk_id(str(file_path), i, chunk))
+            documents.append(chunk)
+            metadatas.append(metadata)
+        file_hashes[file_path.name] = file_hash(file_path)
+
+    if not documents:
+        raise ValueError("Нет чанков для построения индекса")
+
+    # Собираем артефакт во временной директории и подменяем целиком
+    output = Path(output_dir)
+    tmp_dir = output.with_name(output.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    matrix = None
+    for start in range(0, len(documents), batch_size):
+        batch = np.asarray(
+            embeddings(documents[start : start + batch_size]), dtype=np.float32
+        )
+        if matrix is None:
+            matrix = np.lib.format.open_memmap(
+                tmp_dir / EMBEDDINGS_FILE,
+                mode="w+",
+                dtype=np.float32,
+                shape=(len(documents), batch.shape[1]),
+            )
+        matrix[start : start + len(batch)] = batch
+        logger.info(f"Посчитаны эмбеддинги {start + len(batch)}/{len(documents)}")
+    matrix.flush()
+    dim = matrix.shape[1]
+    del matrix
+
+    with open(tmp_dir / CHUNKS_FILE, "w", encoding="utf-8") as f:
+        for doc_id, document, metadata in zip(ids, documents, metadatas):
+            f.write(
+                json.dumps(
+                    {"id": doc_id, "document": document, "metadata": metadata},
+                    ensure_ascii=False,
+                )
+                + "\n"
+            )
+
+    manifest = {
+        "format_version": INDEX_FORMAT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "embedding_model": embedding_model_name(embeddings),
+        "dim": dim,
+        "count": len(documents),
+        "chunk_size": processor.chunk_size,
+        "chunk_overlap": processor.chunk_overlap,
+        "chunk_strategy": processor.chunk_strategy,
+        "files": file_hashes,
+    }
+    with open(tmp_dir / MANIFEST_FILE, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    shutil.rmtree(output, ignore_errors=True)
+    os.replace(tmp_dir, output)
+
+    logger.info(f"Индекс корпуса сохранен в {output}: {manifest['count']} чанков")
+    return manifest
+
+
+class CorpusIndex:
+    """Загруженный артефакт индекса корпуса; эмбеддинги открываются через mmap"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        with open(self.path / MANIFEST_FILE, "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+
+        if self.manifest.get("format_version") != INDEX_FORMAT_VERSION:
+            raise ValueError(
+                f"Неподдерживаемая версия индекса: {self.manifest.get('format_version')}"
+            )
+
+        self.embeddings = np.load(self.path / EMBEDDINGS_FILE, mmap_mode="r")
+        if self.embeddings.shape != (self.manifest["count"], self.manifest["dim"]):
+            raise ValueError(f"Индекс {self.path} поврежден: размер эмбеддингов не совпадает")
+
+    def __len__(self) -> int:
+        return self.manifest["count"]
+
+    def check_compatible(
+        self,
+        chunk_size: Optional[int] = None,
+        chunk_overlap: Optional[int] = None,
+        embedding_model: Optional[str] = None,
+        chunk_strategy: Optional[str] = None,
+    ):
+        """Проверяет, что индекс построен с текущими настройками чанкирования и моделью"""
+        expected = {
+            "chunk_size": settings.CHUNK_SIZE if chunk_size is None else chunk_size,
+            "chunk_overlap": settings.CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap,
+            "chunk_strategy": settings.CHUNK_STRATEGY if chunk_strategy is None else chunk_strategy,
+        }
+        if embedding_model is not None:
+            expected["embedding_model"] = embedding_model
+
+        # Индексы, собранные до появления стратегий, разбиты по словам
+        manifest = {"chunk_strategy": "characters", **self.manifest}
+        mismatched = {
+            key: (manifest.get(key), value)
+            for key, value in expected.items()
+            if manifest.get(key) != value
+        }
+        if mismatched:
+            raise ValueError(f"Индекс {self.path} не совместим с настройками: {mismatched}")
+
+    def iter_chunks(self) -> Iterator[Dict]:
+        with open(self.path / CHUNKS_FILE, "r", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+    def import_into(
+        self,
+        chroma_service: ChromaService,
+        collection_name: str,
+        batch_size: int = settings.INGEST_UPSERT_BATCH_SIZE,
+    ) -> int:
+        """
+        Загружает индекс в коллекцию без обращений к API эмбеддингов.
+        Id чанков детерминированы, поэтому повторный импорт не создает дубликатов.
+
+        Returns:
+            int: количество загруженных чанков.
+        """
+        batch = []
+        offset = 0
+
+        def flush():
+            nonlocal offset
+            chroma_service.add_documents(
+                collection_name=collection_name,
+                ids=[chunk["id"] for chunk in batch],
+                texts=[chunk["document"] for chunk in batch],
+                metadatas=[chunk["metadata"] for chunk in batch],
+                embeddings=np.asarray(self.embeddings[offset : offset + len(batch)]),
+            )
+            offset += len(batch)
+            batch.clear()
+
+        for chunk in self.iter_chunks():
+            batch.append(chunk)
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+        chroma_service.save_lexical_indexes()
+
+        logger.info(f"Индекс {self.path} импортирован в коллекцию {collection_name}: {offset} чанков")
+        return offset
+
+
+def import_index_if_needed(
+    chroma_service: ChromaService,
+    collection_name: str,
+    index_path: str = settings.CORPUS_INDEX_PATH,
+) -> bool:
+    """
+    Импортирует индекс корпуса при старте, если коллекция пуста или неполна.
+
+    Returns:
+        bool: True, если импорт выполнялся.
+    """
+    if not index_path or not (Path(index_path) / MANIFEST_FILE).exists():
+        logger.info("Индекс корпуса не найден, импорт пропущен")
+        return False
+
+    index = CorpusIndex(index_path)
+    index.check_compatible(
+        embedding_model=embedding_model_name(chroma_service.embeddings)
+    )
+
+    count = chroma_service.get_collection_stats(collection_name)["count"]
+    if count >= len(index):
+        logger.info(f"Коллекция {collection_name} уже заполнена ({count} документов)")
+        return False
+
+    index.import_into(chroma_service, collection_name)
+    return True
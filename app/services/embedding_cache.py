@@ -0,0 +1,196 @@
+from typing import Dict, List, Optional, Sequence
+from pathlib import Path
+import hashlib
+import logging
+import sqlite3
+import threading
+import unicodedata
+
+import numpy as np
+from chromadb.api.types import EmbeddingFunction
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Нормализация текста для ключа кэша: NFC и схлопывание пробелов"""
+    return unicodedata.normalize("NFC", " ".join(text.split()))
+
+
+class EmbeddingCache:
+    """
+    Дисковый кэш эмбеддингов на SQLite.
+
+    Ключ - sha256 от (имя модели, нормализованный текст), значение - вектор
+    float32 в виде blob. При превышении max_entries вытесняются записи,
+    к которым дольше всего не обращались (LRU).
+    """
+
+    def __init__(self, path: str, max_entries: int = 100_000):
+        if max_entries <= 0:
+            raise ValueError("Размер кэша должен быть положительным")
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                last_access INTEGER NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_access ON embeddings(last_access)"
+        )
+        # Число записей: считается один раз при создании таблицы, дальше ведется
+        # по rowcount в тех же транзакциях, что и записи всех процессов
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_size (id INTEGER PRIMARY KEY, size INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "INSERT OR IGNORE INTO cache_size (id, size) SELECT 0, COUNT(*) FROM embeddings"
+        )
+        self._conn.commit()
+        self._size = self._read_size()
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        payload = f"{model}\x00{normalize_text(text)}".encode("utf-8")
+        return hashlib.sha256(payload).hexdigest()
+
+    def _read_size(self) -> int:
+        return self._conn.execute("SELECT size FROM cache_size WHERE id = 0").fetchone()[0]
+
+    def _tick(self) -> int:
+        """
+        Открывает пишущую транзакцию и возвращает следующее значение логических
+        часов LRU. Часы читаются под блокировкой записи, поэтому они общие для
+        всех процессов, работающих с одним файлом кэша.
+        """
+        self._conn.execute("BEGIN IMMEDIATE")
+        return self._conn.execute(
+            "SELECT COALESCE(MAX(last_access), 0) + 1 FROM embeddings"
+        ).fetchone()[0]
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Возвращает эмбеддинги из кэша, None для отсутствующих текстов"""
+        keys = [self.make_key(model, text) for text in texts]
+        found: Dict[str, np.ndarray] = {}
+
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                part = keys[i : i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})",
+                    part,
+                ).fetchall()
+                found.update(
+                    (key, np.frombuffer(blob, dtype=np.float32)) for key, blob in rows
+                )
+
+            if found:
+                with self._conn:
+                    clock = self._tick()
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                        [(clock, key) for key in found],
+                    )
+
+            result = [found.get(key) for key in keys]
+            hits = sum(vector is not None for vector in result)
+            self.hits += hits
+            self.misses += len(keys) - hits
+
+        return result
+
+    def put_many(
+        self, model: str, texts: Sequence[str], embeddings: Sequence[Sequence[float]]
+    ):
+        """Сохраняет эмбеддинги в кэш и вытесняет старые записи при переполнении"""
+        rows = [
+            (self.make_key(model, text), np.asarray(embedding, dtype=np.float32).tobytes())
+            for text, embedding in zip(texts, embeddings)
+        ]
+        with self._lock, self._conn:
+            clock = self._tick()
+            # rowcount INSERT OR IGNORE - число новых ключей
+            inserted = self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)",
+                [(key, vector, clock) for key, vector in rows],
+            ).rowcount
+            if inserted < len(rows):
+                self._conn.executemany(
+                    "UPDATE embeddings SET vector = ?, last_access = ? WHERE key = ?",
+                    [(vector, clock, key) for key, vector in rows],
+                )
+            self._size = self._read_size() + inserted
+            if self._size > self.max_entries:
+                self._evict(self._size - self.max_entries)
+            self._conn.execute("UPDATE cache_size SET size = ? WHERE id = 0", (self._size,))
+
+    def _evict(self, count: int):
+        evicted = self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN "
+            "(SELECT key FROM embeddings ORDER BY last_access LIMIT ?)",
+            (count,),
+        ).rowcount
+        self._size -= evicted
+        logger.debug(f"Из кэша эмбеддингов вытеснено {evicted} записей")
+
+    def stats(self) -> Dict:
+        """Статистика кэша"""
+        total = self.hits + self.misses
+        return {
+            "size": self._size,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.execute("UPDATE cache_size SET size = 0 WHERE id = 0")
+            self._size = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddingsService(EmbeddingFunction):
+    """
+    Обертка над сервисом эмбеддингов: отдает векторы из кэша и
+    запрашивает у исходного сервиса только отсутствующие тексты.
+    """
+
+    def __init__(self, service: EmbeddingFunction, cache: EmbeddingCache, model_name: str):
+        self.service = service
+        self.cache = cache
+        self.model_name = model_name
+
+    def __call__(self, input: List[str]) -> List[np.ndarray]:
+        embeddings = self.cache.get_many(self.model_name, input)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+
+        if missing:
+            missing_texts = [input[i] for i in missing]
+            computed = self.service(missing_texts)
+            self.cache.put_many(self.model_name, missing_texts, computed)
+            for i, embedding in zip(missing, computed):
+                embeddings[i] = np.asarray(embedding, dtype=np.float32)
+
+        logger.debug(
+            f"Эмбеддинги: из кэша {len(input) - len(missing)}, запрошено {len(missing)}"
+        )
+        return embeddings
@@ -1,43 +1,246 @@
 from abc import ABC, abstractmethod
-from typing import List
-from langchain_gigachat import GigaChatEmbeddings
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, Dict, List, Type
 from chromadb.api.types import EmbeddingFunction
 from config import settings
+from .embedding_cache import CachedEmbeddingsService, EmbeddingCache
+from .gigachat_client import SharedGigaChatEmbeddings
+from .metrics import metrics
 import logging
+import random
+import re
+import time
+import zlib
+
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
+# Реестр бэкендов эмбеддингов: имя из Settings.EMBEDDING_SERVICE -> класс сервиса
+EMBEDDING_SERVICES: Dict[str, Type["BaseEmbeddingsService"]] = {}
+
+
+def register_embeddings_service(name: str) -> Callable:
+    """Декоратор регистрации бэкенда эмбеддингов"""
+
+    def decorator(cls):
+        EMBEDDING_SERVICES[name] = cls
+        return cls
+
+    return decorator
+
+
+# HTTP-статусы, при которых запрос к эмбеддеру имеет смысл повторить
+RETRYABLE_STATUS_CODES = {429, 503}
+
+
+def is_throttling_error(error: Exception) -> bool:
+    """
+    Проверяет, что ошибка вызвана ограничением частоты запросов.
+    gigachat.exceptions.ResponseError хранит статус вторым аргументом.
+    """
+    status = getattr(error, "status_code", None)
+    if status is None and len(error.args) > 1:
+        status = error.args[1]
+    return status in RETRYABLE_STATUS_CODES
 
-class GigaChatEmbeddingsService(EmbeddingFunction):
-    def __init__(self):
-        try:
-            self.embeddings = GigaChatEmbeddings(
-                credentials=settings.GIGACHAT_API_KEY, verify_ssl_certs=False
-            )
-        except Exception as e:
-            logger.error(f"Failed to initialize GigaChat service: {str(e)}")
-            raise
+
+class BaseEmbeddingsService(EmbeddingFunction, ABC):
+    """
+    Базовый сервис эмбеддингов: разбивает входные тексты на батчи,
+    отправляет их с ограниченным параллелизмом и повторяет запросы
+    с экспоненциальной задержкой при троттлинге.
+    """
+
+    # Имя модели, входит в ключ кэша эмбеддингов
+    model_name: str = "unknown"
+    # Имеет ли смысл кэшировать результаты на диске
+    cacheable: bool = True
+
+    def __init__(
+        self,
+        batch_size: int = settings.EMBEDDING_BATCH_SIZE,
+        max_concurrency: int = settings.EMBEDDING_MAX_CONCURRENCY,
+        max_retries: int = settings.EMBEDDING_MAX_RETRIES,
+        retry_backoff: float = settings.EMBEDDING_RETRY_BACKOFF,
+    ):
+        if batch_size <= 0:
+            raise ValueError("Размер батча должен быть положительным")
+        if max_concurrency <= 0:
+            raise ValueError("Параллелизм должен быть положительным")
+
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="embeddings"
+        )
+
+    @abstractmethod
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Получение эмбеддингов для одного батча за один запрос"""
 
     def __call__(self, input: List[str]) -> List[List[float]]:
         """
-        Метод для получения эмбеддингов через GigaChat.
+        Метод для получения эмбеддингов батчами.
         Реализует интерфейс EmbeddingFunction из ChromaDB.
         """
+        batches = [
+            input[i : i + self.batch_size]
+            for i in range(0, len(input), self.batch_size)
+        ]
+
         try:
-            embeddings = [self.embeddings.embed_query(text) for text in input]
-            return embeddings
+            with metrics.span("embeddings"):
+                if len(batches) <= 1:
+                    results = [self._embed_with_retry(batch) for batch in batches]
+                else:
+                    results = list(self._executor.map(self._embed_with_retry, batches))
         except Exception as e:
             logger.error(f"Error getting embeddings: {str(e)}")
             raise
 
+        return [embedding for batch in results for embedding in batch]
 
-def get_embeddings_service(service_name: str = "gigachat") -> EmbeddingFunction:
-    """Фабричный метод для получения сервиса эмбеддингов"""
-    services = {
-        "gigachat": GigaChatEmbeddingsService,
-    }
+    def _embed_with_retry(self, texts: List[str]) -> List[List[float]]:
+        attempt = 0
+        while True:
+            try:
+                return self.embed_batch(texts)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_throttling_error(e):
+                    raise
+                # Экспоненциальная задержка с джиттером, чтобы потоки не били в API синхронно
+                delay = self.retry_backoff * (2**attempt) * (1 + random.random())
+                attempt += 1
+                logger.warning(
+                    f"Embeddings throttled, retry {attempt}/{self.max_retries} in {delay:.2f}s"
+                )
+                time.sleep(delay)
+
+
+@register_embeddings_service("gigachat")
+class GigaChatEmbeddingsService(BaseEmbeddingsService):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        try:
+            self.embeddings = SharedGigaChatEmbeddings()
+        except Exception as e:
+            logger.error(f"Failed to initialize GigaChat service: {str(e)}")
+            raise
+        self.model_name = f"gigachat/{self.embeddings.model or 'Embeddings'}"
 
-    if service_name not in services:
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+@lru_cache(maxsize=1 << 18)
+def _hash_feature(feature: str, dim: int):
+    """Индекс и знак признака в хэшированном пространстве"""
+    digest = zlib.crc32(feature.encode("utf-8"))
+    return digest % dim, 1.0 if digest & 0x80000000 else -1.0
+
+
+@register_embeddings_service("hashing")
+class HashingEmbeddingsService(BaseEmbeddingsService):
+    """
+    Локальный детерминированный эмбеддер без сети и моделей.
+
+    Слова и символьные триграммы слов хэшируются в вектор размерности dim,
+    веса сглаживаются логарифмом, вектор нормируется. Триграммы делают
+    вектор устойчивым к падежным окончаниям ("Варяг" / "Варяга").
+    """
+
+    cacheable = False
+
+    def __init__(self, dim: int = settings.EMBEDDING_LOCAL_DIM, **kwargs):
+        kwargs.setdefault("max_concurrency", settings.EMBEDDING_THREADS)
+        super().__init__(**kwargs)
+        self.dim = dim
+        self.model_name = f"hashing/{dim}"
+
+    @staticmethod
+    def _features(text: str) -> List[str]:
+        features = []
+        for token in _TOKEN_RE.findall(text.lower()):
+            features.append(token)
+            padded = f"<{token}>"
+            features.extend(padded[i : i + 3] for i in range(len(padded) - 2))
+        return features
+
+    def embed_batch(self, texts: List[str]) -> List[np.ndarray]:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            hashed = [_hash_feature(feature, self.dim) for feature in self._features(text)]
+            if hashed:
+                indices, signs = zip(*hashed)
+                np.add.at(matrix[row], list(indices), list(signs))
+
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return list(matrix / norms)
+
+
+@register_embeddings_service("sentence-transformers")
+class SentenceTransformerEmbeddingsService(BaseEmbeddingsService):
+    """
+    Локальная модель sentence-transformers на CPU.
+    Требует пакет sentence-transformers, который не входит в requirements.txt.
+    """
+
+    def __init__(self, model_name: str = settings.EMBEDDING_LOCAL_MODEL, **kwargs):
+        kwargs.setdefault("max_concurrency", settings.EMBEDDING_THREADS)
+        super().__init__(**kwargs)
+        try:
+            import torch
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise ImportError(
+                "Could not import sentence_transformers python package. "
+                "Please install it with `pip install sentence-transformers`."
+            )
+
+        # Ограничиваем число потоков, чтобы не отнимать CPU у бота
+        torch.set_num_threads(settings.EMBEDDING_THREADS)
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.model_name = f"sentence-transformers/{model_name}"
+
+    def embed_batch(self, texts: List[str]) -> List[np.ndarray]:
+        return list(
+            self.model.encode(
+                texts,
+                batch_size=self.batch_size,
+                normalize_embeddings=True,
+                convert_to_numpy=True,
+            )
+        )
+
+
+@lru_cache(maxsize=None)
+def get_embedding_cache(path: str, max_entries: int) -> EmbeddingCache:
+    """Общий экземпляр кэша эмбеддингов для каждого файла"""
+    return EmbeddingCache(path, max_entries=max_entries)
+
+
+def get_embeddings_service(
+    service_name: str = settings.EMBEDDING_SERVICE,
+    use_cache: bool = settings.EMBEDDING_CACHE_ENABLED,
+) -> EmbeddingFunction:
+    """Фабричный метод для получения сервиса эмбеддингов"""
+    if service_name not in EMBEDDING_SERVICES:
         raise ValueError(f"Unknown embedding service: {service_name}")
 
-    return services[service_name]()
+    service = EMBEDDING_SERVICES[service_name]()
+    if not use_cache or not service.cacheable:
+        return service
+
+    cache = get_embedding_cache(
+        settings.EMBEDDING_CACHE_PATH, settings.EMBEDDING_CACHE_MAX_ENTRIES
+    )
+    return CachedEmbeddingsService(service, cache, service.model_name)
@@ -0,0 +1,205 @@
+from functools import cached_property
+from typing import Optional
+import asyncio
+import logging
+import threading
+import time
+
+import gigachat
+from gigachat.api import post_auth, post_token
+from gigachat.context import authorization_cvar
+from gigachat.models import AccessToken, Token
+from langchain_gigachat import GigaChat, GigaChatEmbeddings
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Пауза перед повторной попыткой обновить токен после ошибки, секунды
+TOKEN_RETRY_INTERVAL = 10.0
+
+
+def _expires_at_seconds(token: AccessToken) -> float:
+    """OAuth отдает время истечения в миллисекундах, /token - в секундах"""
+    expires_at = token.expires_at
+    return expires_at / 1000 if expires_at > 10**11 else float(expires_at)
+
+
+def _build_access_token(token: Token) -> AccessToken:
+    return AccessToken(access_token=token.tok, expires_at=token.exp, x_headers=token.x_headers)
+
+
+class SharedGigaChatClient(gigachat.GigaChat):
+    """
+    Клиент GigaChat API, общий для эмбеддингов и генерации.
+
+    Один экземпляр держит keep-alive пулы соединений httpx (синхронный для
+    эмбеддингов, асинхронный для чата) и один токен доступа. Токен считается
+    недействительным за expiry_skew секунд до истечения, а фоновый поток
+    обновляет его заранее, за refresh_margin секунд, поэтому запросы
+    пользователей не ждут авторизацию.
+    """
+
+    def __init__(
+        self,
+        refresh_margin: float = settings.GIGACHAT_TOKEN_REFRESH_MARGIN,
+        expiry_skew: float = settings.GIGACHAT_TOKEN_EXPIRY_SKEW,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.refresh_margin = refresh_margin
+        self.expiry_skew = expiry_skew
+        self.token_fetches = 0
+        self._refresher: Optional[threading.Thread] = None
+        self._stop_refresher = threading.Event()
+
+    def _check_validity_token(self) -> bool:
+        token = self._access_token
+        if token is None:
+            return False
+        # Токен, переданный явно, без времени истечения
+        if not token.expires_at:
+            return True
+        return _expires_at_seconds(token) - time.time() > self.expiry_skew
+
+    def _store_token(self, token: AccessToken):
+        self._access_token = token
+        self.token_fetches += 1
+        logger.info(
+            f"Токен GigaChat обновлен, действует еще "
+            f"{_expires_at_seconds(token) - time.time():.0f} с"
+        )
+
+    def _fetch_token(self) -> AccessToken:
+        if self._settings.credentials:
+            return post_auth.sync(
+                self._auth_client,
+                url=self._settings.auth_url,
+                credentials=self._settings.credentials,
+                scope=self._settings.scope,
+            )
+        return _build_access_token(
+            post_token.sync(
+                self._client, user=self._settings.user, password=self._settings.password
+            )
+        )
+
+    async def _afetch_token(self) -> AccessToken:
+        if self._settings.credentials:
+            return await post_auth.asyncio(
+                self._auth_aclient,
+                url=self._settings.auth_url,
+                credentials=self._settings.credentials,
+                scope=self._settings.scope,
+            )
+        return _build_access_token(
+            await post_token.asyncio(
+                self._aclient, user=self._settings.user, password=self._settings.password
+            )
+        )
+
+    def _update_token(self) -> None:
+        if authorization_cvar.get() is not None:
+            return
+        with self._sync_token_lock:
+            if not self._check_validity_token():
+                self._store_token(self._fetch_token())
+
+    async def _aupdate_token(self) -> None:
+        if authorization_cvar.get() is not None:
+            return
+        async with self._async_token_lock:
+            if not self._check_validity_token():
+                self._store_token(await self._afetch_token())
+
+    def refresh_token(self):
+        """
+        Принудительно получает новый токен. Запросы, идущие в это время,
+        продолжают использовать старый токен до замены.
+        """
+        token = self._fetch_token()
+        with self._sync_token_lock:
+            self._store_token(token)
+
+    def _refresh_delay(self) -> Optional[float]:
+        """Через сколько секунд обновить токен; None - обновлять не нужно"""
+        token = self._access_token
+        if token is None:
+            return 0.0
+        if not token.expires_at:
+            return None
+        return max(_expires_at_seconds(token) - time.time() - self.refresh_margin, 0.0)
+
+    def _refresh_loop(self):
+        delay = self._refresh_delay()
+        while delay is not None and not self._stop_refresher.wait(delay):
+            try:
+                self.refresh_token()
+                delay = self._refresh_delay()
+            except Exception as e:
+                logger.warning(f"Не удалось обновить токен GigaChat: {str(e)}")
+                delay = TOKEN_RETRY_INTERVAL
+
+    def start_token_refresher(self):
+        """Запускает фоновое обновление токена; первый токен запрашивается сразу"""
+        if not self._use_auth or self._refresher is not None:
+            return
+        self._stop_refresher.clear()
+        self._refresher = threading.Thread(
+            target=self._refresh_loop, name="gigachat-token", daemon=True
+        )
+        self._refresher.start()
+
+    def stop_token_refresher(self):
+        self._stop_refresher.set()
+        if self._refresher is not None:
+            self._refresher.join()
+            self._refresher = None
+
+
+_client: Optional[SharedGigaChatClient] = None
+_client_lock = threading.Lock()
+
+
+def get_gigachat_client() -> SharedGigaChatClient:
+    """Общий клиент GigaChat процесса, создается при первом обращении"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = SharedGigaChatClient(
+                    credentials=settings.GIGACHAT_API_KEY,
+                    verify_ssl_certs=False,
+                    model=settings.LLM_GIGACHAT_MODEL,
+                    max_connections=settings.GIGACHAT_MAX_CONNECTIONS,
+                )
+    return _client
+
+
+async def close_gigachat_client():
+    """Останавливает обновление токена и закрывает пулы соединений"""
+    global _client
+    with _client_lock:
+        client, _client = _client, None
+    if client is None:
+        return
+    # Поток обновления может ждать ответа авторизации: join не должен блокировать цикл событий
+    await asyncio.to_thread(client.stop_token_refresher)
+    client.close()
+    await client.aclose()
+
+
+class SharedGigaChat(GigaChat):
+    """Чат-модель langchain поверх общего клиента"""
+
+    @cached_property
+    def _client(self) -> gigachat.GigaChat:
+        return get_gigachat_client()
+
+
+class SharedGigaChatEmbeddings(GigaChatEmbeddings):
+    """Эмбеддинги langchain поверх общего клиента"""
+
+    @cached_property
+    def _client(self) -> gigachat.GigaChat:
+        return get_gigachat_client()
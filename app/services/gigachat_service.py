@@ -1,10 +1,13 @@
 from __future__ import annotations
 
-from langchain_gigachat import GigaChat
-from langchain.schema import SystemMessage, HumanMessage, AIMessage
-from typing import List, Dict
+from services.gigachat_client import SharedGigaChat
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+from typing import AsyncIterator, List, Dict, Optional
 from config import settings
+from services.context_packer import ContextPacker, estimate_tokens
+from services.metrics import metrics
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -46,37 +49,87 @@ SYSTEM_PROMPT = """
 """
 
 
+SYSTEM_PROMPT_TOKENS = estimate_tokens(SYSTEM_PROMPT)
+
+
 class GigaChatService:
+    context_packer = ContextPacker()
+
     def __init__(self):
         logger.info("Initializing GigaChat service")
         try:
-            self.chat = GigaChat(
-                credentials=settings.GIGACHAT_API_KEY,
-                verify_ssl_certs=False,
-                model=settings.LLM_GIGACHAT_MODEL,
-            )
+            # Клиент API и токен общие с эмбеддингами, см. gigachat_client
+            self.chat = SharedGigaChat(model=settings.LLM_GIGACHAT_MODEL)
             logger.info("GigaChat service initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize GigaChat service: {str(e)}")
             raise
 
-    def generate_response(self, query: str, context: List[str]) -> str:
+    def generate_response(
+        self, query: str, context: List[str], metadatas: Optional[List[Dict]] = None
+    ) -> str:
         """
         Генерирует ответ на основе запроса и контекста
         """
         try:
-            messages = self._create_messages(query, context)
-            response = self.chat.invoke(messages)
+            messages = self._create_messages(query, context, metadatas)
+            with metrics.span("llm"):
+                response = self.chat.invoke(messages)
 
             logger.info(f"Generated response for query: {query}")
+            self._log_usage(messages, response)
             return response.content
 
         except Exception as e:
             logger.error(f"Error generating response: {str(e)}")
             raise
 
+    async def agenerate_response(
+        self, query: str, context: List[str], metadatas: Optional[List[Dict]] = None
+    ) -> str:
+        """
+        Асинхронный вариант generate_response на нативном async-клиенте GigaChat
+        """
+        try:
+            messages = self._create_messages(query, context, metadatas)
+            with metrics.span("llm"):
+                response = await self.chat.ainvoke(messages)
+
+            logger.info(f"Generated response for query: {query}")
+            self._log_usage(messages, response)
+            return response.content
+
+        except Exception as e:
+            logger.error(f"Error generating response: {str(e)}")
+            raise
+
+    async def astream_response(
+        self, query: str, context: List[str], metadatas: Optional[List[Dict]] = None
+    ) -> AsyncIterator[str]:
+        """
+        Генерирует ответ потоково: отдает фрагменты текста по мере их генерации
+        """
+        try:
+            messages = self._create_messages(query, context, metadatas)
+            last_chunk = None
+            start = time.perf_counter()
+            async for chunk in self.chat.astream(messages):
+                if last_chunk is None and metrics.enabled:
+                    metrics.observe("llm_first_token", time.perf_counter() - start)
+                last_chunk = chunk
+                if chunk.content:
+                    yield chunk.content
+
+            logger.info(f"Streamed response for query: {query}")
+            # Статистика токенов приходит в последнем фрагменте потока
+            self._log_usage(messages, last_chunk)
+
+        except Exception as e:
+            logger.error(f"Error streaming response: {str(e)}")
+            raise
+
     def _create_messages(
-        self, query: str, context: List[str]
+        self, query: str, context: List[str], metadatas: Optional[List[Dict]] = None
     ) -> List[SystemMessage | AIMessage | HumanMessage]:
         """
         Создает список сообщений для модели используя langchain схему:
@@ -87,7 +140,7 @@ class GigaChatService:
         messages = [SystemMessage(content=SYSTEM_PROMPT)]
 
         # Объединяем контекст в одну строку
-        context_text = self.generate_context(context)
+        context_text = self.generate_context(context, metadatas)
         messages.append(AIMessage(content=context_text))
 
         # Добавляем вопрос пользователя
@@ -95,5 +148,21 @@ class GigaChatService:
 
         return messages
 
-    def generate_context(self, texts: List[str]) -> str:
-        return "\n".join(texts)
+    def generate_context(self, texts: List[str], metadatas: Optional[List[Dict]] = None) -> str:
+        """
+        Упаковывает чанки в контекст в пределах CONTEXT_MAX_TOKENS:
+        без дубликатов и повторов перекрытия, по убыванию релевантности
+        """
+        return "\n".join(self.context_packer.pack(texts, metadatas))
+
+    @staticmethod
+    def _log_usage(messages: List[SystemMessage | AIMessage | HumanMessage], response):
+        """Логирует оценку размера промпта и фактический расход токенов"""
+        estimated = SYSTEM_PROMPT_TOKENS + sum(
+            estimate_tokens(message.content) for message in messages[1:]
+        )
+        usage = getattr(response, "usage_metadata", None) or {}
+        logger.info(
+            f"Токены промпта: ~{estimated} (оценка), "
+            f"input={usage.get('input_tokens')}, output={usage.get('output_tokens')}"
+        )
@@ -0,0 +1,568 @@
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+from pathlib import Path
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+from config import settings
+from services.chroma_service import ChromaService
+from services.text_processor import TextProcessor, segments_path
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "ingest_manifest.json"
+
+
+def file_hash(file_path: Path) -> str:
+    """sha256 содержимого файла"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_chunk_id(path: str, index: int, text: str) -> str:
+    """Детерминированный id чанка из (путь, номер чанка, хэш содержимого)"""
+    content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{path}:{index}:{content_hash}".encode("utf-8")).hexdigest()
+
+
+class IngestManifest:
+    """
+    Манифест загруженных файлов: для каждой коллекции хранит хэш файла,
+    параметры чанкирования и число чанков. Позволяет пропускать неизмененные
+    файлы при повторной загрузке.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = Path(path or Path(settings.CHROMA_PERSIST_DIRECTORY) / MANIFEST_FILE)
+        self._data: Dict[str, Dict[str, Dict]] = {}
+
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._data = json.load(f)
+
+    def get(self, collection_name: str, file_path: str) -> Optional[Dict]:
+        return self._data.get(collection_name, {}).get(file_path)
+
+    def files(self, collection_name: str) -> List[str]:
+        return list(self._data.get(collection_name, {}))
+
+    def update(self, collection_name: str, file_path: str, entry: Dict):
+        self._data.setdefault(collection_name, {})[file_path] = entry
+
+    def remove(self, collection_name: str, file_path: str):
+        self._data.get(collection_name, {}).pop(file_path, None)
+
+    def save(self):
+        """Атомарная запись манифеста"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def load_sources(docs_dir: str, json_file: str = "urls.json") -> List[Tuple[Path, Dict]]:
+    """
+    Читает список источников из JSON-файла с URL.
+
+    Returns:
+        List[Tuple[Path, Dict]]: пары (путь к файлу, метаданные с URL источника)
+    """
+    urls_path = Path(docs_dir) / json_file
+
+    logger.info(f"Загрузка документов из директории: {docs_dir}")
+    logger.info(f"Путь к JSON файлу: {urls_path}")
+
+    # Проверяем существование директории и файла
+    if not Path(docs_dir).exists():
+        logger.error(f"Директория не существует: {docs_dir}")
+        raise FileNotFoundError(f"Directory not found: {docs_dir}")
+
+    if not urls_path.exists():
+        logger.error(f"JSON файл не найден: {urls_path}")
+        raise FileNotFoundError(f"JSON file not found: {urls_path}")
+
+    # Загружаем URL из JSON-файла
+    with open(urls_path, "r", encoding="utf-8") as f:
+        urls = json.load(f)
+        logger.info(f"Загружено {len(urls)} URL из JSON файла")
+        logger.debug(f"Содержимое urls: {urls}")
+
+    files = []
+    for doc in urls:
+        file_path = Path(docs_dir) / doc["file"]
+
+        # Проверяем существование файла
+        if not file_path.is_file():
+            logger.warning(f"Файл не найден: {file_path}")
+            continue
+        # URL добавляем в метаданные каждого чанка
+        files.append((file_path, {"source": doc["url"]}))
+
+    return files
+
+
+def _manifest_entry(
+    processor: TextProcessor, file_path: Path, extra_metadata: Optional[Dict]
+) -> Dict:
+    segments = segments_path(file_path)
+    return {
+        "hash": file_hash(file_path),
+        "chunk_size": processor.chunk_size,
+        "chunk_overlap": processor.chunk_overlap,
+        "chunk_strategy": processor.chunk_strategy,
+        # Таймкоды чанков берутся из сегментов, их изменение тоже требует перезагрузки
+        "segments_hash": file_hash(segments) if segments.is_file() else None,
+        "extra_metadata": extra_metadata or {},
+    }
+
+
+def _unchanged_entry(
+    chroma_service: ChromaService,
+    manifest: IngestManifest,
+    collection_name: str,
+    path: str,
+    entry: Dict,
+) -> Optional[Dict]:
+    """Запись манифеста, если файл не изменился и его чанки есть в коллекции"""
+    previous = manifest.get(collection_name, path)
+    if previous and all(previous.get(key) == value for key, value in entry.items()):
+        if chroma_service.document_exists(collection_name, path):
+            return previous
+    return None
+
+
+def remove_missing_files(
+    chroma_service: ChromaService,
+    manifest: IngestManifest,
+    collection_name: str,
+    present_paths: List[str],
+) -> int:
+    """Удаляет из коллекции чанки файлов, которых больше нет в источнике"""
+    deleted = 0
+    for path in set(manifest.files(collection_name)) - set(present_paths):
+        ids = chroma_service.get_document_ids(collection_name, {"path": path})
+        chroma_service.delete_documents(collection_name, ids)
+        manifest.remove(collection_name, path)
+        deleted += len(ids)
+        logger.info(f"Файл {path} удален из источника, удалено {len(ids)} чанков")
+    return deleted
+
+
+@dataclass
+class StageStats:
+    """Статистика стадии конвейера; ее пишут несколько потоков одновременно"""
+
+    items: int = 0
+    busy_seconds: float = 0.0
+    first_start: Optional[float] = None
+    last_end: Optional[float] = None
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def record(self, items: int, start: float, end: float):
+        with self._lock:
+            self.items += items
+            self.busy_seconds += end - start
+            self.first_start = start if self.first_start is None else min(self.first_start, start)
+            self.last_end = end if self.last_end is None else max(self.last_end, end)
+
+    def as_dict(self) -> Dict:
+        with self._lock:
+            window = (self.last_end - self.first_start) if self.items else 0.0
+            return {
+                "items": self.items,
+                "busy_seconds": round(self.busy_seconds, 3),
+                "items_per_sec": round(self.items / window, 1) if window else 0.0,
+            }
+
+
+@dataclass
+class _FileState:
+    entry: Dict
+    existing: Set[str]
+    # Части работы в полете: батчи на эмбеддинг и удаление после последнего чанка
+    remaining: int = 1
+    chunks: int = 0
+    unchanged: int = 0
+    seen: Set[str] = field(default_factory=set)
+    # id чанков, прочитанных в другой кодировке: удаляются вместе с устаревшими
+    discarded: Set[str] = field(default_factory=set)
+    stale: Set[str] = field(default_factory=set)
+
+
+_STOP = object()
+
+
+def _stream_file(
+    processor: TextProcessor,
+    file_path: Path,
+    extra_metadata: Optional[Dict],
+    batch_size: int,
+    chunks_queue,
+):
+    """
+    Чтение, очистка и чанкирование файла (выполняется в пуле процессов).
+
+    Чанки уходят в chunks_queue батчами по мере разбиения: ("chunks", путь, батч),
+    в конце - ("done", путь, (число чанков, начало, конец)). Если файл не
+    читается в выбранной кодировке, отправляется ("restart", путь, None) и
+    разбиение начинается заново в следующей кодировке.
+    """
+    path = str(file_path)
+    start = time.time()
+    try:
+        for encoding in processor.candidate_encodings(file_path):
+            count = 0
+            batch = []
+            try:
+                for text, metadata in processor.iter_records(file_path, encoding):
+                    metadata.update(extra_metadata or {})
+                    batch.append((make_chunk_id(path, count, text), text, metadata))
+                    count += 1
+                    if len(batch) >= batch_size:
+                        chunks_queue.put(("chunks", path, batch))
+                        batch = []
+                if batch:
+                    chunks_queue.put(("chunks", path, batch))
+                chunks_queue.put(("done", path, (count, start, time.time())))
+                return
+            except UnicodeDecodeError:
+                logger.warning(f"Файл {file_path} не читается в {encoding}")
+                chunks_queue.put(("restart", path, None))
+        raise ValueError(f"Не удалось прочитать файл {file_path}")
+    except Exception as e:
+        chunks_queue.put(("error", path, e))
+
+
+class IngestPipeline:
+    """
+    Конвейер загрузки документов из трех стадий:
+
+    - process: потоковое чтение, очистка и чанкирование файлов в пуле процессов,
+      чанки уходят дальше батчами, не дожидаясь конца файла;
+    - embed: эмбеддинг новых чанков батчами в нескольких потоках;
+    - upsert: пакетная запись в ChromaDB в отдельном потоке.
+
+    Стадии связаны ограниченными очередями, поэтому медленная стадия
+    притормаживает предыдущие, и память не растет ни с размером файла, ни с
+    размером корпуса: пул обрабатывает не больше двух файлов на процесс.
+    """
+
+    def __init__(
+        self,
+        chroma_service: ChromaService,
+        processor: Optional[TextProcessor] = None,
+        manifest: Optional[IngestManifest] = None,
+        process_workers: int = settings.INGEST_PROCESS_WORKERS,
+        embed_workers: int = settings.INGEST_EMBED_WORKERS,
+        embed_batch_size: int = settings.EMBEDDING_BATCH_SIZE,
+        upsert_batch_size: int = settings.INGEST_UPSERT_BATCH_SIZE,
+        queue_size: int = settings.INGEST_QUEUE_SIZE,
+    ):
+        self.chroma_service = chroma_service
+        self.processor = processor or TextProcessor()
+        self.manifest = manifest or IngestManifest()
+        self.process_workers = process_workers
+        self.embed_workers = embed_workers
+        self.embed_batch_size = embed_batch_size
+        self.upsert_batch_size = upsert_batch_size
+        self.queue_size = queue_size
+
+    def run(self, collection_name: str, files: List[Tuple[Path, Dict]]) -> Dict:
+        """
+        Загружает файлы в коллекцию.
+
+        Args:
+            collection_name: Название коллекции в ChromaDB.
+            files: Список пар (путь к файлу, дополнительные метаданные чанков).
+
+        Returns:
+            Dict: общая статистика и пропускная способность каждой стадии.
+        """
+        wall_start = time.perf_counter()
+        self._collection_name = collection_name
+        self._stats = {stage: StageStats() for stage in ("process", "embed", "upsert")}
+        self._files: Dict[str, _FileState] = {}
+        self._lock = threading.Lock()
+        self._errors: List[Exception] = []
+        self._totals = {"added": 0, "deleted": 0, "unchanged": 0, "skipped": 0}
+
+        embed_queue = queue.Queue(maxsize=self.queue_size)
+        upsert_queue = queue.Queue(maxsize=self.queue_size)
+
+        embed_threads = [
+            threading.Thread(
+                target=self._embed_worker,
+                args=(embed_queue, upsert_queue),
+                name=f"ingest-embed-{i}",
+                daemon=True,
+            )
+            for i in range(self.embed_workers)
+        ]
+        upsert_thread = threading.Thread(
+            target=self._upsert_worker, args=(upsert_queue,), name="ingest-upsert", daemon=True
+        )
+        for thread in embed_threads:
+            thread.start()
+        upsert_thread.start()
+
+        try:
+            self._produce(files, embed_queue, upsert_queue)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            for _ in embed_threads:
+                embed_queue.put(_STOP)
+            for thread in embed_threads:
+                thread.join()
+            upsert_queue.put(_STOP)
+            upsert_thread.join()
+            self.manifest.save()
+            self.chroma_service.save_lexical_indexes()
+
+        if self._errors:
+            raise self._errors[0]
+
+        result = {
+            "files": len(files),
+            **self._totals,
+            "wall_seconds": round(time.perf_counter() - wall_start, 3),
+            "stages": {name: stage.as_dict() for name, stage in self._stats.items()},
+        }
+        logger.info(f"Загрузка в коллекцию {collection_name} завершена: {result}")
+        return result
+
+    def _fail(self, error: Exception):
+        logger.error(f"Ошибка в конвейере загрузки: {str(error)}")
+        with self._lock:
+            self._errors.append(error)
+
+    def _executor(self):
+        if self.process_workers > 0:
+            return ProcessPoolExecutor(max_workers=self.process_workers)
+        # Без пула процессов обработка идет в одном фоновом потоке
+        return ThreadPoolExecutor(max_workers=1)
+
+    @contextmanager
+    def _chunks_queue(self):
+        """Очередь батчей чанков от стадии process; между процессами - через Manager"""
+        if self.process_workers <= 0:
+            yield queue.Queue(maxsize=self.queue_size)
+            return
+        with multiprocessing.Manager() as manager:
+            yield manager.Queue(maxsize=self.queue_size)
+
+    def _produce(self, files, embed_queue: queue.Queue, upsert_queue: queue.Queue):
+        """
+        Стадия process: подает файлы в пул процессов и раздает чанки дальше
+        по мере разбиения, не дожидаясь конца файла.
+        """
+        pending = deque()
+        for file_path, extra_metadata in files:
+            path = str(file_path)
+            entry = _manifest_entry(self.processor, file_path, extra_metadata)
+            previous = _unchanged_entry(
+                self.chroma_service, self.manifest, self._collection_name, path, entry
+            )
+            if previous:
+                logger.info(f"Файл {file_path} не изменился, пропускаем")
+                self._totals["skipped"] += 1
+                self._totals["unchanged"] += previous["chunks"]
+                continue
+            pending.append((file_path, extra_metadata, entry))
+
+        # Не больше двух файлов на процесс в работе одновременно
+        max_in_flight = max(1, self.process_workers) * 2
+        with self._executor() as pool, self._chunks_queue() as chunks_queue:
+            in_flight: Dict[str, Future] = {}
+
+            def submit_next():
+                if not pending:
+                    return
+                file_path, extra_metadata, entry = pending.popleft()
+                path = str(file_path)
+                existing = self.chroma_service.get_document_ids(
+                    self._collection_name, {"path": path}
+                )
+                with self._lock:
+                    self._files[path] = _FileState(entry=entry, existing=set(existing))
+                in_flight[path] = pool.submit(
+                    _stream_file,
+                    self.processor,
+                    file_path,
+                    extra_metadata,
+                    self.embed_batch_size,
+                    chunks_queue,
+                )
+
+            for _ in range(max_in_flight):
+                submit_next()
+
+            try:
+                while in_flight and not self._errors:
+                    try:
+                        kind, path, payload = chunks_queue.get(timeout=0.5)
+                    except queue.Empty:
+                        # Воркер мог упасть, не успев ничего отправить
+                        for future in in_flight.values():
+                            if future.done() and future.exception() is not None:
+                                raise future.exception()
+                        continue
+
+                    if kind == "chunks":
+                        self._dispatch(path, payload, embed_queue)
+                    elif kind == "restart":
+                        self._restart(path)
+                    elif kind == "error":
+                        raise payload
+                    else:
+                        del in_flight[path]
+                        self._finish(path, payload, upsert_queue)
+                        submit_next()
+            finally:
+                for future in in_flight.values():
+                    future.cancel()
+                # Воркеры могут ждать места в очереди: разбираем ее до их остановки
+                while any(not future.done() for future in in_flight.values()):
+                    try:
+                        chunks_queue.get(timeout=0.1)
+                    except queue.Empty:
+                        pass
+
+    def _dispatch(self, path: str, batch: List[Tuple[str, str, Dict]], embed_queue: queue.Queue):
+        """Отправляет новые чанки из батча на эмбеддинг"""
+        state = self._files[path]
+        new = [item for item in batch if item[0] not in state.existing]
+        state.seen.update(doc_id for doc_id, _, _ in batch)
+        state.unchanged += len(batch) - len(new)
+        if not new:
+            return
+
+        with self._lock:
+            state.remaining += 1
+        embed_queue.put(
+            (
+                path,
+                [doc_id for doc_id, _, _ in new],
+                [text for _, text, _ in new],
+                [metadata for _, _, metadata in new],
+            )
+        )
+
+    def _restart(self, path: str):
+        """Файл перечитывается в другой кодировке: уже отправленные чанки отбрасываются"""
+        state = self._files[path]
+        state.discarded.update(state.seen)
+        state.seen = set()
+        state.unchanged = 0
+
+    def _finish(self, path: str, payload: Tuple[int, float, float], upsert_queue: queue.Queue):
+        """Файл разбит целиком: устаревшие чанки отправляются на удаление"""
+        chunks, start, end = payload
+        state = self._files[path]
+        self._stats["process"].record(chunks, start, end)
+        with self._lock:
+            state.chunks = chunks
+            state.stale = (state.existing | state.discarded) - state.seen
+            self._totals["unchanged"] += state.unchanged
+        upsert_queue.put(("delete", path, list(state.stale)))
+
+    def _embed_worker(self, embed_queue: queue.Queue, upsert_queue: queue.Queue):
+        """Стадия embed"""
+        while True:
+            item = embed_queue.get()
+            if item is _STOP:
+                return
+            if self._errors:
+                continue
+            path, ids, texts, metadatas = item
+            try:
+                start = time.time()
+                embeddings = self.chroma_service.embeddings(texts)
+                self._stats["embed"].record(len(texts), start, time.time())
+                upsert_queue.put(("upsert", path, (ids, texts, metadatas, embeddings)))
+            except Exception as e:
+                self._fail(e)
+
+    def _upsert_worker(self, upsert_queue: queue.Queue):
+        """Стадия upsert: копит чанки и пишет их в ChromaDB пачками"""
+        buffer = []
+
+        def flush():
+            if not buffer:
+                return
+            # Чанки, отброшенные после смены кодировки, в базу не пишем
+            for i, (path, (ids, texts, metadatas, embeddings)) in enumerate(buffer):
+                stale = self._files[path].stale
+                if stale and any(doc_id in stale for doc_id in ids):
+                    keep = [j for j, doc_id in enumerate(ids) if doc_id not in stale]
+                    buffer[i] = (
+                        path,
+                        (
+                            [ids[j] for j in keep],
+                            [texts[j] for j in keep],
+                            [metadatas[j] for j in keep],
+                            [embeddings[j] for j in keep],
+                        ),
+                    )
+            start = time.time()
+            self.chroma_service.add_documents(
+                collection_name=self._collection_name,
+                ids=[doc_id for _, (ids, _, _, _) in buffer for doc_id in ids],
+                texts=[text for _, (_, texts, _, _) in buffer for text in texts],
+                metadatas=[meta for _, (_, _, metas, _) in buffer for meta in metas],
+                embeddings=[emb for _, (_, _, _, embs) in buffer for emb in embs],
+            )
+            count = sum(len(ids) for _, (ids, _, _, _) in buffer)
+            self._stats["upsert"].record(count, start, time.time())
+            self._totals["added"] += count
+            for path, _ in buffer:
+                self._complete(path)
+            buffer.clear()
+
+        while True:
+            item = upsert_queue.get()
+            if item is _STOP:
+                break
+            if self._errors:
+                continue
+            kind, path, payload = item
+            try:
+                if kind == "delete":
+                    self.chroma_service.delete_documents(self._collection_name, payload)
+                    self._totals["deleted"] += len(payload)
+                    self._complete(path)
+                else:
+                    buffer.append((path, payload))
+                    if sum(len(ids) for _, (ids, _, _, _) in buffer) >= self.upsert_batch_size:
+                        flush()
+            except Exception as e:
+                self._fail(e)
+
+        try:
+            if not self._errors:
+                flush()
+        except Exception as e:
+            self._fail(e)
+
+    def _complete(self, path: str):
+        """Отмечает завершение части работы по файлу; после последней обновляет манифест"""
+        with self._lock:
+            state = self._files[path]
+            state.remaining -= 1
+            if state.remaining == 0:
+                self.manifest.update(
+                    self._collection_name, path, {**state.entry, "chunks": state.chunks}
+                )
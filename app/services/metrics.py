@@ -0,0 +1,155 @@
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+import threading
+import time
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Границы бакетов гистограмм задержек, секунды
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+STAGE_METRIC = "rag_stage_duration_seconds"
+
+_NULL_SPAN = nullcontext()
+
+
+class Histogram:
+    """Гистограмма в формате Prometheus: счетчики по бакетам, сумма и количество"""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        """Накопительные счетчики бакетов (последний - +Inf), сумма и количество"""
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative, running = [], 0
+        for value in counts:
+            running += value
+            cumulative.append(running)
+        return cumulative, total, count
+
+
+class MetricsRegistry:
+    """
+    Реестр метрик: гистограммы длительности стадий обработки запроса
+    и gauge-метрики, значения которых читаются при экспорте.
+
+    Когда сбор выключен, span возвращает общий пустой контекстный менеджер,
+    поэтому инструментирование почти ничего не стоит.
+    """
+
+    def __init__(self, enabled: bool = settings.METRICS_ENABLED):
+        self.enabled = enabled
+        self._stages: Dict[str, Histogram] = {}
+        self._gauges: Dict[str, Tuple[str, Callable[[], float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float):
+        histogram = self._stages.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._stages.setdefault(stage, Histogram())
+        histogram.observe(seconds)
+
+    def span(self, stage: str):
+        """Контекстный менеджер, измеряющий длительность стадии"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return self._span(stage)
+
+    @contextmanager
+    def _span(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def add_gauge(self, name: str, help_text: str, func: Callable[[], float]):
+        """Регистрирует gauge-метрику; func вызывается при каждом экспорте"""
+        self._gauges[name] = (help_text, func)
+
+    def stage_stats(self, stage: str) -> Optional[Dict]:
+        histogram = self._stages.get(stage)
+        if histogram is None:
+            return None
+        _, total, count = histogram.snapshot()
+        return {"count": count, "sum": total}
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+    def render(self) -> str:
+        """Метрики в текстовом формате Prometheus"""
+        lines = [
+            f"# HELP {STAGE_METRIC} Длительность стадий обработки запроса",
+            f"# TYPE {STAGE_METRIC} histogram",
+        ]
+        for stage, histogram in sorted(self._stages.items()):
+            cumulative, total, count = histogram.snapshot()
+            bounds = [str(bound) for bound in histogram.buckets] + ["+Inf"]
+            for bound, value in zip(bounds, cumulative):
+                lines.append(f'{STAGE_METRIC}_bucket{{stage="{stage}",le="{bound}"}} {value}')
+            lines.append(f'{STAGE_METRIC}_sum{{stage="{stage}"}} {total}')
+            lines.append(f'{STAGE_METRIC}_count{{stage="{stage}"}} {count}')
+
+        for name, (help_text, func) in sorted(self._gauges.items()):
+            try:
+                value = float(func())
+            except Exception as e:
+                logger.warning(f"Не удалось получить значение метрики {name}: {str(e)}")
+                continue
+            lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"])
+
+        return "\n".join(lines) + "\n"
+
+
+# Общий реестр процесса
+metrics = MetricsRegistry()
+
+
+async def start_metrics_server(
+    host: str = settings.METRICS_HOST,
+    port: int = settings.METRICS_PORT,
+    registry: MetricsRegistry = metrics,
+):
+    """
+    Запускает HTTP-эндпоинт /metrics на aiohttp в текущем event loop.
+
+    Returns:
+        aiohttp.web.AppRunner: для остановки через runner.cleanup().
+    """
+    from aiohttp import web
+
+    async def handle_metrics(request: web.Request) -> web.Response:
+        return web.Response(
+            text=registry.render(), content_type="text/plain", charset="utf-8"
+        )
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Метрики доступны на http://{host}:{port}/metrics")
+    return runner
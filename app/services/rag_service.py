@@ -1,29 +1,64 @@
-import os
-import json
 from services.chroma_service import ChromaService
 from services.gigachat_service import GigaChatService
-from typing import List, Dict
-from pathlib import Path
+from services.answer_cache import SemanticAnswerCache
+from services.reranker import BaseReranker, get_reranker
+from services.retrieval import RetrievalResult
+from services.metrics import metrics
+from services.singleflight import AsyncSingleFlight, SingleFlight, normalize_query
+from config import settings
+from typing import AsyncIterator, List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
 from services.text_processor import TextProcessor
+from services.ingestion import (
+    IngestManifest,
+    IngestPipeline,
+    load_sources,
+    remove_missing_files,
+)
+import asyncio
 import logging
-from dotenv import load_dotenv
-
-load_dotenv()
-collection_name = os.getenv("CHROMA_COLLECTION_NAME")
+import time
 
 logger = logging.getLogger(__name__)
 
+RETRIEVAL_MODES = ("dense", "lexical", "hybrid")
+
 
 class RAGService:
-    def __init__(self):
-        self.chroma_service = ChromaService()
-        self.giga_chat_service = GigaChatService()
+    def __init__(
+        self,
+        chroma_service: Optional[ChromaService] = None,
+        giga_chat_service: Optional[GigaChatService] = None,
+        answer_cache: Optional[SemanticAnswerCache] = None,
+        retrieval_mode: str = settings.RETRIEVAL_MODE,
+        reranker: Optional[BaseReranker] = None,
+    ):
+        if retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(
+                f"Неизвестный режим поиска: {retrieval_mode}. Доступны: {RETRIEVAL_MODES}"
+            )
+        self.retrieval_mode = retrieval_mode
+
+        self.chroma_service = chroma_service or ChromaService(
+            lexical_index=retrieval_mode != "dense"
+        )
+        self.giga_chat_service = giga_chat_service or GigaChatService()
+        self.reranker = reranker if reranker is not None else get_reranker(settings.RERANKER)
+
+        # Кэш ответов ищет по эмбеддингу вопроса, а лексический режим эмбеддинги не считает
+        if answer_cache is None and settings.ANSWER_CACHE_ENABLED and retrieval_mode != "lexical":
+            answer_cache = SemanticAnswerCache()
+        self.answer_cache = answer_cache
+
+        # Одновременные одинаковые вопросы обрабатываются одним запросом
+        self.inflight = SingleFlight()
+        self.ainflight = AsyncSingleFlight()
 
     def load_documents_from_directory(
         self,
         docs_dir: str = "/app/data/scratches/cleaned_docs",
         json_file: str = "urls.json",
-        collection_name: str = collection_name,
+        collection_name: str = settings.COLLECTION_NAME,
     ):
         """
         Загружает документы из указанной директории в ChromaDB.
@@ -32,73 +67,37 @@ class RAGService:
             docs_dir: Путь к директории с документами.
             json_file: Путь к JSON-файлу с URL.
             collection_name: Название коллекции в ChromaDB.
-        """
 
-        # FIXME: причасать функцию, возможно вывести в сервис
+        Returns:
+            Dict: статистика загрузки по стадиям конвейера.
+        """
 
         processor = TextProcessor()
-        urls_path = Path(docs_dir) / json_file
-
-        logger.info(f"Загрузка документов из директории: {docs_dir}")
-        logger.info(f"Путь к JSON файлу: {urls_path}")
-
-        # Проверяем существование директории и файла
-        if not Path(docs_dir).exists():
-            logger.error(f"Директория не существует: {docs_dir}")
-            raise FileNotFoundError(f"Directory not found: {docs_dir}")
-
-        if not urls_path.exists():
-            logger.error(f"JSON файл не найден: {urls_path}")
-            raise FileNotFoundError(f"JSON file not found: {urls_path}")
-
-        # Загружаем URL из JSON-файла
-        with open(urls_path, "r", encoding="utf-8") as f:
-            urls = json.load(f)
-            logger.info(f"Загружено {len(urls)} URL из JSON файла")
-            logger.debug(f"Содержимое urls: {urls}")  # Добавляем вывод содержимого
-
-        for doc in urls:
-            file_path = Path(docs_dir) / doc["file"]
-            logger.info(f"Обработка файла: {file_path}")
-
-            # Проверяем существование файла
-            if not file_path.is_file():
-                logger.warning(f"Файл не найден: {file_path}")
-                continue
-
-            # Проверяем, не загружен ли уже документ
-            # FIXME: if any time left добавить проверку на дублирование документов, Например, по метаданным
-
-            try:
-                # Обрабатываем и загружаем документ
-                chunks, metadata_list = processor.process_file(file_path)
-                logger.info(f"Получено {len(chunks)} чанков из файла {doc['file']}")
-                if not chunks:
-                    logger.warning(f"Не получено чанков из файла {doc['file']}")
-                    continue
-
-                # Добавляем URL в метаданные каждого чанка
-                for metadata in metadata_list:
-                    metadata["source"] = doc["url"]
-
-                # Загружаем документы в ChromaDB
-                self.chroma_service.add_documents(
-                    collection_name=collection_name,
-                    texts=chunks,
-                    metadatas=metadata_list,
-                )
-                logger.info(
-                    f"Документы успешно загружены в коллекцию {collection_name}"
-                )
+        manifest = IngestManifest()
+        files = load_sources(docs_dir, json_file)
+
+        # Загружаем только новые и измененные чанки
+        pipeline = IngestPipeline(self.chroma_service, processor, manifest)
+        stats = pipeline.run(collection_name, files)
+
+        remove_missing_files(
+            self.chroma_service,
+            manifest,
+            collection_name,
+            [str(file_path) for file_path, _ in files],
+        )
+        manifest.save()
+        self.chroma_service.save_lexical_indexes()
 
-            except Exception as e:
-                logger.error(f"Ошибка при обработке файла {doc['file']}: {str(e)}")
-                raise
+        return stats
 
     def generate_answer(self, query: str, collection_name: str) -> str:
         """
         Генерирует ответ на основе запроса, используя RAG-логику.
 
+        Одновременные запросы с одинаковым нормализованным вопросом
+        ждут один общий вызов и получают один ответ.
+
         Args:
             query: Вопрос пользователя.
             collection_name: Название коллекции в ChromaDB.
@@ -106,17 +105,413 @@ class RAGService:
         Returns:
             str: Сгенерированный ответ.
         """
-        # Поиск релевантных документов
-        results = self.chroma_service.query_documents(
-            collection_name=collection_name, query_text=query, n_results=5
+        if not settings.REQUEST_COALESCING_ENABLED:
+            return self._generate_answer(query, collection_name)
+        return self.inflight.do(
+            (collection_name, normalize_query(query)),
+            lambda: self._generate_answer(query, collection_name),
         )
 
-        # Извлечение контекста
-        context = [
-            doc[0] for doc in results["documents"]
-        ]  # Извлекаем текст из каждого документа
+    def _generate_answer(self, query: str, collection_name: str) -> str:
+        query_embedding = None
+        version = self.chroma_service.collection_version(collection_name)
+
+        # Проверка кэша ответов на близкие вопросы
+        if self.answer_cache is not None:
+            with metrics.span("answer_cache"):
+                query_embedding = self.chroma_service.embed_query(query)
+                cached = self.answer_cache.lookup(collection_name, query_embedding, version)
+            if cached is not None:
+                return cached
+
+        start = time.perf_counter()
+
+        # Поиск релевантных документов
+        with metrics.span("retrieval"):
+            context = self._retrieve_context(query, collection_name, query_embedding)
 
         # Генерация ответа
-        answer = self.giga_chat_service.generate_response(query, context)
+        with metrics.span("generation"):
+            answer = self.giga_chat_service.generate_response(
+                query, context.documents, context.metadatas
+            )
+
+        if self.answer_cache is not None:
+            self.answer_cache.store(
+                collection_name,
+                query_embedding,
+                answer,
+                version,
+                latency=time.perf_counter() - start,
+            )
 
         return answer
+
+    def generate_answers(
+        self,
+        queries: List[str],
+        collection_name: str,
+        max_concurrency: int = settings.RAG_BATCH_CONCURRENCY,
+    ) -> List[str]:
+        """
+        Пакетная генерация ответов для оценки и массовой обработки вопросов.
+
+        Эмбеддинги всех вопросов считаются одним батчем, векторный поиск -
+        один multi-query вызов collection.query, а генерации LLM выполняются
+        параллельно, но не более max_concurrency одновременно.
+
+        Args:
+            queries: Вопросы пользователей.
+            collection_name: Название коллекции в ChromaDB.
+            max_concurrency: Максимум одновременных запросов к LLM.
+
+        Returns:
+            List[str]: ответы в порядке вопросов.
+        """
+        if not queries:
+            return []
+
+        version = self.chroma_service.collection_version(collection_name)
+        query_embeddings = [None] * len(queries)
+        if self.retrieval_mode != "lexical" or self.answer_cache is not None:
+            query_embeddings = self.chroma_service.embed_queries(queries)
+
+        answers: List[Optional[str]] = [None] * len(queries)
+        if self.answer_cache is not None:
+            for i, embedding in enumerate(query_embeddings):
+                answers[i] = self.answer_cache.lookup(collection_name, embedding, version)
+
+        pending = [i for i, answer in enumerate(answers) if answer is None]
+        logger.info(
+            f"Пакетная генерация: {len(queries)} вопросов, {len(queries) - len(pending)} из кэша"
+        )
+        if not pending:
+            return answers
+
+        contexts = self._retrieve_contexts(
+            [queries[i] for i in pending],
+            collection_name,
+            [query_embeddings[i] for i in pending],
+        )
+
+        def generate(i: int, context: RetrievalResult) -> str:
+            start = time.perf_counter()
+            answer = self.giga_chat_service.generate_response(
+                queries[i], context.documents, context.metadatas
+            )
+            if self.answer_cache is not None:
+                self.answer_cache.store(
+                    collection_name,
+                    query_embeddings[i],
+                    answer,
+                    version,
+                    latency=time.perf_counter() - start,
+                )
+            return answer
+
+        with ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="rag-batch"
+        ) as executor:
+            for i, answer in zip(pending, executor.map(generate, pending, contexts)):
+                answers[i] = answer
+
+        return answers
+
+    async def agenerate_answer(self, query: str, collection_name: str) -> str:
+        """
+        Асинхронный вариант generate_answer для вызова из хендлеров бота.
+
+        Поиск выполняется в пуле потоков ChromaService, генерация - через
+        async-клиент GigaChat, поэтому один медленный вопрос не блокирует
+        остальные чаты. Одинаковые одновременные вопросы склеиваются, как
+        в generate_answer.
+
+        Args:
+            query: Вопрос пользователя.
+            collection_name: Название коллекции в ChromaDB.
+
+        Returns:
+            str: Сгенерированный ответ.
+        """
+        if not settings.REQUEST_COALESCING_ENABLED:
+            return await self._agenerate_answer(query, collection_name)
+        return await self.ainflight.run(
+            (collection_name, normalize_query(query)),
+            lambda: self._agenerate_answer(query, collection_name),
+        )
+
+    async def _agenerate_answer(self, query: str, collection_name: str) -> str:
+        query_embedding = None
+        version = self.chroma_service.collection_version(collection_name)
+
+        if self.answer_cache is not None:
+            with metrics.span("answer_cache"):
+                query_embedding = await self.chroma_service.aembed_query(query)
+                cached = self.answer_cache.lookup(collection_name, query_embedding, version)
+            if cached is not None:
+                return cached
+
+        start = time.perf_counter()
+
+        with metrics.span("retrieval"):
+            context = await self._aretrieve_context(query, collection_name, query_embedding)
+
+        with metrics.span("generation"):
+            answer = await self.giga_chat_service.agenerate_response(
+                query, context.documents, context.metadatas
+            )
+
+        if self.answer_cache is not None:
+            self.answer_cache.store(
+                collection_name,
+                query_embedding,
+                answer,
+                version,
+                latency=time.perf_counter() - start,
+            )
+
+        return answer
+
+    async def astream_answer(self, query: str, collection_name: str) -> AsyncIterator[str]:
+        """
+        Потоковый вариант agenerate_answer: фрагменты ответа отдаются по мере
+        генерации, поэтому пользователь видит начало ответа сразу.
+
+        Ответ из кэша отдается одним фрагментом; сгенерированный ответ
+        сохраняется в кэш после завершения потока. Одинаковые одновременные
+        вопросы читают один поток генерации.
+
+        Args:
+            query: Вопрос пользователя.
+            collection_name: Название коллекции в ChromaDB.
+
+        Yields:
+            str: Очередной фрагмент ответа.
+        """
+        if not settings.REQUEST_COALESCING_ENABLED:
+            stream = self._astream_answer(query, collection_name)
+        else:
+            stream = self.ainflight.stream(
+                (collection_name, normalize_query(query)),
+                lambda: self._astream_answer(query, collection_name),
+            )
+        async for chunk in stream:
+            yield chunk
+
+    def ajoin_answer(self, query: str, collection_name: str) -> Optional[AsyncIterator[str]]:
+        """
+        Поток ответа на такой же вопрос, который уже генерируется, или None.
+
+        Позволяет присоединиться к генерации, не занимая место в очереди
+        на новый вызов LLM.
+        """
+        if not settings.REQUEST_COALESCING_ENABLED:
+            return None
+        return self.ainflight.join((collection_name, normalize_query(query)))
+
+    async def _astream_answer(self, query: str, collection_name: str) -> AsyncIterator[str]:
+        query_embedding = None
+        version = self.chroma_service.collection_version(collection_name)
+
+        if self.answer_cache is not None:
+            with metrics.span("answer_cache"):
+                query_embedding = await self.chroma_service.aembed_query(query)
+                cached = self.answer_cache.lookup(collection_name, query_embedding, version)
+            if cached is not None:
+                yield cached
+                return
+
+        start = time.perf_counter()
+
+        with metrics.span("retrieval"):
+            context = await self._aretrieve_context(query, collection_name, query_embedding)
+
+        parts = []
+        async for chunk in self.giga_chat_service.astream_response(
+            query, context.documents, context.metadatas
+        ):
+            parts.append(chunk)
+            yield chunk
+
+        if self.answer_cache is not None:
+            self.answer_cache.store(
+                collection_name,
+                query_embedding,
+                "".join(parts),
+                version,
+                latency=time.perf_counter() - start,
+            )
+
+    def retrieve(
+        self, query: str, collection_name: str, n_results: Optional[int] = None
+    ) -> RetrievalResult:
+        """
+        Поиск контекста для вопроса без генерации ответа (для оценки качества поиска).
+
+        Args:
+            query: Вопрос пользователя.
+            collection_name: Название коллекции в ChromaDB.
+            n_results: Сколько документов вернуть, по умолчанию RETRIEVAL_N_RESULTS.
+
+        Returns:
+            RetrievalResult: документы, которые были бы переданы в LLM.
+        """
+        return self._retrieve_context(query, collection_name, n_results=n_results)
+
+    def _retrieve_context(
+        self,
+        query: str,
+        collection_name: str,
+        query_embedding: Optional[List[float]] = None,
+        n_results: Optional[int] = None,
+    ) -> RetrievalResult:
+        """
+        Поиск контекста: кандидаты из _search_candidates, затем реранкинг
+        до n_results (RETRIEVAL_N_RESULTS) документов.
+        """
+        candidates = self._search_candidates(
+            query, collection_name, self._candidates_count(n_results), query_embedding
+        )
+        return self._rerank(query, candidates, n_results)
+
+    def _retrieve_contexts(
+        self,
+        queries: List[str],
+        collection_name: str,
+        query_embeddings: List[Optional[List[float]]],
+    ) -> List[RetrievalResult]:
+        """Пакетный вариант _retrieve_context: векторный поиск одним запросом к ChromaDB"""
+        n_results = self._candidates_count()
+
+        if self.retrieval_mode == "lexical":
+            candidates = [
+                self.chroma_service.lexical_search(collection_name, query, n_results)
+                for query in queries
+            ]
+        else:
+            dense_results = self.chroma_service.search_many(
+                collection_name=collection_name,
+                query_texts=queries,
+                n_results=self._dense_candidates_count(n_results),
+                query_embeddings=query_embeddings,
+                max_distance=settings.RETRIEVAL_MAX_DISTANCE,
+            )
+            candidates = [
+                self._fuse_candidates(query, collection_name, dense, n_results)
+                for query, dense in zip(queries, dense_results)
+            ]
+
+        return [self._rerank(query, result) for query, result in zip(queries, candidates)]
+
+    async def _aretrieve_context(
+        self,
+        query: str,
+        collection_name: str,
+        query_embedding: Optional[List[float]] = None,
+    ) -> RetrievalResult:
+        """Асинхронный вариант _retrieve_context"""
+        candidates = await self._asearch_candidates(
+            query, collection_name, self._candidates_count(), query_embedding
+        )
+        if self.reranker is None:
+            return candidates.top(settings.RETRIEVAL_N_RESULTS)
+        # Реранкер может быть моделью на CPU, не блокируем event loop
+        return await asyncio.to_thread(self._rerank, query, candidates)
+
+    def _candidates_count(self, n_results: Optional[int] = None) -> int:
+        """С реранкером кандидатов берем с запасом"""
+        n_results = n_results or settings.RETRIEVAL_N_RESULTS
+        if self.reranker is None:
+            return n_results
+        return max(settings.RERANK_CANDIDATES, n_results)
+
+    def _rerank(
+        self, query: str, candidates: RetrievalResult, n_results: Optional[int] = None
+    ) -> RetrievalResult:
+        n_results = n_results or settings.RETRIEVAL_N_RESULTS
+        if self.reranker is None:
+            return candidates.top(n_results)
+        with metrics.span("rerank"):
+            order = self.reranker.rerank_indices(query, candidates.documents, top_k=n_results)
+        return candidates.take(order)
+
+    def _search_candidates(
+        self,
+        query: str,
+        collection_name: str,
+        n_results: int,
+        query_embedding: Optional[List[float]] = None,
+    ) -> RetrievalResult:
+        """
+        Поиск кандидатов в режиме retrieval_mode:
+        - dense: векторный поиск в ChromaDB;
+        - lexical: BM25 без эмбеддинга запроса;
+        - hybrid: оба поиска, объединенные reciprocal rank fusion.
+
+        Результаты векторного поиска дальше RETRIEVAL_MAX_DISTANCE отбрасываются.
+        """
+        if self.retrieval_mode == "lexical":
+            return self.chroma_service.lexical_search(collection_name, query, n_results)
+
+        dense = self.chroma_service.search(
+            collection_name=collection_name,
+            query_text=query,
+            n_results=self._dense_candidates_count(n_results),
+            query_embedding=query_embedding,
+            max_distance=settings.RETRIEVAL_MAX_DISTANCE,
+        )
+        return self._fuse_candidates(query, collection_name, dense, n_results)
+
+    async def _asearch_candidates(
+        self,
+        query: str,
+        collection_name: str,
+        n_results: int,
+        query_embedding: Optional[List[float]] = None,
+    ) -> RetrievalResult:
+        """Асинхронный вариант _search_candidates: в гибридном режиме оба поиска идут параллельно"""
+        if self.retrieval_mode == "lexical":
+            return await self.chroma_service.alexical_search(collection_name, query, n_results)
+
+        candidates = self._dense_candidates_count(n_results)
+        searches = [
+            self.chroma_service.asearch(
+                collection_name=collection_name,
+                query_text=query,
+                n_results=candidates,
+                query_embedding=query_embedding,
+                max_distance=settings.RETRIEVAL_MAX_DISTANCE,
+            )
+        ]
+        if self.retrieval_mode == "hybrid":
+            searches.append(self.chroma_service.alexical_search(collection_name, query, candidates))
+        dense, *lexical = await asyncio.gather(*searches)
+        return self._fuse_candidates(query, collection_name, dense, n_results, *lexical)
+
+    def _dense_candidates_count(self, n_results: int) -> int:
+        """В гибридном режиме векторный поиск берет кандидатов с запасом для объединения"""
+        if self.retrieval_mode == "hybrid":
+            return max(settings.RETRIEVAL_CANDIDATES, n_results)
+        return n_results
+
+    def _fuse_candidates(
+        self,
+        query: str,
+        collection_name: str,
+        dense: RetrievalResult,
+        n_results: int,
+        lexical: Optional[RetrievalResult] = None,
+    ) -> RetrievalResult:
+        """
+        Кандидаты по результатам векторного поиска: в режиме dense - они сами,
+        в hybrid - объединение с BM25 через reciprocal rank fusion.
+
+        lexical передается, если лексический поиск уже выполнен параллельно.
+        """
+        if self.retrieval_mode != "hybrid":
+            return dense
+        if lexical is None:
+            lexical = self.chroma_service.lexical_search(
+                collection_name, query, self._dense_candidates_count(n_results)
+            )
+        return RetrievalResult.fuse([dense, lexical]).top(n_results)
@@ -0,0 +1,204 @@
+from abc import ABC, abstractmethod
+from collections import Counter
+from functools import partial
+from typing import Callable, Dict, List, Optional, Type
+import logging
+import math
+import time
+
+from config import settings
+from .bm25_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Реестр реранкеров: имя из Settings.RERANKER -> класс
+RERANKERS: Dict[str, Type["BaseReranker"]] = {}
+
+
+def register_reranker(name: str) -> Callable:
+    """Декоратор регистрации реранкера"""
+
+    def decorator(cls):
+        RERANKERS[name] = cls
+        return cls
+
+    return decorator
+
+
+class BaseReranker(ABC):
+    """
+    Базовый реранкер: оценивает кандидатов срезами и оставляет top_k лучших.
+
+    Срок проверяется после каждого среза из batch_size кандидатов. Срез,
+    закончившийся после срока, отбрасывается, и оценка прекращается: уже
+    оцененные кандидаты упорядочиваются по оценкам, остальные идут за ними
+    в исходном порядке. Если не уложился даже первый срез, остается порядок поиска.
+    """
+
+    batch_size: int = 16
+
+    def __init__(self, budget_ms: float = settings.RERANK_BUDGET_MS):
+        self.budget_ms = budget_ms
+        self.fallbacks = 0
+
+    @abstractmethod
+    def score_batch(self, query: str, documents: List[str]) -> List[float]:
+        """Оценки релевантности документов запросу"""
+
+    def map_within_budget(
+        self, items: List, deadline: float, func: Callable[[List], List]
+    ) -> List:
+        """Применяет func к срезам items, пока срезы укладываются в срок"""
+        results = []
+        for offset in range(0, len(items), self.batch_size):
+            batch_results = func(items[offset : offset + self.batch_size])
+            if time.perf_counter() > deadline:
+                break
+            results.extend(batch_results)
+        return results
+
+    def score_within_budget(
+        self, query: str, documents: List[str], deadline: float
+    ) -> List[float]:
+        """Оценки начала списка кандидатов, полученные до deadline (time.perf_counter)"""
+        return self.map_within_budget(documents, deadline, partial(self.score_batch, query))
+
+    def rerank(
+        self,
+        query: str,
+        documents: List[str],
+        top_k: int = settings.RETRIEVAL_N_RESULTS,
+        budget_ms: Optional[float] = None,
+    ) -> List[str]:
+        """
+        Переупорядочивает документы по релевантности.
+
+        Args:
+            query: Вопрос пользователя.
+            documents: Кандидаты в порядке исходного поиска.
+            top_k: Сколько документов оставить.
+            budget_ms: Бюджет времени, по умолчанию из настроек.
+
+        Returns:
+            List[str]: top_k документов после реранкинга; кандидаты, до которых
+            не дошла очередь в рамках бюджета, сохраняют исходный порядок.
+        """
+        return [documents[i] for i in self.rerank_indices(query, documents, top_k, budget_ms)]
+
+    def rerank_indices(
+        self,
+        query: str,
+        documents: List[str],
+        top_k: int = settings.RETRIEVAL_N_RESULTS,
+        budget_ms: Optional[float] = None,
+    ) -> List[int]:
+        """Как rerank, но возвращает позиции выбранных документов среди кандидатов"""
+        budget_ms = self.budget_ms if budget_ms is None else budget_ms
+        start = time.perf_counter()
+
+        scores = self.score_within_budget(query, documents, start + budget_ms / 1000)
+        if len(scores) < len(documents):
+            self.fallbacks += 1
+            logger.warning(
+                f"Реранкинг превысил бюджет {budget_ms} мс: оценено {len(scores)} "
+                f"из {len(documents)} кандидатов, остальные в исходном порядке"
+            )
+
+        # При равных оценках сохраняем порядок исходного поиска
+        scored = sorted(range(len(scores)), key=lambda i: (-scores[i], i))
+        order = (scored + list(range(len(scores), len(documents))))[:top_k]
+        logger.debug(
+            f"Реранкинг {len(documents)} кандидатов за "
+            f"{(time.perf_counter() - start) * 1000:.1f} мс: {order}"
+        )
+        return order
+
+
+@register_reranker("lexical")
+class LexicalOverlapReranker(BaseReranker):
+    """
+    Дешевый реранкер по пересечению термов запроса и документа.
+
+    Вес терма - idf внутри набора кандидатов, поэтому слова, которые есть
+    во всех кандидатах, почти не влияют на порядок. Совпавшие биграммы
+    запроса дают бонус за близость слов.
+    """
+
+    batch_size = 16
+    bigram_weight = 0.3
+
+    def score_batch(self, query: str, documents: List[str]) -> List[float]:
+        return self.score_terms(query, [tokenize(document) for document in documents])
+
+    def score_within_budget(
+        self, query: str, documents: List[str], deadline: float
+    ) -> List[float]:
+        """
+        Срезами с проверкой срока идет только токенизация. Веса термов считаются
+        уже по всем токенизированным кандидатам, чтобы оценки срезов были сравнимы.
+        """
+        doc_terms = self.map_within_budget(
+            documents, deadline, lambda batch: [tokenize(document) for document in batch]
+        )
+        return self.score_terms(query, doc_terms)
+
+    def score_terms(self, query: str, doc_terms: List[List[str]]) -> List[float]:
+        """Оценки документов по их токенам"""
+        query_terms = list(dict.fromkeys(tokenize(query)))
+        if not query_terms:
+            return [0.0] * len(doc_terms)
+        query_bigrams = set(zip(query_terms, query_terms[1:]))
+
+        doc_sets = [set(terms) for terms in doc_terms]
+        df = Counter(term for terms in doc_sets for term in terms if term in query_terms)
+        weights = {
+            term: math.log(1 + len(doc_terms) / (1 + df[term])) for term in query_terms
+        }
+        total = sum(weights.values())
+
+        scores = []
+        for terms, term_set in zip(doc_terms, doc_sets):
+            coverage = sum(weights[term] for term in query_terms if term in term_set) / total
+            bigrams = query_bigrams & set(zip(terms, terms[1:])) if query_bigrams else set()
+            proximity = len(bigrams) / len(query_bigrams) if query_bigrams else 0.0
+            scores.append(coverage + self.bigram_weight * proximity)
+        return scores
+
+
+@register_reranker("cross-encoder")
+class CrossEncoderReranker(BaseReranker):
+    """
+    Локальная модель cross-encoder на CPU.
+    Требует пакет sentence-transformers, который не входит в requirements.txt.
+    """
+
+    batch_size = 8
+
+    def __init__(self, model_name: str = settings.RERANK_MODEL, **kwargs):
+        super().__init__(**kwargs)
+        try:
+            import torch
+            from sentence_transformers import CrossEncoder
+        except ImportError:
+            raise ImportError(
+                "Could not import sentence_transformers python package. "
+                "Please install it with `pip install sentence-transformers`."
+            )
+
+        torch.set_num_threads(settings.EMBEDDING_THREADS)
+        self.model = CrossEncoder(model_name, device="cpu")
+
+    def score_batch(self, query: str, documents: List[str]) -> List[float]:
+        scores = self.model.predict(
+            [(query, document) for document in documents], batch_size=self.batch_size
+        )
+        return [float(score) for score in scores]
+
+
+def get_reranker(name: str = settings.RERANKER) -> Optional[BaseReranker]:
+    """Фабричный метод для получения реранкера; "none" отключает реранкинг"""
+    if name == "none":
+        return None
+    if name not in RERANKERS:
+        raise ValueError(f"Unknown reranker: {name}")
+    return RERANKERS[name]()
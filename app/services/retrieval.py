@@ -0,0 +1,118 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from config import settings
+from .bm25_index import reciprocal_rank_fusion
+
+
+def _float_array(values: Optional[Sequence[float]], size: int) -> np.ndarray:
+    if values is None:
+        return np.full(size, np.nan, dtype=np.float32)
+    return np.asarray(values, dtype=np.float32)
+
+
+@dataclass
+class RetrievalResult:
+    """
+    Результат поиска по одному запросу в колоночном виде.
+
+    Колонки выровнены по позиции и упорядочены по убыванию релевантности.
+    distances - косинусное расстояние векторного поиска (NaN, если документ
+    найден не векторным поиском), scores - релевантность, чем больше, тем лучше.
+    """
+
+    ids: List[str] = field(default_factory=list)
+    documents: List[str] = field(default_factory=list)
+    metadatas: List[Dict] = field(default_factory=list)
+    distances: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.float32))
+    scores: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.float32))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_chroma(cls, results: Dict, index: int = 0) -> "RetrievalResult":
+        """Результат index-го запроса из ответа collection.query"""
+        ids = list(results["ids"][index])
+        distances = _float_array(
+            results["distances"][index] if results.get("distances") else None, len(ids)
+        )
+        metadatas = results.get("metadatas")
+        return cls(
+            ids=ids,
+            documents=list(results["documents"][index]),
+            metadatas=[m or {} for m in metadatas[index]] if metadatas else [{} for _ in ids],
+            distances=distances,
+            scores=1.0 - distances,
+        )
+
+    @classmethod
+    def from_scores(
+        cls,
+        ids: List[str],
+        documents: List[str],
+        metadatas: List[Dict],
+        scores: Sequence[float],
+    ) -> "RetrievalResult":
+        """Результат поиска без расстояний, например лексического"""
+        return cls(
+            ids=list(ids),
+            documents=list(documents),
+            metadatas=list(metadatas),
+            distances=_float_array(None, len(ids)),
+            scores=_float_array(scores, len(ids)),
+        )
+
+    def take(self, indices: Sequence[int]) -> "RetrievalResult":
+        """Подмножество результатов в заданном порядке"""
+        indices = np.asarray(indices, dtype=np.intp)
+        return RetrievalResult(
+            ids=[self.ids[i] for i in indices],
+            documents=[self.documents[i] for i in indices],
+            metadatas=[self.metadatas[i] for i in indices],
+            distances=self.distances[indices],
+            scores=self.scores[indices],
+        )
+
+    def top(self, k: int) -> "RetrievalResult":
+        return self.take(range(min(k, len(self))))
+
+    def filter_by_distance(
+        self, max_distance: Optional[float] = settings.RETRIEVAL_MAX_DISTANCE
+    ) -> "RetrievalResult":
+        """
+        Отбрасывает документы дальше max_distance.
+        Документы без расстояния (NaN) сохраняются.
+        """
+        if max_distance is None:
+            return self
+        keep = np.flatnonzero(~(self.distances > max_distance))
+        if len(keep) == len(self):
+            return self
+        return self.take(keep)
+
+    @classmethod
+    def fuse(
+        cls, results: Sequence["RetrievalResult"], k: int = settings.RRF_K
+    ) -> "RetrievalResult":
+        """
+        Объединяет результаты нескольких поисков через reciprocal rank fusion.
+        scores - итоговый RRF score, distances - из векторного поиска, если есть.
+        """
+        rows = {}
+        for result in results:
+            for i, doc_id in enumerate(result.ids):
+                distance = result.distances[i]
+                if doc_id not in rows or np.isnan(rows[doc_id][2]):
+                    rows[doc_id] = (result.documents[i], result.metadatas[i], distance)
+
+        fused = reciprocal_rank_fusion([result.ids for result in results], k=k)
+        return cls(
+            ids=[doc_id for doc_id, _ in fused],
+            documents=[rows[doc_id][0] for doc_id, _ in fused],
+            metadatas=[rows[doc_id][1] for doc_id, _ in fused],
+            distances=_float_array([rows[doc_id][2] for doc_id, _ in fused], len(fused)),
+            scores=_float_array([score for _, score in fused], len(fused)),
+        )
@@ -0,0 +1,269 @@
+from collections import deque
+from typing import Callable, Deque, Dict, Hashable, Optional
+import asyncio
+import logging
+import time
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class RequestSuperseded(Exception):
+    """Запрос из очереди заменен более новым вопросом того же пользователя"""
+
+
+class SchedulerFull(Exception):
+    """Очередь запросов переполнена"""
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity"""
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self, now: float) -> bool:
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self, now: float) -> float:
+        """Через сколько секунд появится целый токен"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class Ticket:
+    """
+    Место запроса в очереди планировщика.
+
+    async with ticket ждет, пока планировщик выдаст слот, и освобождает его
+    на выходе. Если пользователь успел задать новый вопрос, вход в контекст
+    выбрасывает RequestSuperseded.
+    """
+
+    def __init__(self, scheduler: "FairScheduler", user_id: Hashable):
+        self.scheduler = scheduler
+        self.user_id = user_id
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._released = False
+
+    @property
+    def granted(self) -> bool:
+        future = self.future
+        return future.done() and not future.cancelled() and future.exception() is None
+
+    @property
+    def position(self) -> int:
+        """Место в очереди, начиная с 1; 0 - слот уже выдан"""
+        return self.scheduler.position(self)
+
+    async def __aenter__(self) -> "Ticket":
+        try:
+            await self.future
+        except asyncio.CancelledError:
+            self.cancel()
+            raise
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.cancel()
+
+    def cancel(self):
+        """Убирает запрос из очереди или освобождает выданный слот; повторный вызов безопасен"""
+        if not self.future.done() or self.future.cancelled():
+            # Отмена задачи, ждущей слот, отменяет и future
+            self.scheduler._remove(self)
+            self.future.cancel()
+        elif self.granted and not self._released:
+            self._released = True
+            self.scheduler._release()
+
+
+class FairScheduler:
+    """
+    Планировщик запросов к LLM для хендлеров бота.
+
+    - не больше max_concurrency запросов выполняются одновременно;
+    - у каждого пользователя свое ведро токенов: rate запросов в секунду
+      с запасом burst, лишние вопросы ждут пополнения ведра;
+    - слоты раздаются по кругу между пользователями с ожидающими запросами,
+      поэтому один активный пользователь не занимает всю очередь;
+    - с drop_stale новый вопрос пользователя вытесняет его еще не начатые.
+
+    Все методы вызываются из одного event loop.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = settings.LLM_MAX_CONCURRENCY,
+        rate: float = settings.USER_REQUESTS_PER_MINUTE / 60,
+        burst: float = settings.USER_REQUEST_BURST,
+        max_queued: int = settings.SCHEDULER_MAX_QUEUED,
+        drop_stale: bool = True,
+        time_func: Callable[[], float] = time.monotonic,
+    ):
+        if max_concurrency <= 0:
+            raise ValueError("Параллелизм должен быть положительным")
+        if rate <= 0 or burst < 1:
+            raise ValueError("Лимит запросов пользователя должен быть положительным")
+
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self.burst = burst
+        self.max_queued = max_queued
+        self.drop_stale = drop_stale
+        self.time_func = time_func
+
+        self.running = 0
+        self.queued = 0
+        self.dropped = 0
+        self._queues: Dict[Hashable, Deque[Ticket]] = {}
+        # Круговой порядок пользователей с ожидающими запросами
+        self._order: Deque[Hashable] = deque()
+        self._buckets: Dict[Hashable, TokenBucket] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def submit(self, user_id: Hashable) -> Ticket:
+        """
+        Ставит запрос пользователя в очередь.
+
+        Returns:
+            Ticket: слот запроса; ticket.position - место в очереди.
+
+        Raises:
+            SchedulerFull: в очереди уже max_queued запросов.
+        """
+        queue = self._queues.get(user_id)
+        if queue and self.drop_stale:
+            while queue:
+                stale = queue.popleft()
+                self.queued -= 1
+                self.dropped += 1
+                stale.future.set_exception(RequestSuperseded())
+            del self._queues[user_id]
+            self._order.remove(user_id)
+            queue = None
+            logger.info(f"Устаревшие вопросы пользователя {user_id} убраны из очереди")
+
+        if self.queued >= self.max_queued:
+            raise SchedulerFull()
+
+        ticket = Ticket(self, user_id)
+        if not queue:
+            queue = self._queues[user_id] = deque()
+            self._order.append(user_id)
+        queue.append(ticket)
+        self.queued += 1
+
+        self._dispatch()
+        return ticket
+
+    def position(self, ticket: Ticket) -> int:
+        """Сколько запросов получат слот раньше ticket, включая его самого"""
+        queue = self._queues.get(ticket.user_id)
+        if ticket.future.done() or not queue or ticket not in queue:
+            return 0
+        depth = queue.index(ticket)
+
+        position = depth + 1
+        before = True
+        for user_id in self._order:
+            if user_id == ticket.user_id:
+                before = False
+                continue
+            position += min(len(self._queues[user_id]), depth + 1 if before else depth)
+        return position
+
+    def stats(self) -> Dict:
+        return {
+            "running": self.running,
+            "queued": self.queued,
+            "dropped": self.dropped,
+            "users": len(self._order),
+        }
+
+    def _bucket(self, user_id: Hashable, now: float) -> TokenBucket:
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            # Полные ведра неактивных пользователей ничего не ограничивают
+            if len(self._buckets) >= settings.SCHEDULER_MAX_BUCKETS:
+                self._buckets = {
+                    key: value
+                    for key, value in self._buckets.items()
+                    if key in self._queues or not value.is_full(now)
+                }
+            bucket = self._buckets[user_id] = TokenBucket(self.rate, self.burst, now)
+        return bucket
+
+    def _next_ticket(self, now: float) -> Optional[Ticket]:
+        for _ in range(len(self._order)):
+            user_id = self._order.popleft()
+            queue = self._queues[user_id]
+            if self._bucket(user_id, now).try_take(now):
+                ticket = queue.popleft()
+                if queue:
+                    self._order.append(user_id)
+                else:
+                    del self._queues[user_id]
+                return ticket
+            self._order.append(user_id)
+        return None
+
+    def _dispatch(self):
+        now = self.time_func()
+        while self.running < self.max_concurrency and self._order:
+            ticket = self._next_ticket(now)
+            if ticket is None:
+                self._schedule_wakeup(now)
+                return
+            self.queued -= 1
+            if ticket.future.done():
+                # Ожидание уже отменено, слот не нужен
+                continue
+            self.running += 1
+            ticket.future.set_result(None)
+
+    def _schedule_wakeup(self, now: float):
+        """Все пользователи в очереди уперлись в лимит: ждем пополнения ближайшего ведра"""
+        delay = min(self._bucket(user_id, now).wait_time(now) for user_id in self._order)
+        loop = asyncio.get_running_loop()
+        if self._timer is not None:
+            if self._timer.when() <= loop.time() + delay:
+                return
+            self._timer.cancel()
+        self._timer = loop.call_later(delay, self._wakeup)
+
+    def _wakeup(self):
+        self._timer = None
+        self._dispatch()
+
+    def _remove(self, ticket: Ticket):
+        queue = self._queues.get(ticket.user_id)
+        if not queue or ticket not in queue:
+            return
+        queue.remove(ticket)
+        self.queued -= 1
+        if not queue:
+            del self._queues[ticket.user_id]
+            self._order.remove(ticket.user_id)
+
+    def _release(self):
+        self.running -= 1
+        self._dispatch()
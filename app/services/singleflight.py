@@ -0,0 +1,185 @@
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    TypeVar,
+)
+import asyncio
+import logging
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_SPACES_RE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Ключ для склейки одинаковых вопросов: регистр, пробелы и финальная пунктуация не важны"""
+    return _SPACES_RE.sub(" ", query).strip(" ?!.").casefold()
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Склейка одновременных одинаковых вызовов из разных потоков:
+    пока вызов с ключом key выполняется, остальные вызовы с тем же ключом
+    ждут его и получают тот же результат или ту же ошибку.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def stats(self) -> Dict:
+        return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._calls)}
+
+
+class _Flight:
+    """Общий поток фрагментов ответа, который читают все подписчики"""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def pump(self, source: AsyncIterator[str]):
+        try:
+            async for chunk in source:
+                self.chunks.append(chunk)
+                self._notify()
+        except BaseException as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        position = 0
+        while True:
+            if position < len(self.chunks):
+                position += 1
+                yield self.chunks[position - 1]
+            elif self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            else:
+                await self._changed.wait()
+
+
+class AsyncSingleFlight:
+    """
+    Асинхронная склейка одновременных одинаковых запросов.
+
+    run - для корутин: все ждут одну задачу. stream - для потоковых ответов:
+    источник читается одной фоновой задачей, каждый подписчик получает все
+    фрагменты с начала, даже если подключился посередине генерации.
+    Отмена одного из ожидающих не прерывает общую задачу.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+        self._flights: Dict[Hashable, _Flight] = {}
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[T]]) -> T:
+        task = self._tasks.get(key)
+        # Завершенная задача еще может быть в словаре до вызова done-callback
+        if task is None or task.done():
+            self.calls += 1
+            task = self._tasks[key] = asyncio.ensure_future(factory())
+            task.add_done_callback(lambda done: self._release_task(key, done))
+        else:
+            self.coalesced += 1
+            logger.debug(f"Запрос {key} присоединен к выполняющемуся")
+        return await asyncio.shield(task)
+
+    async def stream(
+        self, key: Hashable, factory: Callable[[], AsyncIterator[str]]
+    ) -> AsyncIterator[str]:
+        flight = self._flights.get(key)
+        if flight is None or flight.done:
+            self.calls += 1
+            flight = self._flights[key] = _Flight()
+            # Ссылка на задачу хранится в flight, иначе ее может собрать GC
+            flight.task = asyncio.ensure_future(flight.pump(factory()))
+            flight.task.add_done_callback(lambda _: self._release_flight(key, flight))
+        else:
+            self.coalesced += 1
+            logger.debug(f"Потоковый запрос {key} присоединен к выполняющемуся")
+
+        async for chunk in flight.subscribe():
+            yield chunk
+
+    def join(self, key: Hashable) -> Optional[AsyncIterator[str]]:
+        """Подписка на выполняющийся поток с ключом key или None, если такого нет"""
+        flight = self._flights.get(key)
+        if flight is None or flight.done:
+            return None
+        self.coalesced += 1
+        logger.debug(f"Потоковый запрос {key} присоединен к выполняющемуся")
+        return flight.subscribe()
+
+    def _release_task(self, key: Hashable, task: asyncio.Task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+
+    def _release_flight(self, key: Hashable, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def stats(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._tasks) + len(self._flights),
+        }
@@ -1,18 +1,177 @@
-from typing import List, Dict, Optional, Tuple
+from collections import deque
+from dataclasses import dataclass
+from functools import partial
+from bisect import bisect_right
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Tuple
 from pathlib import Path
+import codecs
+import json
 import re
 import logging
 from config import settings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 logger = logging.getLogger(__name__)
 
+ENCODINGS = ["utf-8", "windows-1251", "cp1251", "latin1"]
+# Файл читается и очищается блоками, без копий всего текста до и после очистки
+READ_BLOCK_SIZE = 64 * 1024
+# Кодировка определяется по началу файла, а не перебором полных прочтений
+ENCODING_SAMPLE_SIZE = 4096
+
+CHUNK_STRATEGIES = ("characters", "sentences")
+SENTENCE_ENDINGS = (".", "!", "?")
+# Сегменты Whisper с таймкодами лежат рядом с расшифровкой: lecture.txt -> lecture.segments.json
+SEGMENTS_SUFFIX = ".segments.json"
+
+# Символы, которые очистка удаляет; серии удаляются за одно совпадение
+_SPECIAL_RE = re.compile(r"[^\w\s.,!?;:()-]+")
+
+
+def collapse_spaces(text: str) -> str:
+    """re.sub(r"\\s+", " ", text) через str.split: тот же результат, но в разы быстрее"""
+    body = " ".join(text.split())
+    if not body:
+        return " " if text else ""
+    head = " " if text[0].isspace() else ""
+    tail = " " if text[-1].isspace() else ""
+    return f"{head}{body}{tail}"
+
+
+def normalize_text(text: str) -> str:
+    """
+    Схлопывает пробельные символы и удаляет спецсимволы, оставляя пунктуацию.
+
+    Оба прохода выполняются в C (str.split и предкомпилированная регулярка по
+    сериям символов), без вызова Python-функции на каждое совпадение.
+    """
+    return _SPECIAL_RE.sub("", " ".join(text.split())).strip()
+
+
+def segments_path(file_path: Path) -> Path:
+    return file_path.with_name(file_path.stem + SEGMENTS_SUFFIX)
+
+
+def load_segments(file_path: Path) -> Optional[List[Dict]]:
+    """Сегменты Whisper (start, end, text) для расшифровки file_path, если они сохранены"""
+    path = segments_path(file_path)
+    if not path.is_file():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@dataclass(frozen=True)
+class TextChunk:
+    """Чанк и его смещение в очищенном тексте"""
+
+    text: str
+    start: int
+
+    @property
+    def end(self) -> int:
+        return self.start + len(self.text)
+
+
+class ChunkStats:
+    """Статистика разбиения, считается по мере появления чанков"""
+
+    def __init__(self):
+        self.total_length = 0
+        self.chunks_count = 0
+        self.chunks_length = 0
+        self.min_chunk_size = 0
+        self.max_chunk_size = 0
+
+    def add(self, chunk: str):
+        size = len(chunk)
+        self.min_chunk_size = min(self.min_chunk_size, size) if self.chunks_count else size
+        self.max_chunk_size = max(self.max_chunk_size, size)
+        self.chunks_count += 1
+        self.chunks_length += size
+
+    def as_dict(self) -> Dict:
+        return {
+            "total_length": self.total_length,
+            "chunks_count": self.chunks_count,
+            "avg_chunk_size": self.chunks_length / self.chunks_count
+            if self.chunks_count
+            else 0,
+            "min_chunk_size": self.min_chunk_size,
+            "max_chunk_size": self.max_chunk_size,
+        }
+
+
+class _ChunkMerger:
+    """
+    Жадная склейка кусков текста в чанки с перекрытием.
+
+    Повторяет RecursiveCharacterTextSplitter._merge_splits для пустого
+    разделителя, но получает куски по одному и хранит только текущий чанк.
+    """
+
+    def __init__(self, chunk_size: int, chunk_overlap: int):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.pieces: Deque[Tuple[str, int]] = deque()
+        self.total = 0
+
+    def add(self, piece: str, start: int) -> Optional[TextChunk]:
+        chunk = None
+        size = len(piece)
+        if self.pieces and self.total + size > self.chunk_size:
+            chunk = self._join()
+            while self.total > self.chunk_overlap or (
+                self.total + size > self.chunk_size and self.total > 0
+            ):
+                self.total -= len(self.pieces.popleft()[0])
+        self.pieces.append((piece, start))
+        self.total += size
+        return chunk
+
+    def flush(self) -> Optional[TextChunk]:
+        chunk = self._join()
+        self.pieces.clear()
+        self.total = 0
+        return chunk
+
+    def _join(self) -> Optional[TextChunk]:
+        if not self.pieces:
+            return None
+        text = "".join(piece for piece, _ in self.pieces)
+        stripped = text.lstrip()
+        if not stripped.strip():
+            return None
+        return TextChunk(stripped.rstrip(), self.pieces[0][1] + len(text) - len(stripped))
+
+
+class _WordChunker:
+    """Склейка слов в чанки; слово не короче чанка режется по символам"""
+
+    def __init__(self, chunk_size: int, chunk_overlap: int):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.merger = _ChunkMerger(chunk_size, chunk_overlap)
+
+    def add(self, word: str, start: int) -> List[Optional[TextChunk]]:
+        if len(word) < self.chunk_size:
+            return [self.merger.add(word, start)]
+        # Длинное слово: накопленное отдается отдельно, слово - по символам
+        chunks = [self.merger.flush()]
+        chars = _ChunkMerger(self.chunk_size, self.chunk_overlap)
+        chunks.extend(chars.add(char, start + i) for i, char in enumerate(word))
+        chunks.append(chars.flush())
+        return chunks
+
+    def flush(self) -> List[Optional[TextChunk]]:
+        return [self.merger.flush()]
+
 
 class TextProcessor:
     def __init__(
         self,
         chunk_size: int = settings.CHUNK_SIZE,
         chunk_overlap: int = settings.CHUNK_OVERLAP,
+        chunk_strategy: str = settings.CHUNK_STRATEGY,
     ):
         """
         Инициализация процессора текстов
@@ -20,10 +179,16 @@ class TextProcessor:
         Args:
             chunk_size: Размер чанка текста (в символах)
             chunk_overlap: Размер пересечения между чанками
+            chunk_strategy: characters - по словам, sentences - по границам предложений
         """
         self.validate_chunk_params(chunk_size, chunk_overlap)
+        if chunk_strategy not in CHUNK_STRATEGIES:
+            raise ValueError(
+                f"Неизвестная стратегия разбиения: {chunk_strategy}. Доступны: {CHUNK_STRATEGIES}"
+            )
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.chunk_strategy = chunk_strategy
 
     @staticmethod
     def validate_chunk_params(chunk_size: int, chunk_overlap: int):
@@ -37,49 +202,102 @@ class TextProcessor:
 
     def get_text_stats(self, text: str) -> Dict:
         """Получение статистики по тексту"""
-        chunks = self.split_into_chunks(text)
-        return {
-            "total_length": len(text),
-            "chunks_count": len(chunks),
-            "avg_chunk_size": sum(len(chunk) for chunk in chunks) / len(chunks)
-            if chunks
-            else 0,
-            "min_chunk_size": min(len(chunk) for chunk in chunks) if chunks else 0,
-            "max_chunk_size": max(len(chunk) for chunk in chunks) if chunks else 0,
-        }
+        stats = ChunkStats()
+        stats.total_length = len(text)
+        for chunk in self.split_into_chunks(text):
+            stats.add(chunk)
+        return stats.as_dict()
 
     def read_file(self, file_path: Path) -> str:
         """Чтение файла с определением кодировки"""
-        encodings = ["utf-8", "windows-1251", "cp1251", "latin1"]
+        for encoding in self.candidate_encodings(file_path):
+            try:
+                with open(file_path, "r", encoding=encoding) as file:
+                    return file.read()
+            except UnicodeDecodeError:
+                logger.warning(f"Файл {file_path} не читается в {encoding}")
 
+        raise ValueError(f"Не удалось прочитать файл {file_path}")
+
+    def detect_encoding(self, file_path: Path) -> str:
+        """Первая кодировка из ENCODINGS, которой декодируется начало файла"""
         if not file_path.is_file():
             logger.error(f"Файл не найден: {file_path}")
             raise FileNotFoundError(f"File not found: {file_path}")
 
-        for encoding in encodings:
+        with open(file_path, "rb") as file:
+            sample = file.read(ENCODING_SAMPLE_SIZE)
+
+        for encoding in ENCODINGS:
             try:
-                with open(file_path, "r", encoding=encoding) as file:
-                    content = file.read()
-                    return content
+                # final=False: многобайтовый символ может быть обрезан концом выборки
+                codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+                return encoding
             except UnicodeDecodeError:
                 continue
-            except Exception as e:
-                logger.error(f"Ошибка при чтении файла {file_path}: {str(e)}")
-                continue
 
         raise ValueError(f"Не удалось прочитать файл {file_path}")
 
+    def candidate_encodings(self, file_path: Path) -> List[str]:
+        """
+        Кодировки для чтения по порядку: определенная по выборке и следующие
+        за ней. Следующие нужны, только если байты после выборки не декодируются.
+        """
+        detected = self.detect_encoding(file_path)
+        return ENCODINGS[ENCODINGS.index(detected):]
+
+    def iter_file_blocks(self, file_path: Path, encoding: Optional[str] = None) -> Iterator[str]:
+        """
+        Текст файла блоками по READ_BLOCK_SIZE символов, декодируется по ходу чтения.
+
+        Байты, некорректные для encoding, дают UnicodeDecodeError; тогда файл
+        читается заново в следующей из candidate_encodings.
+        """
+        encoding = encoding or self.detect_encoding(file_path)
+        with open(file_path, "r", encoding=encoding) as file:
+            yield from iter(partial(file.read, READ_BLOCK_SIZE), "")
+
     def clean_text(self, text: str) -> str:
         """
         Очистка текста от лишних символов и форматирования
         """
-        # Удаление множественных пробелов и переносов строк
-        text = re.sub(r"\s+", " ", text)
-        # Удаление специальных символов, оставляя пунктуацию
-        text = re.sub(r"[^\w\s\.,!?;:()-]", "", text)
-        return text.strip()
+        return normalize_text(text)
+
+    def iter_clean_text(self, blocks: Iterable[str]) -> Iterator[str]:
+        """
+        clean_text для текста, поступающего блоками.
+
+        Склейка результата совпадает с clean_text от всего текста: пробелы
+        на стыке блоков схлопываются, а хвостовые придерживаются до
+        следующего непустого блока.
+        """
+        in_spaces = False
+        started = False
+        pending = 0
+        for block in blocks:
+            if in_spaces:
+                block = block.lstrip()
+            if not block:
+                continue
+            in_spaces = block[-1].isspace()
+
+            cleaned = _SPECIAL_RE.sub("", collapse_spaces(block))
+            if not started:
+                cleaned = cleaned.lstrip(" ")
+                if not cleaned:
+                    continue
+                started = True
+
+            body = cleaned.rstrip(" ")
+            if body:
+                yield " " * pending + body if pending else body
+                pending = len(cleaned) - len(body)
+            else:
+                pending += len(cleaned)
 
     def split_into_chunks(self, text: str) -> List[str]:
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
         text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=self.chunk_size,
             chunk_overlap=self.chunk_overlap,
@@ -88,6 +306,176 @@ class TextProcessor:
         chunks = text_splitter.split_text(text)
         return chunks
 
+    def iter_text_chunks(
+        self, blocks: Iterable[str], stats: Optional[ChunkStats] = None
+    ) -> Iterator[TextChunk]:
+        """
+        Очистка и разбиение текста, поступающего блоками, за один проход.
+
+        Стратегия characters совпадает с split_into_chunks(clean_text(text)):
+        текст режется по пробелам (пробел остается в начале слова), слова
+        склеиваются в чанки с перекрытием, а слово не короче чанка режется по
+        символам. Стратегия sentences склеивает в чанки целые предложения, а
+        перекрытие - последние предложения предыдущего чанка, если они
+        короче chunk_overlap; предложение не короче чанка режется по словам.
+
+        Args:
+            blocks: Части исходного текста в порядке следования.
+            stats: Если передан, заполняется статистикой по ходу разбиения.
+        """
+        words = self._iter_words(blocks, stats)
+        if self.chunk_strategy == "sentences":
+            chunks = self._merge_sentences(words)
+        else:
+            chunks = self._merge_words(words)
+
+        for chunk in chunks:
+            if chunk is not None:
+                if stats is not None:
+                    stats.add(chunk.text)
+                yield chunk
+
+    def _iter_words(
+        self, blocks: Iterable[str], stats: Optional[ChunkStats]
+    ) -> Iterator[Tuple[str, int]]:
+        """Слова очищенного текста с пробелом в начале и их смещения"""
+        piece: List[str] = []
+        piece_start = 0
+        offset = 0
+        for block in self.iter_clean_text(blocks):
+            parts = block.split(" ")
+            piece.append(parts[0])
+            for part in parts[1:]:
+                word = "".join(piece)
+                yield word, piece_start
+                piece_start += len(word)
+                piece = [" ", part]
+            offset += len(block)
+
+        if piece:
+            yield "".join(piece), piece_start
+        if stats is not None:
+            stats.total_length = offset
+
+    def _merge_words(self, words: Iterable[Tuple[str, int]]) -> Iterator[Optional[TextChunk]]:
+        chunker = _WordChunker(self.chunk_size, self.chunk_overlap)
+        for word, start in words:
+            yield from chunker.add(word, start)
+        yield from chunker.flush()
+
+    def _merge_sentences(
+        self, words: Iterable[Tuple[str, int]]
+    ) -> Iterator[Optional[TextChunk]]:
+        sentences = _ChunkMerger(self.chunk_size, self.chunk_overlap)
+        # Слова текущего предложения; в памяти не больше чанка
+        sentence: List[Tuple[str, int]] = []
+        size = 0
+        long_sentence: Optional[_WordChunker] = None
+
+        for word, start in words:
+            if long_sentence is not None:
+                yield from long_sentence.add(word, start)
+            else:
+                sentence.append((word, start))
+                size += len(word)
+                if size >= self.chunk_size:
+                    # Предложение не влезает в чанк: накопленное отдается, оно режется по словам
+                    yield sentences.flush()
+                    long_sentence = _WordChunker(self.chunk_size, self.chunk_overlap)
+                    for sentence_word, sentence_start in sentence:
+                        yield from long_sentence.add(sentence_word, sentence_start)
+                    sentence, size = [], 0
+
+            if word.endswith(SENTENCE_ENDINGS):
+                if long_sentence is not None:
+                    yield from long_sentence.flush()
+                    long_sentence = None
+                elif sentence:
+                    yield sentences.add("".join(w for w, _ in sentence), sentence[0][1])
+                    sentence, size = [], 0
+
+        if long_sentence is not None:
+            yield from long_sentence.flush()
+        elif sentence:
+            yield sentences.add("".join(w for w, _ in sentence), sentence[0][1])
+        yield sentences.flush()
+
+    def iter_chunks(
+        self,
+        file_path: Path,
+        stats: Optional[ChunkStats] = None,
+        encoding: Optional[str] = None,
+    ) -> Iterator[TextChunk]:
+        """
+        Потоковое чтение, очистка и разбиение файла.
+
+        Сам генератор держит в памяти блок файла и несколько чанков; потребитель,
+        собирающий все чанки (как process_file), держит O(размер файла).
+        """
+        yield from self.iter_text_chunks(self.iter_file_blocks(file_path, encoding), stats)
+
+    def segment_offsets(self, segments: List[Dict]) -> Tuple[List[int], int]:
+        """
+        Смещения начала сегментов в очищенном тексте расшифровки.
+
+        Returns:
+            Tuple[List[int], int]: (смещения сегментов, длина очищенного текста)
+        """
+        offsets: List[int] = []
+        emitted = 0
+
+        def texts() -> Iterator[str]:
+            # Следующий сегмент запрашивается после выдачи очищенного текста предыдущих
+            for segment in segments:
+                offsets.append(emitted)
+                yield segment["text"]
+
+        for cleaned in self.iter_clean_text(texts()):
+            emitted += len(cleaned)
+        return offsets, emitted
+
+    def cleaned_length(self, file_path: Path, encoding: Optional[str] = None) -> int:
+        """Длина очищенного текста файла, без сохранения самого текста"""
+        blocks = self.iter_clean_text(self.iter_file_blocks(file_path, encoding))
+        return sum(len(block) for block in blocks)
+
+    def segment_timeline(
+        self, file_path: Path, encoding: Optional[str] = None
+    ) -> Optional[Tuple[List[int], List[Dict]]]:
+        """
+        Сегменты Whisper файла и смещения их начала в очищенном тексте.
+
+        Соответствие сегментов тексту проверяется отдельным потоковым проходом
+        по файлу до разбиения, поэтому таймкоды можно выдавать вместе с чанками.
+        Проход нужен только расшифровкам, у которых есть файл сегментов.
+
+        Returns:
+            Optional[Tuple[List[int], List[Dict]]]: (смещения, сегменты) или None,
+            если сегментов нет или они от другого текста.
+        """
+        segments = load_segments(file_path)
+        if segments is None:
+            return None
+
+        offsets, length = self.segment_offsets(segments)
+        total_length = self.cleaned_length(file_path, encoding)
+        if not segments or length != total_length:
+            logger.warning(
+                f"Сегменты не совпадают с текстом ({length} != {total_length}), "
+                f"таймкоды не добавлены"
+            )
+            return None
+        return offsets, segments
+
+    @staticmethod
+    def chunk_timestamp(
+        chunk: TextChunk, offsets: List[int], segments: List[Dict]
+    ) -> Tuple[float, float]:
+        """Время начала и конца чанка в записи по сегментам Whisper"""
+        first = max(bisect_right(offsets, chunk.start) - 1, 0)
+        last = max(bisect_right(offsets, chunk.end - 1) - 1, 0)
+        return segments[first]["start"], segments[last]["end"]
+
     def extract_metadata(self, text: str, file_path: Optional[Path] = None) -> Dict:
         """
         Извлечение метаданных из текста и пути к файлу.
@@ -123,9 +511,42 @@ class TextProcessor:
             "length": metadata["length"],
         }
 
+    def iter_records(
+        self,
+        file_path: Path,
+        encoding: Optional[str] = None,
+        stats: Optional[ChunkStats] = None,
+    ) -> Iterator[Tuple[str, Dict]]:
+        """
+        Потоковая обработка файла: пары (текст чанка, метаданные) по мере разбиения.
+
+        В памяти - блок файла и несколько чанков. Число чанков файла в
+        метаданные не входит: оно известно только после последнего чанка.
+        """
+        base_metadata = self.extract_metadata("", file_path)
+        timeline = self.segment_timeline(file_path, encoding)
+
+        for i, chunk in enumerate(self.iter_chunks(file_path, stats, encoding)):
+            chunk_metadata = {
+                "path": f"{base_metadata['path']}",
+                "topic": f"{base_metadata['topic']}",
+                "filename": f"{base_metadata['filename']}",
+                "chunk_id": f"{i}",
+                "chunk_text_length": f"{len(chunk.text)}",
+                "chunk_start": f"{chunk.start}",
+            }
+            if timeline is not None:
+                start_time, end_time = self.chunk_timestamp(chunk, *timeline)
+                chunk_metadata["start_time"] = f"{int(start_time)}"
+                chunk_metadata["end_time"] = f"{int(end_time + 0.999)}"
+            yield chunk.text, chunk_metadata
+
     def process_file(self, file_path: Path) -> Tuple[List[str], List[Dict]]:
         """
-        Полная обработка файла: чтение, очистка, разбиение на чанки и извлечение метаданных
+        Полная обработка файла: чтение, очистка, разбиение на чанки и извлечение метаданных.
+
+        Собирает все чанки файла в списки; без этого обходится iter_records,
+        которым пользуется конвейер загрузки.
 
         Returns:
             Tuple[List[str], List[Dict]]: (chunks, metadata_list)
@@ -133,34 +554,20 @@ class TextProcessor:
         logger.info(f"Начало обработки файла: {file_path}")
 
         try:
-            text = self.read_file(file_path)
-            logger.debug(f"Файл прочитан, размер: {len(text)} символов")
-
-            cleaned_text = self.clean_text(text)
-            logger.debug(f"Текст очищен, новый размер: {len(cleaned_text)} символов")
-
-            chunks = self.split_into_chunks(cleaned_text)
-            logger.debug(f"Текст разбит на {len(chunks)} чанков")
-
-            stats = self.get_text_stats(cleaned_text)
-            logger.info(f"Статистика обработки: {stats}")
-
-            base_metadata = self.extract_metadata(cleaned_text, file_path)
-
-            metadata_list = []
-            for i, chunk in enumerate(chunks):
-                chunk_metadata = {
-                    "path": f"{base_metadata['path']}",
-                    "topic": f"{base_metadata['topic']}",
-                    "filename": f"{base_metadata['filename']}",
-                    "chunk_id": f"{i}",
-                    "chunk_total": f"{len(chunks)}",
-                    "chunk_text_length": f"{len(chunk)}",
-                }
-                metadata_list.append(chunk_metadata)
+            for encoding in self.candidate_encodings(file_path):
+                stats = ChunkStats()
+                try:
+                    records = list(self.iter_records(file_path, encoding, stats))
+                    break
+                except UnicodeDecodeError:
+                    logger.warning(f"Файл {file_path} не читается в {encoding}")
+            else:
+                raise ValueError(f"Не удалось прочитать файл {file_path}")
 
+            logger.debug(f"Текст разбит на {len(records)} чанков")
+            logger.info(f"Статистика обработки: {stats.as_dict()}")
             logger.info(f"Обработка файла {file_path} завершена успешно")
-            return chunks, metadata_list
+            return [text for text, _ in records], [metadata for _, metadata in records]
 
         except Exception as e:
             logger.error(f"Ошибка при обработке файла {file_path}: {str(e)}")
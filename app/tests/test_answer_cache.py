@@ -0,0 +1,61 @@
+import pytest
+from services.answer_cache import SemanticAnswerCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def cache(clock):
+    return SemanticAnswerCache(threshold=0.9, ttl=10, max_entries=2, time_func=clock)
+
+
+def test_similar_question_hit(cache):
+    """Тест попадания для близкого вопроса и промаха для далекого"""
+    cache.store("test", [1.0, 0.0, 0.0], "Руднев", latency=2.5)
+
+    assert cache.lookup("test", [0.99, 0.05, 0.0]) == "Руднев"
+    assert cache.lookup("test", [0.0, 1.0, 0.0]) is None
+    assert cache.lookup("other", [1.0, 0.0, 0.0]) is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["saved_latency_seconds"] == 2.5
+
+
+def test_ttl_expiry(cache, clock):
+    """Тест истечения срока жизни записи"""
+    cache.store("test", [1.0, 0.0], "ответ")
+    clock.now = 11
+
+    assert cache.lookup("test", [1.0, 0.0]) is None
+    assert cache.stats()["size"] == 0
+
+
+def test_collection_version_invalidation(cache):
+    """Тест сброса записей при изменении коллекции"""
+    cache.store("test", [1.0, 0.0], "ответ", version=1)
+
+    assert cache.lookup("test", [1.0, 0.0], version=1) == "ответ"
+    assert cache.lookup("test", [1.0, 0.0], version=2) is None
+
+
+def test_max_entries(cache):
+    """Тест вытеснения самых старых записей"""
+    cache.store("test", [1.0, 0.0, 0.0], "первый")
+    cache.store("test", [0.0, 1.0, 0.0], "второй")
+    cache.store("test", [0.0, 0.0, 1.0], "третий")
+
+    assert cache.lookup("test", [1.0, 0.0, 0.0]) is None
+    assert cache.lookup("test", [0.0, 0.0, 1.0]) == "третий"
@@ -0,0 +1,198 @@
+import asyncio
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from services.answer_cache import SemanticAnswerCache
+from services.chroma_service import ChromaService
+from services.gigachat_service import GigaChatService
+from services.rag_service import RAGService
+from services.retrieval import RetrievalResult
+
+SEARCH_DELAY = 0.2
+LLM_DELAY = 0.3
+CHATS = 8
+
+
+def seeded_embeddings(texts):
+    """Детерминированные эмбеддинги: одинаковый текст - одинаковый вектор"""
+    return [
+        np.random.default_rng(abs(hash(" ".join(text.lower().split())))).random(64) - 0.5
+        for text in texts
+    ]
+
+
+class BlockingChromaService(ChromaService):
+    """Локальная заглушка ChromaDB: поиск блокирует поток, как настоящий клиент"""
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=CHATS)
+        self._collection_versions = {}
+        self.persist_directory = tempfile.gettempdir()
+        self.embeddings = seeded_embeddings
+
+    def query_documents(self, collection_name, query_text, n_results=3, **kwargs):
+        time.sleep(SEARCH_DELAY)
+        return {"ids": [["dense"]], "documents": [[f"Контекст для: {query_text}"]]}
+
+    def lexical_search(self, collection_name, query_text, n_results=3, **kwargs):
+        return RetrievalResult.from_scores(
+            ["lexical"], [f"Термы из: {query_text}"], [{}], [1.0]
+        )
+
+
+class SlowChat:
+    """Локальная заглушка GigaChat с задержкой генерации"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        await asyncio.sleep(LLM_DELAY)
+        return SimpleNamespace(content=f"Ответ на: {messages[-1].content}")
+
+    async def astream(self, messages):
+        self.calls += 1
+        for word in f"Ответ на: {messages[-1].content}".split(" "):
+            await asyncio.sleep(LLM_DELAY / 10)
+            yield SimpleNamespace(content=word + " ")
+
+
+class FakeGigaChatService(GigaChatService):
+    def __init__(self):
+        self.chat = SlowChat()
+
+
+@pytest.fixture
+def rag_service():
+    return RAGService(
+        chroma_service=BlockingChromaService(),
+        giga_chat_service=FakeGigaChatService(),
+        answer_cache=SemanticAnswerCache(threshold=0.95, ttl=60),
+    )
+
+
+@pytest.mark.asyncio
+async def test_agenerate_answer(rag_service):
+    """Тест асинхронной генерации ответа"""
+    answer = await rag_service.agenerate_answer("Кто командовал Варягом?", "test")
+    assert answer == "Ответ на: Кто командовал Варягом?"
+
+
+@pytest.mark.asyncio
+async def test_concurrent_chats_do_not_serialize(rag_service):
+    """Нагрузочный тест: параллельные чаты обрабатываются одновременно"""
+    gaps = []
+
+    async def ticker(stop: asyncio.Event):
+        # Event loop должен оставаться отзывчивым во время поиска и генерации
+        last = time.perf_counter()
+        while not stop.is_set():
+            await asyncio.sleep(0.01)
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+
+    stop = asyncio.Event()
+    ticker_task = asyncio.create_task(ticker(stop))
+
+    start = time.perf_counter()
+    answers = await asyncio.gather(
+        *(
+            rag_service.agenerate_answer(f"Вопрос {i}", "test")
+            for i in range(CHATS)
+        )
+    )
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await ticker_task
+
+    serial_time = CHATS * (SEARCH_DELAY + LLM_DELAY)
+    assert len(answers) == CHATS
+    assert elapsed < serial_time / 3
+    assert max(gaps) < SEARCH_DELAY
+
+
+@pytest.mark.asyncio
+async def test_repeated_question_served_from_cache(rag_service):
+    """Тест ответа на повторный вопрос из кэша без вызова LLM"""
+    first = await rag_service.agenerate_answer("Итоги Цусимы", "test")
+
+    start = time.perf_counter()
+    second = await rag_service.agenerate_answer("итоги   цусимы", "test")
+    elapsed = time.perf_counter() - start
+
+    assert second == first
+    assert rag_service.giga_chat_service.chat.calls == 1
+    assert elapsed < LLM_DELAY
+    assert rag_service.answer_cache.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_astream_answer(rag_service):
+    """Тест потоковой генерации: фрагменты приходят до конца ответа, ответ кэшируется"""
+    chunks = [
+        chunk async for chunk in rag_service.astream_answer("Кто командовал Варягом?", "test")
+    ]
+
+    assert len(chunks) > 1
+    assert "".join(chunks).strip() == "Ответ на: Кто командовал Варягом?"
+
+    cached = [
+        chunk async for chunk in rag_service.astream_answer("Кто командовал Варягом?", "test")
+    ]
+    assert cached == ["".join(chunks)]
+    assert rag_service.giga_chat_service.chat.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_identical_concurrent_questions_are_coalesced(rag_service):
+    """Одинаковые одновременные вопросы - один вызов LLM на всех"""
+    rag_service.answer_cache = None
+    variants = ["Итоги Цусимы?", "итоги  цусимы", "Итоги Цусимы."] * 4
+
+    answers = await asyncio.gather(
+        *(rag_service.agenerate_answer(query, "test") for query in variants)
+    )
+
+    assert len(set(answers)) == 1
+    assert rag_service.giga_chat_service.chat.calls == 1
+    assert rag_service.ainflight.stats()["coalesced"] == len(variants) - 1
+
+
+@pytest.mark.asyncio
+async def test_identical_concurrent_streams_are_coalesced(rag_service):
+    """Подписчик, пришедший посреди генерации, получает ответ целиком"""
+    rag_service.answer_cache = None
+
+    async def collect(delay: float):
+        await asyncio.sleep(delay)
+        return [chunk async for chunk in rag_service.astream_answer("Итоги Цусимы", "test")]
+
+    first, late = await asyncio.gather(collect(0), collect(LLM_DELAY / 2))
+
+    assert first == late
+    assert "".join(first).strip() == "Ответ на: Итоги Цусимы"
+    assert rag_service.giga_chat_service.chat.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_join_running_stream_without_new_generation(rag_service):
+    """К генерируемому ответу можно присоединиться, не запуская новую"""
+    rag_service.answer_cache = None
+    assert rag_service.ajoin_answer("Итоги Цусимы", "test") is None
+
+    async def lead():
+        return [chunk async for chunk in rag_service.astream_answer("Итоги Цусимы", "test")]
+
+    leader = asyncio.create_task(lead())
+    await asyncio.sleep(SEARCH_DELAY / 2)
+    joined = rag_service.ajoin_answer("итоги цусимы?", "test")
+
+    assert [chunk async for chunk in joined] == await leader
+    assert rag_service.giga_chat_service.chat.calls == 1
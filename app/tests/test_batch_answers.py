@@ -0,0 +1,105 @@
+import threading
+import time
+
+import pytest
+from services.answer_cache import SemanticAnswerCache
+from services.chroma_service import ChromaService
+from services.gigachat_service import GigaChatService
+from services.rag_service import RAGService
+
+COLLECTION = "test_batch_answers"
+LLM_DELAY = 0.1
+
+DOCUMENTS = [
+    "Цусимское сражение произошло в мае 1905 года.",
+    "Крейсер Варяг принял бой у Чемульпо в 1904 году.",
+    "Оборона Порт-Артура продолжалась почти год.",
+    "Мукденское сражение стало крупнейшим сухопутным сражением войны.",
+]
+
+
+class ConcurrentFakeGigaChatService(GigaChatService):
+    """Локальная заглушка LLM: отвечает первым чанком контекста и считает параллелизм"""
+
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate_response(self, query, context, metadatas=None):
+        with self._lock:
+            self.calls += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(LLM_DELAY)
+        with self._lock:
+            self.active -= 1
+        return context[0]
+
+
+class CountingEmbeddings:
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+        self.calls = 0
+
+    def __call__(self, input):
+        self.calls += 1
+        return self.embeddings(input)
+
+
+@pytest.fixture
+def rag_service(tmp_path):
+    chroma_service = ChromaService(embedding_service="hashing", persist_directory=str(tmp_path))
+    chroma_service.add_documents(COLLECTION, texts=DOCUMENTS)
+    chroma_service.embeddings = CountingEmbeddings(chroma_service.embeddings)
+    return RAGService(
+        chroma_service=chroma_service,
+        giga_chat_service=ConcurrentFakeGigaChatService(),
+        answer_cache=SemanticAnswerCache(),
+        retrieval_mode="dense",
+    )
+
+
+def test_generate_answers_batches_search(rag_service, monkeypatch):
+    """Один батч эмбеддингов и один collection.query на все вопросы"""
+    queries = [
+        "Когда было Цусимское сражение?",
+        "Где принял бой крейсер Варяг?",
+        "Сколько длилась оборона Порт-Артура?",
+        "Какое сражение было крупнейшим сухопутным?",
+    ] * 3
+
+    collection = rag_service.chroma_service.create_or_get_collection(COLLECTION)
+    query_calls = []
+    original_query = collection.query
+
+    def counting_query(*args, **kwargs):
+        query_calls.append(len(kwargs["query_embeddings"]))
+        return original_query(*args, **kwargs)
+
+    monkeypatch.setattr(collection, "query", counting_query)
+
+    start = time.perf_counter()
+    answers = rag_service.generate_answers(queries, COLLECTION, max_concurrency=4)
+    elapsed = time.perf_counter() - start
+
+    assert answers[:4] == DOCUMENTS
+    assert answers[4:] == answers[:4] * 2
+    assert rag_service.chroma_service.embeddings.calls == 1
+    assert query_calls == [len(queries)]
+
+    llm = rag_service.giga_chat_service
+    assert llm.calls == len(queries)
+    assert llm.max_active <= 4
+    assert elapsed < len(queries) * LLM_DELAY / 2
+
+
+def test_generate_answers_uses_answer_cache(rag_service):
+    queries = ["Когда было Цусимское сражение?", "Где принял бой крейсер Варяг?"]
+    first = rag_service.generate_answers(queries, COLLECTION)
+    second = rag_service.generate_answers(queries, COLLECTION)
+
+    assert second == first
+    assert rag_service.giga_chat_service.calls == 2
+    assert rag_service.generate_answers([], COLLECTION) == []
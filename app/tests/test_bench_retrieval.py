@@ -0,0 +1,46 @@
+from scripts.bench_retrieval import compare_results, is_relevant, run_benchmark
+
+QUESTIONS = [
+    {"question": "Кто командовал Варягом?", "sources": ["varyag"], "keywords": ["Руднев"]},
+    {"question": "Кто командовал флотом при Цусиме?", "sources": ["tsusima"], "keywords": ["Того"]},
+]
+
+
+def test_is_relevant():
+    question = QUESTIONS[0]
+    assert is_relevant(question, "Командир Варяга Руднев", {"path": "/docs/varyag.txt"})
+    assert not is_relevant(question, "Командир Варяга Руднев", {"path": "/docs/other.txt"})
+    assert not is_relevant(question, "Крейсер Варяг", {"path": "/docs/varyag.txt"})
+
+
+def test_run_benchmark(tmp_path):
+    """Бенчмарк на маленьком корпусе: метрики для каждой конфигурации"""
+    (tmp_path / "varyag.txt").write_text(
+        "Крейсером Варяг командовал Всеволод Руднев. " * 5, encoding="utf-8"
+    )
+    (tmp_path / "tsusima.txt").write_text(
+        "Японским флотом при Цусиме командовал адмирал Того. " * 5, encoding="utf-8"
+    )
+
+    results = run_benchmark(
+        str(tmp_path),
+        QUESTIONS,
+        chunk_sizes=[100],
+        chunk_overlaps=[10],
+        modes=["dense", "hybrid"],
+        rerankers=["none"],
+        ks=[3],
+        repeat=1,
+        process_workers=0,
+    )
+
+    assert len(results["runs"]) == 2
+    for run in results["runs"]:
+        assert run["recall@3"] == 1.0
+        assert 0 < run["mrr@3"] <= 1.0
+        assert run["ingest"]["chunks"] > 0
+        assert run["latency_ms"]["p50"] <= run["latency_ms"]["p99"]
+
+    assert compare_results(results, results) == []
+    worse = {"runs": [{**run, "recall@3": 0.0} for run in results["runs"]]}
+    assert len(compare_results(results, worse)) == 2
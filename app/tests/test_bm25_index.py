@@ -0,0 +1,177 @@
+import os
+import pytest
+from services.bm25_index import BM25Index, reciprocal_rank_fusion, tokenize
+from services.chroma_service import ChromaService
+from services.rag_service import RAGService
+
+from tests.test_async_rag import FakeGigaChatService
+
+COLLECTION = "test_bm25"
+
+DOCUMENTS = {
+    "rurik": "Крейсер Рюрик погиб в бою в Корейском проливе в 1904 году.",
+    "togo": "Адмирал Того командовал японским флотом при Цусиме.",
+    "chemulpo": "Бой у Чемульпо: крейсер Варяг и канонерская лодка Кореец.",
+    "port_arthur": "Оборона Порт-Артура продолжалась почти год.",
+}
+
+
+def lexical_service(tmp_path, lexical_index: bool = True) -> ChromaService:
+    return ChromaService(
+        embedding_service="hashing", persist_directory=str(tmp_path), lexical_index=lexical_index
+    )
+
+
+@pytest.fixture
+def index():
+    index = BM25Index()
+    index.add(
+        list(DOCUMENTS),
+        list(DOCUMENTS.values()),
+        [{"topic": "navy"} for _ in DOCUMENTS],
+    )
+    return index
+
+
+def test_tokenize_stems_word_forms():
+    assert tokenize("Цусима") == tokenize("цусимы")
+    assert tokenize("У Чемульпо, 1904!") == ["у", "чемул", "1904"]
+
+
+def test_search_exact_names(index):
+    """Имена кораблей и адмиралов находятся по точному совпадению"""
+    assert index.search("Что случилось с Рюриком?")[0][0] == "rurik"
+    assert index.search("Кто такой Того?")[0][0] == "togo"
+    assert index.search("Варяг у Чемульпо", n_results=1)[0][0] == "chemulpo"
+    assert index.search("Мукден") == []
+
+
+def test_remove_and_replace(index):
+    index.remove(["togo"])
+    assert index.search("Того") == []
+
+    index.add(["rurik"], ["Броненосец Ослябя погиб при Цусиме."])
+    assert len(index) == 3
+    assert index.search("Рюрик") == []
+    assert index.search("Ослябя")[0][0] == "rurik"
+
+
+def test_metadata_filter(index):
+    index.add(["other"], ["Рюрик - варяжский князь."], [{"topic": "history"}])
+    hits = index.search("Рюрик", metadata_filter={"topic": "history"})
+    assert [doc_id for doc_id, _ in hits] == ["other"]
+
+
+def test_save_and_load(index, tmp_path):
+    path = tmp_path / "bm25.json"
+    index.save(str(path))
+
+    loaded = BM25Index.load(str(path))
+    assert len(loaded) == len(index)
+    assert loaded.search("Того") == index.search("Того")
+    assert not loaded.dirty
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]], k=60)
+    assert [doc_id for doc_id, _ in fused] == ["a", "c", "b"]
+
+
+def test_chroma_service_keeps_lexical_index(tmp_path):
+    """Лексический индекс обновляется при загрузке и сохраняется рядом с ChromaDB"""
+    service = lexical_service(tmp_path)
+    service.add_documents(COLLECTION, texts=list(DOCUMENTS.values()), ids=list(DOCUMENTS))
+    service.delete_documents(COLLECTION, ["port_arthur"])
+    service.save_lexical_indexes()
+
+    results = service.lexical_search(COLLECTION, "адмирал Того", n_results=2)
+    assert results.ids[0] == "togo"
+    assert results.documents[0] == DOCUMENTS["togo"]
+
+    # Новый процесс загружает индекс с диска
+    restarted = lexical_service(tmp_path)
+    assert len(restarted.get_lexical_index(COLLECTION)) == 3
+
+
+def test_lexical_index_reloaded_after_external_ingest(tmp_path):
+    """Индекс, перезаписанный другим процессом, перечитывается с диска"""
+    service = lexical_service(tmp_path)
+    service.add_documents(COLLECTION, texts=list(DOCUMENTS.values()), ids=list(DOCUMENTS))
+    service.save_lexical_indexes()
+    assert service.lexical_search(COLLECTION, "адмирал Того", n_results=1).ids == ["togo"]
+
+    other = lexical_service(tmp_path)
+    other.delete_documents(COLLECTION, ["togo"])
+    other.save_lexical_indexes()
+    path = service._lexical_index_path(COLLECTION)
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    assert "togo" not in service.lexical_search(COLLECTION, "адмирал Того", n_results=3).ids
+
+
+def test_collection_version_changes_after_external_writes(tmp_path):
+    """Версия коллекции (ключ кэша ответов) общая для процессов и меняется при любой записи"""
+    service = lexical_service(tmp_path, lexical_index=False)
+    version = service.collection_version(COLLECTION)
+    assert service.collection_version(COLLECTION) == version
+
+    other = lexical_service(tmp_path, lexical_index=False)
+    versions = [version]
+    other.add_documents(COLLECTION, texts=list(DOCUMENTS.values()), ids=list(DOCUMENTS))
+    versions.append(service.collection_version(COLLECTION))
+    other.update_document_metadata(COLLECTION, "togo", {"topic": "navy"})
+    versions.append(service.collection_version(COLLECTION))
+    other.delete_documents(COLLECTION, ["togo"])
+    versions.append(service.collection_version(COLLECTION))
+
+    assert len(set(versions)) == len(versions)
+
+
+@pytest.mark.parametrize("mode", ["dense", "lexical", "hybrid"])
+def test_generate_answer_retrieval_modes(tmp_path, mode):
+    """Во всех режимах самый релевантный чанк находится первым"""
+    service = lexical_service(tmp_path)
+    service.add_documents(COLLECTION, texts=list(DOCUMENTS.values()), ids=list(DOCUMENTS))
+    rag_service = RAGService(
+        chroma_service=service,
+        giga_chat_service=FakeGigaChatService(),
+        retrieval_mode=mode,
+    )
+
+    context = rag_service._retrieve_context("Кто командовал при Цусиме? Того?", COLLECTION)
+
+    assert context.ids[0] == "togo"
+    assert context.documents[0] == DOCUMENTS["togo"]
+
+
+def test_dense_mode_does_not_keep_lexical_index(tmp_path):
+    """Без лексического поиска индекс не ведется, а устаревший файл удаляется"""
+    service = lexical_service(tmp_path)
+    service.add_documents(COLLECTION, texts=list(DOCUMENTS.values()), ids=list(DOCUMENTS))
+    service.save_lexical_indexes()
+    path = service._lexical_index_path(COLLECTION)
+    assert path.exists()
+
+    dense = lexical_service(tmp_path, lexical_index=False)
+    dense.delete_documents(COLLECTION, ["togo"])
+    dense.save_lexical_indexes()
+    assert not path.exists()
+
+    # Явный запрос строит индекс по коллекции, дальше он обновляется при записи
+    assert "togo" not in dense.lexical_search(COLLECTION, "адмирал Того", n_results=3).ids
+    dense.delete_documents(COLLECTION, ["rurik"])
+    assert len(dense.get_lexical_index(COLLECTION)) == 2
+
+
+def test_index_built_from_collection_reloads_saved_file(tmp_path):
+    """Индекс, построенный по коллекции, перечитывается, когда файл сохранит другой процесс"""
+    reader = lexical_service(tmp_path, lexical_index=False)
+    reader.create_or_get_collection(COLLECTION)
+    assert len(reader.get_lexical_index(COLLECTION)) == 0
+
+    writer = lexical_service(tmp_path)
+    writer.add_documents(COLLECTION, texts=list(DOCUMENTS.values()), ids=list(DOCUMENTS))
+    writer.save_lexical_indexes()
+
+    assert len(reader.get_lexical_index(COLLECTION)) == len(DOCUMENTS)
@@ -28,6 +28,17 @@ def test_create_collection(chroma_service):
     assert collection.name == "test_collection"
 
 
+def test_collection_handle_is_cached(chroma_service):
+    """Тест повторного использования handle коллекции и сброса при удалении"""
+    first = chroma_service.create_or_get_collection("test_collection")
+    assert chroma_service.create_or_get_collection("test_collection") is first
+
+    chroma_service.delete_collection("test_collection")
+    recreated = chroma_service.create_or_get_collection("test_collection")
+    assert recreated is not first
+    assert recreated.count() == 0
+
+
 def test_add_and_query_documents(chroma_service):
     """Тест добавления и поиска документов"""
     texts = [
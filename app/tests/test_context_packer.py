@@ -0,0 +1,77 @@
+import pytest
+from services.context_packer import ContextPacker, estimate_tokens, source_link, text_overlap
+from services.text_processor import TextProcessor
+
+
+@pytest.fixture
+def chunks():
+    """Соседние чанки одного файла с перекрытием"""
+    processor = TextProcessor(chunk_size=200, chunk_overlap=40)
+    text = " ".join(f"Предложение {i} о бое у Чемульпо." for i in range(30))
+    chunks = processor.split_into_chunks(text)
+    metadatas = [{"path": "varyag.txt", "chunk_id": str(i)} for i in range(len(chunks))]
+    return text, chunks, metadatas
+
+
+def test_text_overlap():
+    assert text_overlap("крейсер Варяг", "Варяг и Кореец", 20) == len("Варяг")
+    assert text_overlap("крейсер", "броненосец", 20) == 0
+
+
+def test_duplicates_are_dropped():
+    packer = ContextPacker(max_tokens=1000)
+    assert packer.pack(["Цусима", "Цусима", "Мукден"]) == ["Цусима", "Мукден"]
+
+
+def test_neighbours_are_merged_without_overlap(chunks):
+    """Соседние чанки склеиваются в исходный текст без повтора перекрытия"""
+    text, chunks, metadatas = chunks
+    packer = ContextPacker(max_tokens=10_000, chunk_overlap=40)
+
+    # Порядок релевантности не совпадает с порядком в файле
+    order = [2, 0, 1]
+    packed = packer.pack([chunks[i] for i in order], [metadatas[i] for i in order])
+
+    assert len(packed) == 1
+    assert text.startswith(packed[0])
+    assert len(packed[0]) < sum(len(chunks[i]) for i in order)
+
+
+def test_neighbours_detected_by_text_without_metadata(chunks):
+    _, chunks, _ = chunks
+    packer = ContextPacker(max_tokens=10_000, chunk_overlap=40)
+    assert len(packer.pack([chunks[1], chunks[0]])) == 1
+
+
+def test_budget_drops_least_relevant(chunks):
+    """Фрагменты сверх бюджета отбрасываются, начиная с наименее релевантных"""
+    _, chunks, metadatas = chunks
+    packer = ContextPacker(max_tokens=estimate_tokens(chunks[0]) * 2 + 5)
+
+    # Несоседние чанки: 0, 2, 4
+    order = [4, 0, 2]
+    packed = packer.pack([chunks[i] for i in order], [metadatas[i] for i in order])
+
+    assert packed == [chunks[4], chunks[0]]
+
+
+def test_oversized_first_chunk_is_truncated():
+    packer = ContextPacker(max_tokens=10)
+    packed = packer.pack(["слово " * 100])
+
+    assert len(packed) == 1
+    assert estimate_tokens(packed[0]) <= 11
+
+
+def test_source_link_with_timestamp():
+    url = "https://www.youtube.com/watch?v=_jznEJerEZk&index=61"
+    assert source_link({"source": url}) == url
+    assert source_link({"source": url, "start_time": "95"}) == f"{url}&t=95s"
+    assert source_link({"source": f"{url}&t=10s", "start_time": "95"}) == f"{url}&t=95s"
+    assert source_link({"start_time": "95"}) is None
+
+    packer = ContextPacker(max_tokens=1000)
+    metadata = {"source": url, "start_time": "95"}
+    assert packer.pack(["Бой у Чемульпо"], [metadata]) == [
+        f"Бой у Чемульпо\nИсточник: {url}&t=95s"
+    ]
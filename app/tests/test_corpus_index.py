@@ -0,0 +1,86 @@
+import hashlib
+from typing import List
+
+import numpy as np
+import pytest
+from chromadb.api.types import EmbeddingFunction
+from services.chroma_service import ChromaService
+from services.corpus_index import CorpusIndex, build_index, import_index_if_needed
+from services.text_processor import TextProcessor
+
+COLLECTION = "test_corpus_index"
+
+
+class HashEmbeddings(EmbeddingFunction):
+    model_name = "test/hash"
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        self.calls += 1
+        return [
+            [b / 255.0 for b in hashlib.sha256(text.encode("utf-8")).digest()]
+            for text in input
+        ]
+
+
+@pytest.fixture
+def processor():
+    return TextProcessor(chunk_size=100, chunk_overlap=10)
+
+
+@pytest.fixture
+def index_path(tmp_path, processor):
+    files = []
+    for i in range(2):
+        doc = tmp_path / f"tsusima_{i}.txt"
+        doc.write_text(
+            " ".join(f"Предложение {j} о Цусимском сражении." for j in range(20)),
+            encoding="utf-8",
+        )
+        files.append((doc, {"source": f"https://example.com/{i}"}))
+
+    path = tmp_path / "index"
+    build_index(files, str(path), HashEmbeddings(), processor, batch_size=7)
+    return path
+
+
+def test_build_and_load_index(index_path):
+    """Тест сборки артефакта и загрузки эмбеддингов через mmap"""
+    index = CorpusIndex(str(index_path))
+
+    assert isinstance(index.embeddings, np.memmap)
+    assert index.embeddings.dtype == np.float32
+    assert index.embeddings.shape == (len(index), 32)
+    chunks = list(index.iter_chunks())
+    assert len(chunks) == len(index)
+    assert chunks[0]["metadata"]["source"] == "https://example.com/0"
+
+
+def test_check_compatible(index_path):
+    """Тест проверки настроек чанкирования и модели"""
+    index = CorpusIndex(str(index_path))
+
+    index.check_compatible(chunk_size=100, chunk_overlap=10, embedding_model="test/hash")
+    with pytest.raises(ValueError):
+        index.check_compatible(chunk_size=1000, chunk_overlap=50)
+    with pytest.raises(ValueError):
+        index.check_compatible(chunk_size=100, chunk_overlap=10, embedding_model="other")
+
+
+def test_import_without_embedding_calls(index_path, tmp_path, monkeypatch):
+    """Тест импорта индекса в пустую коллекцию без вызовов эмбеддера"""
+    monkeypatch.setattr("services.corpus_index.settings.CHUNK_SIZE", 100)
+    monkeypatch.setattr("services.corpus_index.settings.CHUNK_OVERLAP", 10)
+
+    chroma_service = ChromaService(persist_directory=str(tmp_path / "chroma"))
+    chroma_service.embeddings = HashEmbeddings()
+    index = CorpusIndex(str(index_path))
+
+    assert index.import_into(chroma_service, COLLECTION) == len(index)
+    assert chroma_service.embeddings.calls == 0
+    assert chroma_service.get_collection_stats(COLLECTION)["count"] == len(index)
+
+    # Коллекция уже заполнена: повторный импорт пропускается
+    assert not import_index_if_needed(chroma_service, COLLECTION, str(index_path))
@@ -0,0 +1,100 @@
+import pytest
+from typing import List
+from chromadb.api.types import EmbeddingFunction
+from services.embedding_cache import CachedEmbeddingsService, EmbeddingCache
+
+
+class CountingEmbeddings(EmbeddingFunction):
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        self.calls.append(list(input))
+        return [[float(len(text)), 0.5] for text in input]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), max_entries=3)
+    yield cache
+    cache.close()
+
+
+def test_cache_hit_and_miss(cache):
+    """Тест попаданий и промахов кэша"""
+    assert cache.get_many("model", ["текст"]) == [None]
+
+    cache.put_many("model", ["текст"], [[1.0, 2.0]])
+    (vector,) = cache.get_many("model", ["  текст "])
+
+    assert vector.tolist() == [1.0, 2.0]
+    assert cache.get_many("other-model", ["текст"]) == [None]
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_cache_lru_eviction(cache):
+    """Тест вытеснения давно неиспользуемых записей"""
+    cache.put_many("model", ["a", "b", "c"], [[1.0], [2.0], [3.0]])
+    cache.get_many("model", ["a"])
+    cache.put_many("model", ["d"], [[4.0]])
+
+    assert cache.stats()["size"] == 3
+    a, b, c, d = cache.get_many("model", ["a", "b", "c", "d"])
+    assert b is None
+    assert a is not None and c is not None and d is not None
+
+
+def test_cache_persistence(tmp_path):
+    """Тест сохранения кэша между запусками"""
+    path = str(tmp_path / "cache.sqlite3")
+    cache = EmbeddingCache(path)
+    cache.put_many("model", ["текст"], [[0.25, 0.75]])
+    cache.close()
+
+    reopened = EmbeddingCache(path)
+    (vector,) = reopened.get_many("model", ["текст"])
+    assert vector.tolist() == [0.25, 0.75]
+    reopened.close()
+
+
+def test_cached_service_embeds_only_misses(cache):
+    """Тест запроса к сервису только для отсутствующих в кэше текстов"""
+    inner = CountingEmbeddings()
+    service = CachedEmbeddingsService(inner, cache, "model")
+
+    first = service(["один", "два"])
+    second = service(["два", "три"])
+
+    assert inner.calls == [["один", "два"], ["три"]]
+    assert [list(v) for v in second] == [[3.0, 0.5], [3.0, 0.5]]
+    assert len(first) == 2
+
+
+def test_cache_size_counts_only_new_keys(cache):
+    """Повторная запись того же текста не увеличивает размер кэша"""
+    cache.put_many("model", ["a", "b"], [[1.0], [2.0]])
+    cache.put_many("model", ["a", "a"], [[1.5], [1.5]])
+
+    assert cache.stats()["size"] == 2
+    (a,) = cache.get_many("model", ["a"])
+    assert a.tolist() == [1.5]
+
+
+def test_cache_lru_clock_shared_between_processes(tmp_path):
+    """Обращения и записи через другое соединение учитываются при вытеснении"""
+    path = str(tmp_path / "cache.sqlite3")
+    first = EmbeddingCache(path, max_entries=2)
+    second = EmbeddingCache(path, max_entries=2)
+
+    first.put_many("model", ["a"], [[1.0]])
+    second.put_many("model", ["b"], [[2.0]])
+    first.get_many("model", ["a"])
+    first.put_many("model", ["c"], [[3.0]])
+
+    assert first.stats()["size"] == 2
+    a, b, c = first.get_many("model", ["a", "b", "c"])
+    assert b is None
+    assert a is not None and c is not None
+    first.close()
+    second.close()
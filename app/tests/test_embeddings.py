@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+from typing import List
+from services.chroma_service import ChromaService
+from services.embeddings import (
+    EMBEDDING_SERVICES,
+    BaseEmbeddingsService,
+    HashingEmbeddingsService,
+    get_embeddings_service,
+    is_throttling_error,
+)
+
+
+class ThrottlingError(Exception):
+    """Ошибка в формате gigachat.exceptions.ResponseError"""
+
+    def __init__(self, status_code: int):
+        super().__init__("https://gigachat/embeddings", status_code, b"", {})
+
+
+class RecordingEmbeddingsService(BaseEmbeddingsService):
+    def __init__(self, failures: List[Exception] = None, **kwargs):
+        super().__init__(retry_backoff=0, **kwargs)
+        self.failures = list(failures or [])
+        self.batches = []
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        if self.failures:
+            raise self.failures.pop(0)
+        self.batches.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+def test_batches_preserve_order():
+    """Тест разбиения на батчи с сохранением порядка"""
+    texts = ["a" * i for i in range(1, 11)]
+    service = RecordingEmbeddingsService(batch_size=3, max_concurrency=4)
+
+    embeddings = service(texts)
+
+    # Батчи обрабатываются параллельно, поэтому порядок вызовов не гарантирован
+    assert sorted(map(len, service.batches)) == [1, 3, 3, 3]
+    assert [embedding[0] for embedding in embeddings] == list(range(1, 11))
+
+
+def test_retry_on_throttling():
+    """Тест повтора запроса при троттлинге"""
+    service = RecordingEmbeddingsService(
+        failures=[ThrottlingError(429), ThrottlingError(429)], max_retries=3
+    )
+
+    embeddings = service(["текст"])
+
+    assert len(embeddings) == 1
+    assert service.batches == [["текст"]]
+
+
+def test_no_retry_on_other_errors():
+    """Тест отсутствия повторов для ошибок, не связанных с троттлингом"""
+    service = RecordingEmbeddingsService(failures=[ThrottlingError(401)])
+
+    with pytest.raises(ThrottlingError):
+        service(["текст"])
+
+
+def test_is_throttling_error():
+    assert is_throttling_error(ThrottlingError(429))
+    assert not is_throttling_error(ThrottlingError(500))
+    assert not is_throttling_error(ValueError("boom"))
+
+
+def cosine(a, b) -> float:
+    return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+
+def test_hashing_embeddings_are_deterministic():
+    """Тест детерминированности и нормировки локального эмбеддера"""
+    service = HashingEmbeddingsService(dim=256)
+    first, second = service(["Крейсер Варяг", "Крейсер Варяг"])
+
+    assert len(first) == 256
+    assert np.allclose(first, second)
+    assert np.isclose(np.linalg.norm(first), 1.0)
+
+
+def test_hashing_embeddings_similarity():
+    """Близкие по словам тексты ближе, чем несвязанные"""
+    service = HashingEmbeddingsService(dim=512)
+    query, related, unrelated = service(
+        [
+            "Кто командовал крейсером Варяг?",
+            "Командир крейсера Варяг - Всеволод Руднев.",
+            "Олимпийские игры прошли в Париже.",
+        ]
+    )
+
+    assert cosine(query, related) > cosine(query, unrelated)
+
+
+def test_get_embeddings_service_registry():
+    """Тест выбора бэкенда по имени"""
+    assert isinstance(get_embeddings_service("hashing"), HashingEmbeddingsService)
+    assert "gigachat" in EMBEDDING_SERVICES
+    with pytest.raises(ValueError):
+        get_embeddings_service("unknown")
+
+
+def test_chroma_service_with_local_backend(tmp_path):
+    """Тест поиска в ChromaDB с локальным бэкендом без сети"""
+    service = ChromaService(embedding_service="hashing", persist_directory=str(tmp_path))
+    service.add_documents(
+        "test_local",
+        texts=[
+            "Цусимское сражение произошло в 1905 году.",
+            "Крейсер Варяг принял бой у Чемульпо.",
+        ],
+    )
+
+    results = service.query_documents(
+        "test_local", query_text="Когда было Цусимское сражение?", n_results=1
+    )
+    assert "1905" in results["documents"][0][0]
@@ -0,0 +1,195 @@
+import asyncio
+import base64
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import gigachat
+import pytest
+from gigachat.models import AccessToken
+from services import gigachat_client
+from services.gigachat_client import (
+    SharedGigaChat,
+    SharedGigaChatClient,
+    SharedGigaChatEmbeddings,
+)
+
+CREDENTIALS = base64.b64encode(b"client:secret").decode()
+
+
+class MockGigaChatHandler(BaseHTTPRequestHandler):
+    """Минимальный GigaChat API: OAuth, эмбеддинги и чат"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        self.server.requests.append((self.path, self.client_address[1]))
+
+        if self.path == "/oauth":
+            payload = {
+                "access_token": f"token-{len(self.server.requests)}",
+                "expires_at": int((time.time() + self.server.token_ttl) * 1000),
+            }
+        elif self.path.endswith("/embeddings"):
+            texts = json.loads(body)["input"]
+            payload = {
+                "object": "list",
+                "model": "Embeddings",
+                "data": [
+                    {
+                        "object": "embedding",
+                        "embedding": [0.1, 0.2],
+                        "index": i,
+                        "usage": {"prompt_tokens": 1},
+                    }
+                    for i in range(len(texts))
+                ],
+            }
+        else:
+            payload = {
+                "object": "chat.completion",
+                "model": "GigaChat",
+                "created": 0,
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": "Ответ"},
+                    }
+                ],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+            }
+
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def mock_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockGigaChatHandler)
+    server.requests = []
+    server.token_ttl = 1800
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def shared_client(mock_server, monkeypatch):
+    url = f"http://127.0.0.1:{mock_server.server_address[1]}"
+    client = SharedGigaChatClient(
+        base_url=f"{url}/api/v1",
+        auth_url=f"{url}/oauth",
+        credentials=CREDENTIALS,
+        model="GigaChat",
+    )
+    monkeypatch.setattr(gigachat_client, "_client", client)
+    yield client
+    client.stop_token_refresher()
+    client.close()
+
+
+def api_requests(server):
+    return [(path, port) for path, port in server.requests if path != "/oauth"]
+
+
+def test_embeddings_and_chat_share_token_and_connection(mock_server, shared_client):
+    embeddings = SharedGigaChatEmbeddings()
+    chat = SharedGigaChat()
+
+    embeddings.embed_documents(["Цусима"])
+    chat.invoke("Когда было Цусимское сражение?")
+    embeddings.embed_documents(["Порт-Артур", "Мукден"])
+    chat.invoke("Кто командовал флотом?")
+
+    paths = [path for path, _ in mock_server.requests]
+    assert paths.count("/oauth") == 1
+    assert shared_client.token_fetches == 1
+
+    # Все запросы к API идут по одному keep-alive соединению
+    requests = api_requests(mock_server)
+    assert len(requests) == 4
+    assert len({port for _, port in requests}) == 1
+
+
+@pytest.mark.asyncio
+async def test_async_chat_reuses_token_and_connection(mock_server, shared_client):
+    chat = SharedGigaChat()
+
+    await chat.ainvoke("Первый вопрос")
+    await chat.ainvoke("Второй вопрос")
+    await shared_client.aclose()
+
+    assert shared_client.token_fetches == 1
+    requests = api_requests(mock_server)
+    assert len(requests) == 2
+    assert len({port for _, port in requests}) == 1
+
+
+def test_token_refresher_renews_before_expiry(mock_server, shared_client):
+    mock_server.token_ttl = 1.0
+    shared_client.refresh_margin = 0.7
+    shared_client.expiry_skew = 0.1
+
+    shared_client.start_token_refresher()
+    time.sleep(0.6)
+    shared_client.stop_token_refresher()
+
+    # Первый токен при старте и хотя бы одно обновление до истечения
+    assert shared_client.token_fetches >= 2
+    fetches = shared_client.token_fetches
+
+    # Запрос с действующим токеном не ходит за авторизацией
+    SharedGigaChatEmbeddings().embed_documents(["Варяг"])
+    assert shared_client.token_fetches == fetches
+
+
+def test_token_validity_uses_expiry_skew(shared_client):
+    shared_client.expiry_skew = 30
+    now_ms = int(time.time() * 1000)
+
+    shared_client._access_token = AccessToken(access_token="t", expires_at=now_ms + 60_000)
+    assert shared_client._check_validity_token()
+
+    shared_client._access_token = AccessToken(access_token="t", expires_at=now_ms + 10_000)
+    assert not shared_client._check_validity_token()
+
+    # Токен без времени истечения, переданный явно
+    shared_client._access_token = AccessToken(access_token="t", expires_at=0)
+    assert shared_client._check_validity_token()
+
+
+@pytest.mark.parametrize("name", ["_check_validity_token", "_update_token", "_aupdate_token"])
+def test_sdk_still_defines_overridden_methods(name):
+    """
+    Клиент переопределяет приватные методы SDK. Если после обновления gigachat
+    их не станет, переопределения молча перестанут вызываться.
+    """
+    assert any(name in vars(cls) for cls in gigachat.GigaChat.__mro__)
+
+
+@pytest.mark.asyncio
+async def test_close_does_not_block_event_loop(shared_client, monkeypatch):
+    """Остановка потока обновления токена не блокирует цикл событий"""
+    released = threading.Event()
+    monkeypatch.setattr(shared_client, "stop_token_refresher", lambda: released.wait(5))
+
+    closing = asyncio.create_task(gigachat_client.close_gigachat_client())
+    await asyncio.sleep(0.05)
+    assert not closing.done()
+
+    released.set()
+    await closing
+    assert gigachat_client._client is None
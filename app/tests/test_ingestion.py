@@ -0,0 +1,195 @@
+import hashlib
+import threading
+from typing import List
+
+import pytest
+from chromadb.api.types import EmbeddingFunction
+from services.chroma_service import ChromaService
+from services.ingestion import (
+    IngestManifest,
+    IngestPipeline,
+    StageStats,
+    make_chunk_id,
+    remove_missing_files,
+)
+from services import text_processor
+from services.text_processor import TextProcessor
+
+COLLECTION = "test_ingestion"
+
+
+class CountingEmbeddings(EmbeddingFunction):
+    """Детерминированный локальный эмбеддер со счетчиком текстов"""
+
+    def __init__(self):
+        self.embedded = 0
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        self.embedded += len(input)
+        return [
+            [b / 255.0 for b in hashlib.sha256(text.encode("utf-8")).digest()]
+            for text in input
+        ]
+
+
+@pytest.fixture
+def chroma_service(tmp_path):
+    service = ChromaService(persist_directory=str(tmp_path / "chroma"))
+    service.embeddings = CountingEmbeddings()
+    return service
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    return IngestManifest(str(tmp_path / "manifest.json"))
+
+
+@pytest.fixture
+def processor():
+    return TextProcessor(chunk_size=100, chunk_overlap=10)
+
+
+def ingest(chroma_service, processor, manifest, doc):
+    """Загрузка одного файла конвейером без пула процессов"""
+    pipeline = IngestPipeline(chroma_service, processor, manifest, process_workers=0)
+    return pipeline.run(COLLECTION, [(doc, {})])
+
+
+def write_doc(path, sentences: int, prefix: str = "Предложение"):
+    path.write_text(
+        " ".join(f"{prefix} номер {i} о крейсере Варяг." for i in range(sentences)),
+        encoding="utf-8",
+    )
+
+
+def test_make_chunk_id_is_deterministic():
+    assert make_chunk_id("a.txt", 0, "текст") == make_chunk_id("a.txt", 0, "текст")
+    assert make_chunk_id("a.txt", 0, "текст") != make_chunk_id("a.txt", 1, "текст")
+    assert make_chunk_id("a.txt", 0, "текст") != make_chunk_id("a.txt", 0, "другой")
+
+
+def test_reingest_is_idempotent(chroma_service, manifest, processor, tmp_path):
+    """Повторная загрузка не дублирует документы и не вызывает эмбеддер"""
+    doc = tmp_path / "varyag_1.txt"
+    write_doc(doc, 20)
+
+    first = ingest(chroma_service, processor, manifest, doc)
+    count = chroma_service.get_collection_stats(COLLECTION)["count"]
+    embedded = chroma_service.embeddings.embedded
+
+    second = ingest(chroma_service, processor, manifest, doc)
+
+    assert first["added"] == count > 0
+    assert second["skipped"]
+    assert chroma_service.get_collection_stats(COLLECTION)["count"] == count
+    assert chroma_service.embeddings.embedded == embedded
+
+
+def test_changed_file_syncs_only_changed_chunks(
+    chroma_service, manifest, processor, tmp_path
+):
+    """Измененный файл: добавляются новые чанки, устаревшие удаляются"""
+    doc = tmp_path / "varyag_1.txt"
+    write_doc(doc, 20)
+    ingest(chroma_service, processor, manifest, doc)
+    embedded = chroma_service.embeddings.embedded
+
+    # Дописываем текст в конец: начальные чанки не меняются
+    doc.write_text(
+        doc.read_text(encoding="utf-8") + " Новое предложение про бой у Чемульпо.",
+        encoding="utf-8",
+    )
+    stats = ingest(chroma_service, processor, manifest, doc)
+    chunks, _ = processor.process_file(doc)
+
+    assert stats["unchanged"] > 0
+    assert chroma_service.embeddings.embedded - embedded == stats["added"]
+    assert chroma_service.get_collection_stats(COLLECTION)["count"] == len(chunks)
+
+
+def test_removed_file_is_deleted(chroma_service, manifest, processor, tmp_path):
+    """Чанки файла, удаленного из источника, удаляются из коллекции"""
+    doc = tmp_path / "varyag_1.txt"
+    write_doc(doc, 5)
+    ingest(chroma_service, processor, manifest, doc)
+    assert chroma_service.document_exists(COLLECTION, str(doc))
+
+    deleted = remove_missing_files(chroma_service, manifest, COLLECTION, [])
+
+    assert deleted > 0
+    assert not chroma_service.document_exists(COLLECTION, str(doc))
+    assert manifest.files(COLLECTION) == []
+
+
+@pytest.mark.parametrize("process_workers", [0, 2])
+def test_pipeline_ingests_all_files(
+    chroma_service, manifest, processor, tmp_path, process_workers
+):
+    """Конвейер загружает все файлы и идемпотентен при повторном запуске"""
+    files = []
+    for i in range(4):
+        doc = tmp_path / f"varyag_{i}.txt"
+        write_doc(doc, 15, prefix=f"Файл {i}")
+        files.append((doc, {"source": f"https://example.com/{i}"}))
+
+    pipeline = IngestPipeline(
+        chroma_service,
+        processor,
+        manifest,
+        process_workers=process_workers,
+        embed_workers=2,
+        embed_batch_size=4,
+        upsert_batch_size=10,
+        queue_size=2,
+    )
+    stats = pipeline.run(COLLECTION, files)
+    expected = sum(len(processor.process_file(doc)[0]) for doc, _ in files)
+
+    assert stats["added"] == expected
+    assert stats["stages"]["upsert"]["items"] == expected
+    assert chroma_service.get_collection_stats(COLLECTION)["count"] == expected
+    assert len(manifest.files(COLLECTION)) == 4
+
+    rerun = pipeline.run(COLLECTION, files)
+    assert rerun["skipped"] == 4
+    assert rerun["added"] == 0
+
+
+def test_pipeline_rereads_file_after_late_encoding_error(
+    chroma_service, manifest, processor, tmp_path, monkeypatch
+):
+    """Чанки, отправленные до ошибки декодирования, не остаются в коллекции"""
+    monkeypatch.setattr(text_processor, "READ_BLOCK_SIZE", 64)
+    doc = tmp_path / "mixed.txt"
+    russian = "Рюрик призван княжить в Новгород."
+    doc.write_bytes(b"a " * 2560 + russian.encode("cp1251"))
+
+    pipeline = IngestPipeline(
+        chroma_service, processor, manifest, process_workers=0, embed_batch_size=2
+    )
+    stats = pipeline.run(COLLECTION, [(doc, {})])
+    chunks, _ = processor.process_file(doc)
+
+    ids = chroma_service.get_document_ids(COLLECTION, {"path": str(doc)})
+    assert sorted(ids) == sorted(make_chunk_id(str(doc), i, c) for i, c in enumerate(chunks))
+    assert stats["stages"]["process"]["items"] == len(chunks)
+    assert manifest.get(COLLECTION, str(doc))["chunks"] == len(chunks)
+
+
+def test_stage_stats_concurrent_record():
+    """Параллельные записи статистики из потоков стадий не теряются"""
+    stats = StageStats()
+
+    def record():
+        for i in range(1000):
+            stats.record(1, float(i), float(i) + 0.5)
+
+    threads = [threading.Thread(target=record) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert stats.items == 4000
+    assert stats.busy_seconds == 2000.0
+    assert stats.as_dict()["items"] == 4000
@@ -0,0 +1,103 @@
+import time
+
+import aiohttp
+import pytest
+from services.chroma_service import ChromaService
+from services.metrics import MetricsRegistry, Histogram, metrics, start_metrics_server
+
+
+@pytest.fixture
+def enabled_metrics(monkeypatch):
+    """Включает общий реестр на время теста"""
+    monkeypatch.setattr(metrics, "enabled", True)
+    metrics.reset()
+    yield metrics
+    metrics.reset()
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 5.0):
+        histogram.observe(value)
+
+    cumulative, total, count = histogram.snapshot()
+    assert cumulative == [1, 3, 4]
+    assert total == pytest.approx(6.25)
+    assert count == 4
+
+
+def test_disabled_span_records_nothing():
+    registry = MetricsRegistry(enabled=False)
+    with registry.span("stage"):
+        pass
+
+    assert registry.stage_stats("stage") is None
+    assert registry.span("stage") is registry.span("other")
+
+
+def test_span_records_duration():
+    registry = MetricsRegistry(enabled=True)
+    with registry.span("stage"):
+        time.sleep(0.01)
+
+    stats = registry.stage_stats("stage")
+    assert stats["count"] == 1
+    assert stats["sum"] >= 0.01
+
+
+def test_span_records_on_exception():
+    registry = MetricsRegistry(enabled=True)
+    with pytest.raises(ValueError):
+        with registry.span("stage"):
+            raise ValueError
+
+    assert registry.stage_stats("stage")["count"] == 1
+
+
+def test_render_prometheus_format():
+    registry = MetricsRegistry(enabled=True)
+    registry.observe("retrieval", 0.003)
+    registry.add_gauge("rag_answer_cache_hits", "Ответы из кэша", lambda: 7)
+    registry.add_gauge("broken", "Ошибка", lambda: 1 / 0)
+
+    text = registry.render()
+    assert "# TYPE rag_stage_duration_seconds histogram" in text
+    assert 'rag_stage_duration_seconds_bucket{stage="retrieval",le="0.0025"} 0' in text
+    assert 'rag_stage_duration_seconds_bucket{stage="retrieval",le="0.005"} 1' in text
+    assert 'rag_stage_duration_seconds_bucket{stage="retrieval",le="+Inf"} 1' in text
+    assert 'rag_stage_duration_seconds_count{stage="retrieval"} 1' in text
+    assert "rag_answer_cache_hits 7.0" in text
+    assert "broken" not in text
+
+
+def test_chroma_query_is_instrumented(enabled_metrics, tmp_path):
+    service = ChromaService(embedding_service="hashing", persist_directory=str(tmp_path))
+    service.add_documents(
+        "metrics_test", ["Порт-Артур", "Цусима"], [{"path": "a"}, {"path": "b"}]
+    )
+
+    service.query_documents("metrics_test", "Цусима", n_results=1)
+    service.lexical_search("metrics_test", "Цусима", n_results=1)
+
+    assert enabled_metrics.stage_stats("chroma_query")["count"] == 1
+    assert enabled_metrics.stage_stats("bm25_search")["count"] == 1
+    assert enabled_metrics.stage_stats("embeddings")["count"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint():
+    registry = MetricsRegistry(enabled=True)
+    registry.observe("generation", 1.5)
+
+    runner = await start_metrics_server("127.0.0.1", 0, registry)
+    try:
+        host, port = runner.addresses[0][:2]
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"http://{host}:{port}/metrics") as response:
+                assert response.status == 200
+                assert response.content_type == "text/plain"
+                text = await response.text()
+    finally:
+        await runner.cleanup()
+
+    assert 'rag_stage_duration_seconds_count{stage="generation"} 1' in text
@@ -0,0 +1,113 @@
+import time
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+from services import reranker as reranker_module
+from services.reranker import (
+    BaseReranker,
+    LexicalOverlapReranker,
+    get_reranker,
+)
+
+CANDIDATES = [
+    "Русско-японская война началась в 1904 году.",
+    "Японский флот под командованием адмирала Того блокировал Порт-Артур.",
+    "Крейсер Рюрик погиб в бою в Корейском проливе.",
+    "Адмирал Макаров погиб на броненосце Петропавловск.",
+]
+
+
+class SlowReranker(BaseReranker):
+    """Реранкер, который не укладывается в бюджет"""
+
+    batch_size = 1
+
+    def score_batch(self, query: str, documents: List[str]) -> List[float]:
+        time.sleep(0.02)
+        return [float(len(document)) for document in documents]
+
+
+def test_lexical_reranker_promotes_matching_chunk():
+    reranker = LexicalOverlapReranker()
+    ranked = reranker.rerank("Как погиб крейсер Рюрик?", CANDIDATES, top_k=2)
+
+    assert ranked[0] == CANDIDATES[2]
+    assert len(ranked) == 2
+
+
+def test_lexical_reranker_keeps_order_on_ties():
+    reranker = LexicalOverlapReranker()
+    assert reranker.rerank("Мукден", CANDIDATES, top_k=4) == CANDIDATES
+
+
+class ClockReranker(BaseReranker):
+    """Реранкер, каждый срез которого занимает 20 мс по подставным часам"""
+
+    batch_size = 1
+
+    def __init__(self, clock: List[float], **kwargs):
+        super().__init__(**kwargs)
+        self.clock = clock
+
+    def score_batch(self, query: str, documents: List[str]) -> List[float]:
+        self.clock[0] += 0.02
+        return [float(len(document)) for document in documents]
+
+
+def fake_time(monkeypatch) -> List[float]:
+    clock = [0.0]
+    monkeypatch.setattr(reranker_module, "time", SimpleNamespace(perf_counter=lambda: clock[0]))
+    return clock
+
+
+def test_budget_exceeded_skips_remaining_batches(monkeypatch):
+    """Срез, закончившийся после срока, отбрасывается, оставшиеся не оцениваются"""
+    reranker = ClockReranker(fake_time(monkeypatch), budget_ms=50)
+
+    ranked = reranker.rerank("вопрос", CANDIDATES[1:] + CANDIDATES[:1], top_k=4)
+
+    # Уложились два среза из трех: они упорядочены по оценкам, третий - в исходном порядке
+    assert ranked == [CANDIDATES[1], CANDIDATES[2], CANDIDATES[3], CANDIDATES[0]]
+    assert reranker.clock[0] == pytest.approx(0.06)
+    assert reranker.fallbacks == 1
+
+
+def test_first_slice_over_budget_keeps_retrieval_order():
+    """Если не уложился даже первый срез, остается порядок поиска"""
+    reranker = SlowReranker(budget_ms=10)
+    reranker.batch_size = len(CANDIDATES)
+
+    start = time.perf_counter()
+    ranked = reranker.rerank("вопрос", CANDIDATES, top_k=2)
+    elapsed = time.perf_counter() - start
+
+    assert ranked == CANDIDATES[:2]
+    assert reranker.fallbacks == 1
+    assert elapsed < 0.02 * 2
+
+
+def test_lexical_reranker_slices_share_term_weights():
+    """Оценки лексического реранкера не зависят от разбиения на срезы"""
+    reranker = LexicalOverlapReranker(budget_ms=1000)
+    reranker.batch_size = 1
+    query = "Как погиб крейсер Рюрик?"
+
+    assert reranker.score_within_budget(query, CANDIDATES, time.perf_counter() + 1) == (
+        reranker.score_batch(query, CANDIDATES)
+    )
+
+
+def test_within_budget_reranks():
+    reranker = SlowReranker(budget_ms=1000)
+    ranked = reranker.rerank("вопрос", CANDIDATES, top_k=1)
+
+    assert ranked == [max(CANDIDATES, key=len)]
+    assert reranker.fallbacks == 0
+
+
+def test_get_reranker():
+    assert isinstance(get_reranker("lexical"), LexicalOverlapReranker)
+    assert get_reranker("none") is None
+    with pytest.raises(ValueError):
+        get_reranker("unknown")
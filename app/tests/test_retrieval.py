@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+from services.answer_cache import SemanticAnswerCache
+from services.chroma_service import ChromaService
+from services.gigachat_service import GigaChatService
+from services.rag_service import RAGService
+from services.retrieval import RetrievalResult
+
+COLLECTION = "test_retrieval"
+
+DOCUMENTS = [
+    "Цусимское сражение произошло в мае 1905 года.",
+    "В Цусимском сражении русская эскадра потеряла большинство кораблей.",
+    "Адмирал Рожественский командовал эскадрой при Цусиме.",
+    "Крейсер Варяг принял бой у Чемульпо.",
+    "Оборона Порт-Артура продолжалась почти год.",
+    "Мукденское сражение стало крупнейшим сухопутным сражением войны.",
+]
+
+
+class RecordingGigaChatService(GigaChatService):
+    """Заглушка LLM, запоминающая переданный контекст"""
+
+    def __init__(self):
+        self.contexts = []
+
+    def generate_response(self, query, context, metadatas=None):
+        self.contexts.append((list(context), list(metadatas or [])))
+        return "ответ"
+
+
+CHROMA_RESULTS = {
+    "ids": [["a", "b", "c"]],
+    "documents": [["doc a", "doc b", "doc c"]],
+    "metadatas": [[{"path": "a.txt"}, None, {"path": "c.txt"}]],
+    "distances": [[0.1, 0.4, 0.8]],
+}
+
+
+def test_from_chroma_is_columnar():
+    result = RetrievalResult.from_chroma(CHROMA_RESULTS)
+
+    assert len(result) == 3
+    assert result.documents == ["doc a", "doc b", "doc c"]
+    assert result.metadatas[1] == {}
+    assert result.distances.dtype == np.float32
+    assert np.allclose(result.scores, [0.9, 0.6, 0.2])
+
+
+def test_filter_by_distance_keeps_unknown_distances():
+    dense = RetrievalResult.from_chroma(CHROMA_RESULTS)
+    lexical = RetrievalResult.from_scores(["d"], ["doc d"], [{}], [3.0])
+
+    assert dense.filter_by_distance(0.5).ids == ["a", "b"]
+    assert dense.filter_by_distance(None).ids == ["a", "b", "c"]
+    assert lexical.filter_by_distance(0.5).ids == ["d"]
+
+
+def test_fuse_keeps_dense_distances():
+    dense = RetrievalResult.from_chroma(CHROMA_RESULTS)
+    lexical = RetrievalResult.from_scores(["c", "d"], ["doc c", "doc d"], [{}, {}], [3.0, 1.0])
+
+    fused = RetrievalResult.fuse([dense, lexical], k=60)
+
+    assert fused.ids[0] == "c"
+    assert set(fused.ids) == {"a", "b", "c", "d"}
+    assert np.isclose(fused.distances[0], 0.8)
+    assert np.isnan(fused.distances[fused.ids.index("d")])
+    assert fused.metadatas[0] == {"path": "c.txt"}
+
+
+@pytest.mark.parametrize("max_distance", [0.5, 0.8, 2.0])
+def test_llm_receives_every_chunk_above_threshold(tmp_path, monkeypatch, max_distance):
+    """Регрессия: в LLM передаются все найденные чанки в пределах порога, а не только первый"""
+    monkeypatch.setattr("services.rag_service.settings.RETRIEVAL_MAX_DISTANCE", max_distance)
+    monkeypatch.setattr("services.rag_service.settings.RETRIEVAL_N_RESULTS", 5)
+    monkeypatch.setattr("services.rag_service.settings.RERANKER", "none")
+
+    chroma_service = ChromaService(embedding_service="hashing", persist_directory=str(tmp_path))
+    chroma_service.add_documents(
+        COLLECTION,
+        texts=DOCUMENTS,
+        metadatas=[{"path": f"doc_{i}.txt"} for i in range(len(DOCUMENTS))],
+    )
+    giga_chat_service = RecordingGigaChatService()
+    rag_service = RAGService(
+        chroma_service=chroma_service,
+        giga_chat_service=giga_chat_service,
+        answer_cache=SemanticAnswerCache(),
+        retrieval_mode="dense",
+    )
+
+    query = "Когда было Цусимское сражение?"
+    rag_service.generate_answer(query, COLLECTION)
+
+    raw = chroma_service.query_documents(COLLECTION, query, n_results=5)
+    expected = [
+        doc
+        for doc, distance in zip(raw["documents"][0], raw["distances"][0])
+        if distance <= max_distance
+    ]
+    context, metadatas = giga_chat_service.contexts[0]
+    assert context == expected
+    assert len(metadatas) == len(expected)
+    if max_distance == 2.0:
+        assert len(context) == 5
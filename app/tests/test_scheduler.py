@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+from services.scheduler import FairScheduler, RequestSuperseded, SchedulerFull, TokenBucket
+
+
+def make_scheduler(**kwargs) -> FairScheduler:
+    params = {"max_concurrency": 1, "rate": 100.0, "burst": 10, "max_queued": 100}
+    params.update(kwargs)
+    return FairScheduler(**params)
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=1.0, capacity=2, now=0.0)
+    assert bucket.try_take(0.0)
+    assert bucket.try_take(0.0)
+    assert not bucket.try_take(0.0)
+    assert bucket.wait_time(0.25) == pytest.approx(0.75)
+    assert bucket.try_take(1.0)
+
+
+@pytest.mark.asyncio
+async def test_global_concurrency_cap_and_positions():
+    scheduler = make_scheduler(max_concurrency=2)
+    first, second, third, fourth = (scheduler.submit(user) for user in "abcd")
+
+    assert first.granted and second.granted
+    assert (third.position, fourth.position) == (1, 2)
+    assert scheduler.stats()["running"] == 2
+
+    async with first:
+        pass
+    assert third.granted
+    assert fourth.position == 1
+
+
+@pytest.mark.asyncio
+async def test_round_robin_across_users():
+    """Пользователь с несколькими вопросами не обгоняет остальных"""
+    scheduler = make_scheduler(drop_stale=False)
+    running = scheduler.submit("a")
+    tickets = [scheduler.submit(user) for user in ("a", "a", "a", "b", "c")]
+    a2, a3, a4, b1, c1 = tickets
+
+    assert [ticket.position for ticket in tickets] == [1, 4, 5, 2, 3]
+
+    order = []
+    running.cancel()
+    for _ in tickets:
+        granted = next(t for t in tickets if t.granted and t not in order)
+        order.append(granted)
+        granted.cancel()
+
+    assert order == [a2, b1, c1, a3, a4]
+
+
+@pytest.mark.asyncio
+async def test_stale_request_is_superseded():
+    scheduler = make_scheduler()
+    running = scheduler.submit("other")
+    stale = scheduler.submit("user")
+    fresh = scheduler.submit("user")
+
+    with pytest.raises(RequestSuperseded):
+        async with stale:
+            pass
+    assert fresh.position == 1
+    assert scheduler.stats()["dropped"] == 1
+
+    running.cancel()
+    assert fresh.granted
+
+
+@pytest.mark.asyncio
+async def test_user_rate_limit_delays_requests():
+    scheduler = make_scheduler(max_concurrency=4, rate=20.0, burst=1)
+    first = scheduler.submit("user")
+    async with first:
+        pass
+
+    second = scheduler.submit("user")
+    assert not second.granted
+    # Другой пользователь не ждет чужого лимита
+    assert scheduler.submit("other").granted
+
+    await asyncio.wait_for(second.__aenter__(), timeout=1)
+    assert second.granted
+    second.cancel()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_frees_queue():
+    scheduler = make_scheduler()
+    running = scheduler.submit("a")
+    waiting = scheduler.submit("b")
+    later = scheduler.submit("c")
+
+    task = asyncio.create_task(waiting.__aenter__())
+    await asyncio.sleep(0)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert later.position == 1
+    running.cancel()
+    assert later.granted
+    assert scheduler.stats() == {"running": 1, "queued": 0, "dropped": 0, "users": 0}
+
+
+@pytest.mark.asyncio
+async def test_queue_limit():
+    scheduler = make_scheduler(max_queued=1)
+    scheduler.submit("a")
+    scheduler.submit("b")
+    with pytest.raises(SchedulerFull):
+        scheduler.submit("c")
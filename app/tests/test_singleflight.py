@@ -0,0 +1,113 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from services.singleflight import AsyncSingleFlight, SingleFlight, normalize_query
+
+
+def test_normalize_query():
+    assert normalize_query("  Итоги   Цусимы? ") == normalize_query("итоги цусимы")
+    assert normalize_query("Итоги Цусимы") != normalize_query("Итоги Мукдена")
+
+
+def test_concurrent_calls_share_one_result():
+    group = SingleFlight()
+    calls = []
+    started = threading.Event()
+
+    def work():
+        calls.append(1)
+        started.set()
+        time.sleep(0.1)
+        return "ответ"
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        leader = executor.submit(group.do, "key", work)
+        started.wait()
+        followers = [executor.submit(group.do, "key", work) for _ in range(7)]
+        results = [leader.result()] + [future.result() for future in followers]
+
+    assert results == ["ответ"] * 8
+    assert len(calls) == 1
+    assert group.stats() == {"calls": 1, "coalesced": 7, "in_flight": 0}
+
+
+def test_error_is_shared_and_not_cached():
+    group = SingleFlight()
+
+    def fail():
+        raise RuntimeError("API недоступен")
+
+    with pytest.raises(RuntimeError):
+        group.do("key", fail)
+    # Следующий вызов выполняется заново
+    assert group.do("key", lambda: "ответ") == "ответ"
+
+
+@pytest.mark.asyncio
+async def test_async_run_coalesces_and_survives_cancellation():
+    group = AsyncSingleFlight()
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "ответ"
+
+    first = asyncio.create_task(group.run("key", work))
+    second = asyncio.create_task(group.run("key", work))
+    await asyncio.sleep(0)
+    # Отмена первого ожидающего не прерывает общую задачу
+    first.cancel()
+
+    assert await second == "ответ"
+    assert calls == 1
+    assert group.stats() == {"calls": 1, "coalesced": 1, "in_flight": 0}
+
+
+@pytest.mark.asyncio
+async def test_async_stream_error_reaches_all_subscribers():
+    group = AsyncSingleFlight()
+
+    async def source():
+        yield "начало "
+        await asyncio.sleep(0.01)
+        raise RuntimeError("обрыв потока")
+
+    async def collect():
+        chunks = []
+        with pytest.raises(RuntimeError):
+            async for chunk in group.stream("key", source):
+                chunks.append(chunk)
+        return chunks
+
+    assert await asyncio.gather(collect(), collect()) == [["начало "], ["начало "]]
+    assert group.stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_async_join_reads_running_stream():
+    group = AsyncSingleFlight()
+
+    async def source():
+        for word in ("первый ", "второй"):
+            await asyncio.sleep(0.01)
+            yield word
+
+    assert group.join("key") is None
+
+    leader = asyncio.create_task(_collect(group.stream("key", source)))
+    await asyncio.sleep(0.015)
+    joined = group.join("key")
+
+    assert await _collect(joined) == await leader == ["первый ", "второй"]
+    await asyncio.sleep(0)  # done-callback задачи
+    assert group.stats() == {"calls": 1, "coalesced": 1, "in_flight": 0}
+    assert group.join("key") is None
+
+
+async def _collect(stream):
+    return [chunk async for chunk in stream]
@@ -0,0 +1,56 @@
+import subprocess
+import sys
+
+import services.rag_service
+from routes import ml
+from scripts.bench_startup import parse_importtime, summarize
+
+IMPORTTIME_OUTPUT = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   encodings.cp1251
+import time:      3000 |       3500 |     chromadb.config
+import time:       500 |       4000 |   chromadb
+import time:        50 |       4050 | services.chroma_service
+"""
+
+
+def test_routes_import_does_not_load_heavy_dependencies():
+    code = (
+        "import sys; from routes import ml; "
+        "print(sorted(m for m in ('chromadb', 'langchain_core', 'services.rag_service') "
+        "if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == "[]"
+
+
+def test_rag_service_is_created_once_on_first_use(monkeypatch):
+    created = []
+
+    class FakeRAGService:
+        def __init__(self):
+            created.append(self)
+
+    monkeypatch.setattr(services.rag_service, "RAGService", FakeRAGService)
+    monkeypatch.setattr(ml, "_rag_service", None)
+
+    first = ml.get_rag_service()
+    assert ml.get_rag_service() is first
+    assert created == [first]
+
+
+def test_parse_importtime():
+    records = parse_importtime(IMPORTTIME_OUTPUT)
+    assert [(r.module, r.self_us, r.depth) for r in records] == [
+        ("encodings.cp1251", 120, 1),
+        ("chromadb.config", 3000, 2),
+        ("chromadb", 500, 1),
+        ("services.chroma_service", 50, 0),
+    ]
+
+    summary = summarize(records, top=2)
+    assert summary["total_ms"] == 3.7
+    assert summary["packages_ms"] == {"chromadb": 3.5, "encodings": 0.1}
+    assert list(summary["slowest_modules_ms"]) == ["chromadb.config", "chromadb"]
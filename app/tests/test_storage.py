@@ -0,0 +1,44 @@
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+from utils.states import ProcessLLMStates
+from utils.storage import SQLiteStorage
+
+KEY = StorageKey(bot_id=1, chat_id=100, user_id=100)
+OTHER = StorageKey(bot_id=1, chat_id=200, user_id=200)
+
+
+@pytest.mark.asyncio
+async def test_state_and_data_roundtrip(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "fsm.sqlite3"))
+
+    assert await storage.get_state(KEY) is None
+    assert await storage.get_data(KEY) == {}
+
+    await storage.set_state(KEY, ProcessLLMStates.waitForText)
+    await storage.set_data(KEY, {"вопрос": "Итоги Цусимы", "n": 1})
+
+    assert await storage.get_state(KEY) == ProcessLLMStates.waitForText.state
+    assert await storage.get_data(KEY) == {"вопрос": "Итоги Цусимы", "n": 1}
+    assert await storage.get_state(OTHER) is None
+
+    # Данные не затирают состояние и наоборот
+    await storage.set_state(KEY, None)
+    assert await storage.get_data(KEY) == {"вопрос": "Итоги Цусимы", "n": 1}
+    await storage.close()
+
+
+@pytest.mark.asyncio
+async def test_state_is_shared_between_instances(tmp_path):
+    """Второй экземпляр - как другой webhook-воркер с тем же файлом"""
+    path = str(tmp_path / "fsm.sqlite3")
+    first, second = SQLiteStorage(path), SQLiteStorage(path)
+
+    await first.set_state(KEY, ProcessLLMStates.waitForText)
+    await first.update_data(KEY, {"count": 1})
+
+    assert await second.get_state(KEY) == ProcessLLMStates.waitForText.state
+    assert await second.update_data(KEY, {"count": 2}) == {"count": 2}
+    assert await first.get_data(KEY) == {"count": 2}
+
+    await first.close()
+    await second.close()
@@ -0,0 +1,78 @@
+import pytest
+from utils.streaming import EMPTY_ANSWER_TEXT, TelegramStreamWriter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeSentMessage:
+    def __init__(self, text: str):
+        self.text = text
+        self.history = [text]
+
+    async def edit_text(self, text: str):
+        self.text = text
+        self.history.append(text)
+
+
+class FakeMessage:
+    """Входящее сообщение пользователя: ответы копятся в sent"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def answer(self, text: str):
+        sent = FakeSentMessage(text)
+        self.sent.append(sent)
+        return sent
+
+
+@pytest.mark.asyncio
+async def test_edits_are_coalesced():
+    """Фрагменты внутри интервала объединяются в одно редактирование"""
+    message, clock = FakeMessage(), FakeClock()
+    writer = TelegramStreamWriter(message, edit_interval=1.0, time_func=clock)
+    await writer.start()
+
+    for i in range(10):
+        clock.now += 0.25
+        await writer.write(f"слово{i} ")
+    await writer.finish()
+
+    assert len(message.sent) == 1
+    # 10 фрагментов за 2.5 с: два промежуточных редактирования и финальное
+    assert writer.edits == 3
+    assert message.sent[0].text == "".join(f"слово{i} " for i in range(10))
+
+
+@pytest.mark.asyncio
+async def test_long_answer_rolls_over():
+    """Ответ длиннее лимита продолжается в новых сообщениях"""
+    message = FakeMessage()
+    writer = TelegramStreamWriter(message, edit_interval=0, max_length=50)
+    await writer.start()
+
+    words = [f"слово{i:03d}" for i in range(30)]
+    for word in words:
+        await writer.write(word + " ")
+    await writer.finish()
+
+    texts = [sent.text for sent in message.sent]
+    assert len(texts) > 1
+    assert all(0 < len(text) <= 50 for text in texts)
+    assert " ".join(texts).split() == words
+
+
+@pytest.mark.asyncio
+async def test_empty_answer_replaces_placeholder():
+    message = FakeMessage()
+    writer = TelegramStreamWriter(message)
+    await writer.start()
+    await writer.finish()
+
+    assert message.sent[0].text == EMPTY_ANSWER_TEXT
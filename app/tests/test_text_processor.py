@@ -1,6 +1,15 @@
+import json
+import re
 import pytest
 from pathlib import Path
-from services.text_processor import TextProcessor
+from services import text_processor
+from services.text_processor import (
+    ChunkStats,
+    TextProcessor,
+    collapse_spaces,
+    normalize_text,
+    segments_path,
+)
 
 
 @pytest.fixture
@@ -61,3 +70,126 @@ def test_extract_metadata(processor):
     metadata = processor.extract_metadata("Тестовый текст", file_path)
     assert metadata["topic"] == "varyag"
     assert metadata["filename"] == "varyag_1"
+
+
+def test_iter_text_chunks_matches_split(processor):
+    """Потоковое разбиение совпадает с clean_text + split_into_chunks при любых блоках"""
+    text = (
+        "Порт-Артур   пал 2 января 1905 года.\n\n«Варяг» и «Кореец» приняли бой * у Чемульпо. "
+        + "Броненосец" * 15
+        + " Эскадра\tвышла из Либавы.  "
+    )
+    cleaned = processor.clean_text(text)
+    expected = processor.split_into_chunks(cleaned)
+
+    for block_size in (1, 7, 64, len(text)):
+        blocks = [text[i : i + block_size] for i in range(0, len(text), block_size)]
+        assert "".join(processor.iter_clean_text(blocks)) == cleaned
+
+        stats = ChunkStats()
+        chunks = list(processor.iter_text_chunks(blocks, stats))
+        assert [chunk.text for chunk in chunks] == expected
+        assert all(cleaned[chunk.start : chunk.end] == chunk.text for chunk in chunks)
+        assert stats.as_dict() == processor.get_text_stats(cleaned)
+
+
+def test_process_file_streams_chunks(processor, tmp_path, monkeypatch):
+    monkeypatch.setattr(text_processor, "READ_BLOCK_SIZE", 16)
+    text = "Русско-японская война началась в 1904 году. " * 20
+    doc = tmp_path / "cleaned_war_1.txt"
+    doc.write_text(text, encoding="cp1251")
+
+    chunks, metadata = processor.process_file(doc)
+
+    assert chunks == processor.split_into_chunks(processor.clean_text(text))
+    assert metadata[0]["topic"] == "war"
+    cleaned = processor.clean_text(text)
+    for chunk, chunk_metadata in zip(chunks, metadata):
+        start = int(chunk_metadata["chunk_start"])
+        assert cleaned[start : start + len(chunk)] == chunk
+
+
+def test_normalize_text_matches_two_pass_cleaning():
+    for text in ("\ufeff  «Варяг» * и\xa0«Кореец»\n\n", "a * b", " \t", "", "Цусима, 1905!"):
+        expected = re.sub(r"[^\w\s\.,!?;:()-]", "", re.sub(r"\s+", " ", text)).strip()
+        assert normalize_text(text) == expected
+        assert collapse_spaces(text) == re.sub(r"\s+", " ", text)
+
+
+def test_detect_encoding_from_sample(processor, tmp_path, monkeypatch):
+    monkeypatch.setattr(text_processor, "ENCODING_SAMPLE_SIZE", 5)
+    utf8 = tmp_path / "utf8.txt"
+    # Выборка обрывается посреди двухбайтового символа
+    utf8.write_text("абвгд", encoding="utf-8")
+    cp1251 = tmp_path / "cp1251.txt"
+    cp1251.write_text("абвгд", encoding="cp1251")
+
+    assert processor.detect_encoding(utf8) == "utf-8"
+    assert processor.detect_encoding(cp1251) == "windows-1251"
+    assert processor.read_file(cp1251) == "абвгд"
+
+    # Некорректные байты после выборки: чтение переходит к следующей кодировке
+    late = tmp_path / "late.txt"
+    late.write_bytes(b"abcdefgh" + "ж".encode("cp1251"))
+    assert processor.read_file(late) == "abcdefghж"
+
+
+def test_process_file_keeps_text_after_encoding_sample(processor, tmp_path):
+    path = tmp_path / "mixed.txt"
+    russian = "Рюрик призван княжить в Новгород."
+    path.write_bytes(b"a " * 2560 + russian.encode("cp1251"))
+
+    # Выборка - ASCII, кириллица в cp1251 обнаруживается только при чтении
+    assert processor.detect_encoding(path) == "utf-8"
+    chunks, _ = processor.process_file(path)
+    text = " ".join(chunks)
+    assert all(word in text for word in russian.split())
+
+
+def test_sentence_strategy_keeps_sentences_whole():
+    processor = TextProcessor(chunk_size=60, chunk_overlap=20, chunk_strategy="sentences")
+    text = (
+        "Первое предложение тут. Второе короткое. "
+        "Третье предложение подлиннее прочих! Четвертое? Пятое."
+    )
+    chunks = list(processor.iter_text_chunks([text]))
+
+    assert [chunk.text for chunk in chunks] == [
+        "Первое предложение тут. Второе короткое.",
+        # Перекрытие - последнее предложение предыдущего чанка
+        "Второе короткое. Третье предложение подлиннее прочих!",
+        "Четвертое? Пятое.",
+    ]
+    assert all(text[chunk.start : chunk.end] == chunk.text for chunk in chunks)
+
+    # Предложение длиннее чанка режется по словам
+    long_sentence = "слово " * 30 + "конец."
+    assert all(
+        len(chunk.text) <= 60 for chunk in processor.iter_text_chunks([long_sentence])
+    )
+
+    with pytest.raises(ValueError):
+        TextProcessor(chunk_strategy="paragraphs")
+
+
+def test_process_file_adds_segment_timestamps(tmp_path):
+    segments = [
+        {"start": 0.0, "end": 4.2, "text": " Крейсер «Варяг» вышел из Чемульпо."},
+        {"start": 4.2, "end": 9.8, "text": " Японская эскадра ждала у выхода."},
+        {"start": 9.8, "end": 15.1, "text": " Бой продолжался около часа!"},
+        {"start": 15.1, "end": 20.0, "text": " Затем крейсер вернулся на рейд."},
+    ]
+    doc = tmp_path / "varyag_1.txt"
+    doc.write_text("".join(segment["text"] for segment in segments).strip(), encoding="utf-8")
+    segments_path(doc).write_text(json.dumps(segments, ensure_ascii=False), encoding="utf-8")
+
+    processor = TextProcessor(chunk_size=70, chunk_overlap=10, chunk_strategy="sentences")
+    chunks, metadata = processor.process_file(doc)
+
+    assert chunks[1].startswith("Бой продолжался")
+    assert [(m["start_time"], m["end_time"]) for m in metadata] == [("0", "10"), ("9", "20")]
+
+    # Сегменты от другого текста не дают таймкодов
+    doc.write_text("Другой текст.", encoding="utf-8")
+    _, metadata = processor.process_file(doc)
+    assert "start_time" not in metadata[0]
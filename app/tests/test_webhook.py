@@ -0,0 +1,98 @@
+import asyncio
+import queue
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+from services.chroma_service import ChromaService
+from utils.webhook import (
+    SECRET_HEADER,
+    consume_updates,
+    create_router_app,
+    update_chat_id,
+    worker_concurrency,
+    worker_for_update,
+)
+
+
+def message_update(update_id: int, chat_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {"message_id": update_id, "chat": {"id": chat_id}, "text": "вопрос"},
+    }
+
+
+def test_update_chat_id():
+    assert update_chat_id(message_update(1, -100500)) == -100500
+    callback = {
+        "update_id": 2,
+        "callback_query": {"id": "q", "from": {"id": 7}, "message": {"chat": {"id": 42}}},
+    }
+    assert update_chat_id(callback) == 42
+    assert update_chat_id({"update_id": 3, "inline_query": {"from": {"id": 7}}}) == 7
+    assert update_chat_id({"update_id": 4}) == 4
+
+
+def test_chat_is_pinned_to_one_worker():
+    workers = {worker_for_update(message_update(i, 12345), 4) for i in range(20)}
+    assert len(workers) == 1
+    assert {worker_for_update(message_update(0, chat), 4) for chat in range(8)} == set(range(4))
+
+
+def test_worker_concurrency_splits_cap():
+    assert worker_concurrency(4, 1) == 4
+    assert worker_concurrency(4, 3) == 2
+    assert worker_concurrency(2, 4) == 1
+
+
+@pytest.mark.asyncio
+async def test_router_app_routes_by_chat_and_checks_secret():
+    queues = [queue.Queue(), queue.Queue()]
+    client = TestClient(TestServer(create_router_app(queues, "/webhook", secret="s")))
+    await client.start_server()
+    try:
+        denied = await client.post("/webhook", json=message_update(1, 3))
+        assert denied.status == 401
+
+        for update_id, chat_id in enumerate([3, 5, 4]):
+            response = await client.post(
+                "/webhook", json=message_update(update_id, chat_id), headers={SECRET_HEADER: "s"}
+            )
+            assert response.status == 200
+    finally:
+        await client.close()
+
+    assert [update["message"]["chat"]["id"] for update in queues[1].queue] == [3, 5]
+    assert [update["message"]["chat"]["id"] for update in queues[0].queue] == [4]
+
+
+@pytest.mark.asyncio
+async def test_consume_updates_until_stop():
+    updates = queue.Queue()
+    for i in range(3):
+        updates.put(message_update(i, i))
+    updates.put(None)
+    handled = []
+
+    async def feed(update):
+        await asyncio.sleep(0.01)
+        handled.append(update["update_id"])
+
+    await consume_updates(updates, feed)
+    assert sorted(handled) == [0, 1, 2]
+
+
+def test_read_only_chroma_service_rejects_writes(tmp_path):
+    writer = ChromaService(embedding_service="hashing", persist_directory=str(tmp_path))
+    writer.add_documents("test_webhook", texts=["Крейсер Варяг"], ids=["varyag"])
+
+    reader = ChromaService(
+        embedding_service="hashing", persist_directory=str(tmp_path), read_only=True
+    )
+    assert reader.search("test_webhook", "Варяг", n_results=1).ids == ["varyag"]
+    with pytest.raises(RuntimeError):
+        reader.add_documents("test_webhook", texts=["Рюрик"], ids=["rurik"])
+    with pytest.raises(RuntimeError):
+        reader.delete_documents("test_webhook", ["varyag"])
+    # Коллекции в режиме только чтения не создаются
+    with pytest.raises(Exception):
+        reader.create_or_get_collection("missing")
@@ -0,0 +1,100 @@
+from pathlib import Path
+from typing import Any, Dict, Optional
+import asyncio
+import json
+import sqlite3
+import threading
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import (
+    BaseStorage,
+    DefaultKeyBuilder,
+    KeyBuilder,
+    StateType,
+    StorageKey,
+)
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from config import settings
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM-хранилище aiogram на SQLite.
+
+    Состояние и данные чатов лежат в одном файле, поэтому их видят все
+    процессы бота (webhook-воркеры) и они переживают перезапуск контейнера.
+    WAL позволяет читать параллельно с записью из другого процесса.
+    """
+
+    def __init__(
+        self, path: str = settings.FSM_STORAGE_PATH, key_builder: Optional[KeyBuilder] = None
+    ):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.key_builder = key_builder or DefaultKeyBuilder(with_destiny=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS fsm (
+                key TEXT PRIMARY KEY,
+                state TEXT,
+                data TEXT NOT NULL DEFAULT '{}'
+            )
+            """
+        )
+        self._conn.commit()
+
+    def _write(self, sql: str, params: tuple):
+        with self._lock:
+            self._conn.execute(sql, params)
+            self._conn.commit()
+
+    def _read(self, sql: str, params: tuple) -> Optional[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        value = state.state if isinstance(state, State) else state
+        await asyncio.to_thread(
+            self._write,
+            "INSERT INTO fsm (key, state) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET state = excluded.state",
+            (self.key_builder.build(key), value),
+        )
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        row = await asyncio.to_thread(
+            self._read, "SELECT state FROM fsm WHERE key = ?", (self.key_builder.build(key),)
+        )
+        return row[0] if row else None
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await asyncio.to_thread(
+            self._write,
+            "INSERT INTO fsm (key, data) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET data = excluded.data",
+            (self.key_builder.build(key), json.dumps(data, ensure_ascii=False)),
+        )
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        row = await asyncio.to_thread(
+            self._read, "SELECT data FROM fsm WHERE key = ?", (self.key_builder.build(key),)
+        )
+        return json.loads(row[0]) if row else {}
+
+    async def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def create_storage(kind: str = settings.FSM_STORAGE) -> BaseStorage:
+    """Хранилище FSM по имени из настроек: sqlite или memory"""
+    if kind == "sqlite":
+        return SQLiteStorage()
+    if kind == "memory":
+        return MemoryStorage()
+    raise ValueError(f"Unknown FSM storage: {kind}")
@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import time
+from typing import Callable, List, Optional
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import Message
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER_TEXT = "Ищу ответ..."
+EMPTY_ANSWER_TEXT = "Не удалось получить ответ, попробуйте переформулировать вопрос."
+
+
+class TelegramStreamWriter:
+    """
+    Выводит потоковый ответ в Telegram через редактирование сообщения.
+
+    Сначала отправляется сообщение-заглушка, затем оно редактируется по мере
+    поступления текста. Редактирования объединяются: не чаще одного раза
+    за edit_interval, чтобы не упираться в лимиты Telegram. Текст длиннее
+    max_length переносится в следующее сообщение.
+    """
+
+    def __init__(
+        self,
+        message: Message,
+        edit_interval: float = settings.STREAM_EDIT_INTERVAL,
+        max_length: int = settings.TELEGRAM_MAX_MESSAGE_LENGTH,
+        placeholder: str = PLACEHOLDER_TEXT,
+        time_func: Callable[[], float] = time.monotonic,
+    ):
+        self.message = message
+        self.edit_interval = edit_interval
+        self.max_length = max_length
+        self.placeholder = placeholder
+        self.time_func = time_func
+
+        self.messages: List[Message] = []
+        self.edits = 0
+        self._current: Optional[Message] = None
+        self._text = ""
+        self._shown = ""
+        self._next_edit = 0.0
+        self._written = False
+
+    async def start(self):
+        """Отправляет сообщение-заглушку"""
+        self._current = await self.message.answer(self.placeholder)
+        self.messages.append(self._current)
+        self._shown = self.placeholder
+        self._next_edit = self.time_func() + self.edit_interval
+
+    async def write(self, chunk: str):
+        """Добавляет фрагмент ответа; сообщение обновляется не чаще edit_interval"""
+        if not chunk:
+            return
+        self._written = True
+        self._text += chunk
+
+        # Переполненное сообщение фиксируем и продолжаем в новом
+        while len(self._text) > self.max_length:
+            head, self._text = self._split(self._text)
+            await self._flush(head, force=True)
+            self._current = None
+            self._shown = ""
+
+        if self.time_func() >= self._next_edit:
+            await self._flush(self._text)
+
+    async def finish(self):
+        """Выводит оставшийся текст без учета интервала"""
+        if not self._written:
+            self._text = EMPTY_ANSWER_TEXT
+        await self._flush(self._text, force=True)
+
+    def _split(self, text: str):
+        """Делит текст по последнему переводу строки или пробелу до max_length"""
+        cut = text.rfind("\n", 0, self.max_length + 1)
+        if cut < self.max_length // 2:
+            cut = text.rfind(" ", 0, self.max_length + 1)
+        if cut <= 0:
+            cut = self.max_length
+        return text[:cut].rstrip(), text[cut:].lstrip()
+
+    async def _flush(self, text: str, force: bool = False):
+        if not text or text == self._shown:
+            return
+
+        while True:
+            try:
+                if self._current is None:
+                    self._current = await self.message.answer(text)
+                    self.messages.append(self._current)
+                else:
+                    await self._current.edit_text(text)
+                    self.edits += 1
+                break
+            except TelegramRetryAfter as e:
+                logger.warning(f"Telegram ограничил частоту запросов на {e.retry_after} с")
+                if not force:
+                    # Промежуточное обновление пропускаем, текст выведется позже
+                    self._next_edit = self.time_func() + e.retry_after
+                    return
+                await asyncio.sleep(e.retry_after)
+            except TelegramBadRequest as e:
+                if "message is not modified" not in str(e):
+                    raise
+                break
+
+        self._shown = text
+        self._next_edit = self.time_func() + self.edit_interval
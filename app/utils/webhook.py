@@ -0,0 +1,86 @@
+from multiprocessing.queues import Queue
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+import asyncio
+import logging
+import math
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def update_chat_id(update: Dict[str, Any]) -> int:
+    """
+    Чат, к которому относится обновление Telegram.
+
+    Сообщения и их правки несут chat, callback_query - исходное сообщение,
+    остальные обновления - хотя бы отправителя. Обновления без чата и
+    отправителя распределяются по update_id.
+    """
+    for value in update.values():
+        if not isinstance(value, dict):
+            continue
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+        sender = value.get("from") or value.get("user")
+        if sender:
+            return sender["id"]
+    return update.get("update_id", 0)
+
+
+def worker_for_update(update: Dict[str, Any], workers: int) -> int:
+    """Номер воркера для обновления: все обновления чата идут в один воркер"""
+    return update_chat_id(update) % workers
+
+
+def worker_concurrency(max_concurrency: int, workers: int) -> int:
+    """Доля общего лимита запросов к LLM на один воркер"""
+    return max(1, math.ceil(max_concurrency / workers))
+
+
+def create_router_app(
+    queues: List[Queue], path: str, secret: Optional[str] = None
+) -> web.Application:
+    """
+    Прием webhook в главном процессе: обновление проверяется по секрету и
+    передается в очередь воркера, который обслуживает чат. Так очередь к LLM,
+    лимиты пользователя и склейка вопросов одного чата живут в одном процессе.
+    """
+
+    async def handle(request: web.Request) -> web.Response:
+        if secret and request.headers.get(SECRET_HEADER) != secret:
+            return web.Response(status=401)
+        update = await request.json()
+        queues[worker_for_update(update, len(queues))].put(update)
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post(path, handle)
+    return app
+
+
+def _log_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Ошибка обработки обновления: {str(task.exception())}")
+
+
+async def consume_updates(updates: Queue, feed: Callable[[Dict[str, Any]], Awaitable[Any]]):
+    """
+    Обработка обновлений из очереди воркера, пока не придет None.
+    Каждое обновление обрабатывается отдельной задачей, как в aiohttp-хендлере aiogram.
+    """
+    tasks: Set[asyncio.Task] = set()
+    while True:
+        update = await asyncio.to_thread(updates.get)
+        if update is None:
+            break
+        task = asyncio.create_task(feed(update))
+        tasks.add(task)
+        task.add_done_callback(_log_failure)
+        task.add_done_callback(tasks.discard)
+
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
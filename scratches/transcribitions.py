@@ -1,14 +1,22 @@
 import whisper
+import json
 import os
 
 
 audio = whisper.load_audio("rurik_.mp3")
 
 whisper_model = whisper.load_model("turbo", device="cuda")
-result = whisper_model.transcribe(audio, language="Russian", fp16=False, verbose=False)[
-    "text"
-].strip()
+transcription = whisper_model.transcribe(audio, language="Russian", fp16=False, verbose=False)
+result = transcription["text"].strip()
 
 
 with open("cleaned_docs/rurik_v2.txt", "w", encoding="utf-8") as file:
     file.write(result)
+
+# Таймкоды сегментов: по ним чанки получают start_time/end_time и ссылки &t= на видео
+segments = [
+    {"start": segment["start"], "end": segment["end"], "text": segment["text"]}
+    for segment in transcription["segments"]
+]
+with open("cleaned_docs/rurik_v2.segments.json", "w", encoding="utf-8") as file:
+    json.dump(segments, file, ensure_ascii=False)